@@ -0,0 +1,46 @@
+"""Micro-benchmark of the path operations that are used when planning large transfers.
+
+Run with :code:`python benchmarks/bench_irodspath.py`. No iRODS server is needed.
+"""
+
+import timeit
+
+from ibridges.path import CachedIrodsPath
+
+
+class MockSession:
+    """Minimal session, only the home collection is needed for paths."""
+
+    zone = "zone"
+    home = "/zone/home/user"
+    irods_session = None
+
+
+N_PATHS = 10000
+
+
+def _make_paths(session):
+    return [CachedIrodsPath(session, 100, True, None, "~", f"dir_{i % 100}", f"file_{i}.txt")
+            for i in range(N_PATHS)]
+
+
+def main():
+    """Time creating, converting, hashing and joining paths."""
+    session = MockSession()
+    paths = _make_paths(session)
+    benchmarks = {
+        "create": lambda: _make_paths(session),
+        "str": lambda: [str(ipath) for ipath in paths],
+        "dict by str": lambda: {str(ipath): ipath for ipath in paths},
+        "name and parent": lambda: [(ipath.name, ipath.parent) for ipath in paths],
+        "join": lambda: [ipath / "x" for ipath in paths],
+        "parts": lambda: [ipath.parts for ipath in paths],
+        "dict by path": lambda: {ipath: ipath for ipath in paths},
+    }
+    for name, func in benchmarks.items():
+        duration = min(timeit.repeat(func, number=5, repeat=3)) / 5
+        print(f"{name:<16} {duration / N_PATHS * 1e6:8.2f} us/path")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,6 @@
 """iBridges package that implements an API for iRods."""
 
-from ibridges.data_operations import download, sync, upload
+from ibridges.data_operations import download, resume, sync, upload
 from ibridges.meta import MetaData
 from ibridges.path import IrodsPath
 from ibridges.search import search_data
@@ -16,4 +16,5 @@ __all__ = [
     "Tickets",
     "search_data",
     "sync",
+    "resume",
 ]
@@ -6,14 +6,16 @@ import argparse
 import json
 import sys
 from argparse import RawTextHelpFormatter
+from contextlib import contextmanager
 from pathlib import Path
 from typing import Optional, Union
 
-from ibridges.data_operations import download, sync, upload
+from ibridges import agent
+from ibridges.data_operations import download, resume, sync, upload
 from ibridges.interactive import DEFAULT_IENV_PATH, DEFAULT_IRODSA_PATH, interactive_auth
 from ibridges.path import IrodsPath
 from ibridges.search import search_data
-from ibridges.session import Session
+from ibridges.session import PasswordError, Session
 from ibridges.util import (
     find_environment_provider,
     get_collection,
@@ -55,6 +57,8 @@ Available subcommands:
         Create an iRODS environment file to connect to an iRODS server.
     search:
         Search for collections and data objects
+    agent:
+        Start, stop or show the status of the agent that keeps sessions open between commands.
 
 The iBridges CLI does not implement the complete iBridges API. For example, there
 are no commands to modify metadata on the irods server.
@@ -72,6 +76,7 @@ ibridges search --path-pattern "%.txt"
 ibridges search --metadata "key" "value" "units"
 ibridges search --metadata "key" --metadata "key2" "value2"
 ibridges setup uu-its
+ibridges agent start --idle-timeout 3600
 
 Reuse a configuration by an alias:
 ibridges init ~/.irods/irods_environment.json --alias my_irods
@@ -92,6 +97,22 @@ def main() -> None:
     # show help by default, else consume first argument
     subcommand = "--help" if len(sys.argv) < 2 else sys.argv.pop(1)
 
+    exit_code = agent.forward(subcommand, sys.argv[1:], _resolve_ienv_path(_get_ienv_path()))
+    if exit_code is not None:
+        sys.exit(exit_code)
+    try:
+        _run_subcommand(subcommand)
+    except PasswordError:
+        # Sessions of the CLI connect lazily, so the cached password is only checked on use.
+        # Ask for the password as before, and run the command again with the new password.
+        with _cli_auth(ienv_path=_get_ienv_path(), lazy=False):
+            pass
+        _run_subcommand(subcommand)
+    finally:
+        agent.notify_changed(subcommand)
+
+
+def _run_subcommand(subcommand: str):  # pylint: disable=too-many-branches
     if subcommand in ["-h", "--help"]:
         print(MAIN_HELP_MESSAGE)
     elif subcommand in ["-v", "--version"]:
@@ -116,6 +137,8 @@ def main() -> None:
         ibridges_setup()
     elif subcommand == "search":
         ibridges_search()
+    elif subcommand == "agent":
+        ibridges_agent()
     else:
         print(f"Invalid subcommand ({subcommand}). For help see ibridges --help")
         sys.exit(1)
@@ -182,7 +205,16 @@ def _get_ienv_path() -> Union[None, str]:
         return None
 
 
-def _cli_auth(ienv_path: Union[None, str, Path]):
+def _resolve_ienv_path(ienv_path: Union[None, str, Path]) -> str:
+    """Get the absolute path of the iRODS environment file, which can be given by its alias."""
+    aliases = _get_ibridges_conf(ienv_path).get("aliases", {})
+    if str(ienv_path) in aliases:
+        return aliases[str(ienv_path)]["path"]
+    return str(Path(ienv_path if ienv_path is not None else DEFAULT_IENV_PATH).absolute())
+
+
+@contextmanager
+def _cli_auth(ienv_path: Union[None, str, Path], lazy: bool = True):
     ibridges_conf = _get_ibridges_conf(ienv_path)
     alias = None
     if str(ienv_path) in ibridges_conf.get("aliases", {}):
@@ -192,13 +224,19 @@ def _cli_auth(ienv_path: Union[None, str, Path]):
     if not Path(ienv_path).exists():
         print(f"Error: Irods environment file or alias '{ienv_path}' does not exist.")
         sys.exit(124)
-    session = interactive_auth(irods_env_path=ienv_path)
+    agent_session = agent.agent_session(ienv_path)
+    if agent_session is not None:
+        # The session of the agent stays open for the next commands.
+        yield agent_session
+        return
+    session = interactive_auth(irods_env_path=ienv_path, lazy=lazy)
     if alias is not None:
         with open(DEFAULT_IRODSA_PATH, "r", encoding="utf-8") as handle:
             irodsa_content = handle.read()
         if irodsa_content != ibridges_conf["aliases"][alias]["irodsa_backup"]:
             _set_alias(alias, ienv_path)
-    return session
+    with session:
+        yield session
 
 def ibridges_init():
     """Create a cached password for future use."""
@@ -224,7 +262,7 @@ def ibridges_init():
         _set_alias(args.alias, args.irods_env_path)
     _set_ienv_path(args.irods_env_path, args.alias)
 
-    with _cli_auth(ienv_path=_get_ienv_path()) as session:
+    with _cli_auth(ienv_path=_get_ienv_path(), lazy=False) as session:
         if not isinstance(session, Session):
             raise ValueError(f"Irods session '{session}' is not a session.")
     print("ibridges init was succesful.")
@@ -390,6 +428,20 @@ def _get_metadata_path(args, ipath: IrodsPath, lpath: Union[str, Path],
     return metadata
 
 
+def _parse_rate(max_rate: Optional[float]) -> Optional[float]:
+    return None if max_rate is None else max_rate * 1e6
+
+
+def _resume_journal(session: Session, args) -> bool:
+    if args.journal is None or not args.journal.is_file():
+        return False
+    print(f"Resuming the transfer recorded in journal '{args.journal}'.")
+    ops = resume(session, args.journal, dry_run=args.dry_run)
+    if args.dry_run:
+        ops.print_summary()
+    return True
+
+
 def ibridges_download():
     """Download a remote data object or collection."""
     parser = argparse.ArgumentParser(
@@ -431,8 +483,32 @@ def ibridges_download():
         type=Path,
         nargs="?",
     )
+    parser.add_argument(
+        "--threads",
+        help="Number of threads per file/data object, by default determined automatically.",
+        type=int,
+        default=None,
+        required=False,
+    )
+    parser.add_argument(
+        "--max-rate",
+        help="Maximum transfer rate in MB/s, by default unlimited.",
+        type=float,
+        default=None,
+        required=False,
+    )
+    parser.add_argument(
+        "--journal",
+        help="File to record the progress in. If the file exists, the interrupted "
+             "transfer recorded in it is resumed.",
+        type=Path,
+        default=None,
+        required=False,
+    )
     args = parser.parse_args()
-    with interactive_auth(irods_env_path=_get_ienv_path()) as session:
+    with _cli_auth(ienv_path=_get_ienv_path()) as session:
+        if _resume_journal(session, args):
+            return
         ipath = _parse_remote(args.remote_path, session)
         lpath = _parse_local(args.local_path)
         metadata = _get_metadata_path(args, ipath, lpath, "download")
@@ -444,6 +520,9 @@ def ibridges_download():
             resc_name=args.resource,
             dry_run=args.dry_run,
             metadata=metadata,
+            num_threads=args.threads,
+            journal=args.journal,
+            max_rate=_parse_rate(args.max_rate),
         )
         if args.dry_run:
             ops.print_summary()
@@ -489,9 +568,33 @@ def ibridges_upload():
         type=Path,
         nargs="?",
     )
+    parser.add_argument(
+        "--threads",
+        help="Number of threads per file/data object, by default determined automatically.",
+        type=int,
+        default=None,
+        required=False,
+    )
+    parser.add_argument(
+        "--max-rate",
+        help="Maximum transfer rate in MB/s, by default unlimited.",
+        type=float,
+        default=None,
+        required=False,
+    )
+    parser.add_argument(
+        "--journal",
+        help="File to record the progress in. If the file exists, the interrupted "
+             "transfer recorded in it is resumed.",
+        type=Path,
+        default=None,
+        required=False,
+    )
     args = parser.parse_args()
 
-    with interactive_auth(irods_env_path=_get_ienv_path()) as session:
+    with _cli_auth(ienv_path=_get_ienv_path()) as session:
+        if _resume_journal(session, args):
+            return
         lpath = _parse_local(args.local_path)
         ipath = _parse_remote(args.remote_path, session)
         metadata = _get_metadata_path(args, ipath, lpath, "upload")
@@ -503,6 +606,9 @@ def ibridges_upload():
             resc_name=args.resource,
             dry_run=args.dry_run,
             metadata=metadata,
+            num_threads=args.threads,
+            journal=args.journal,
+            max_rate=_parse_rate(args.max_rate),
         )
         if args.dry_run:
             ops.print_summary()
@@ -541,9 +647,33 @@ def ibridges_sync():
         type=Path,
         nargs="?",
     )
+    parser.add_argument(
+        "--threads",
+        help="Number of threads per file/data object, by default determined automatically.",
+        type=int,
+        default=None,
+        required=False,
+    )
+    parser.add_argument(
+        "--max-rate",
+        help="Maximum transfer rate in MB/s, by default unlimited.",
+        type=float,
+        default=None,
+        required=False,
+    )
+    parser.add_argument(
+        "--journal",
+        help="File to record the progress in. If the file exists, the interrupted "
+             "transfer recorded in it is resumed.",
+        type=Path,
+        default=None,
+        required=False,
+    )
     args = parser.parse_args()
 
-    with interactive_auth(irods_env_path=_get_ienv_path()) as session:
+    with _cli_auth(ienv_path=_get_ienv_path()) as session:
+        if _resume_journal(session, args):
+            return
         src_path = _parse_str(args.source, session)
         dest_path = _parse_str(args.destination, session)
         if isinstance(src_path, Path) and isinstance(dest_path, IrodsPath):
@@ -560,6 +690,9 @@ def ibridges_sync():
             dest_path,
             dry_run=args.dry_run,
             metadata=metadata,
+            num_threads=args.threads,
+            journal=args.journal,
+            max_rate=_parse_rate(args.max_rate),
         )
         if args.dry_run:
             ops.print_summary()
@@ -748,3 +881,60 @@ ibridges search irods:some_collection --item_type collection
         )
         for cur_path in search_res:
             print(cur_path)
+
+
+def ibridges_agent():
+    """Manage the agent that keeps sessions open between commands."""
+    parser = argparse.ArgumentParser(
+        prog="ibridges agent",
+        description="Manage the local agent, which keeps sessions open between commands. "
+                    "While the agent is running, the list, tree, search and mkcoll commands "
+                    "are run by the agent.",
+    )
+    parser.add_argument(
+        "action",
+        choices=["start", "stop", "status", "serve"],
+        help="Start the agent in the background, stop it, show its status, or run it in the "
+             "foreground (serve).",
+    )
+    parser.add_argument(
+        "--idle-timeout",
+        help="Number of seconds without commands after which the agent stops.",
+        type=float,
+        default=900.0,
+    )
+    parser.add_argument(
+        "--cache-ttl",
+        help="Number of seconds that listings and search results are cached, 0 to disable.",
+        type=float,
+        default=30.0,
+    )
+    args = parser.parse_args()
+    if not agent.AGENT_SUPPORTED or not agent.PEER_CHECK_SUPPORTED:
+        print("Error: The ibridges agent is not supported on this platform.")
+        sys.exit(1)
+    if args.action == "serve":
+        agent.IbridgesAgent(_run_subcommand, idle_timeout=args.idle_timeout,
+                            cache_ttl=args.cache_ttl).serve()
+    elif args.action == "start":
+        if not agent.start_agent(args.idle_timeout, args.cache_ttl):
+            print(f"Error: Could not start the agent, see {agent.AGENT_LOG_FP}.")
+            sys.exit(1)
+        print("The ibridges agent is running.")
+    elif args.action == "stop":
+        if agent.send_request({"command": "stop"}) is None:
+            print("The ibridges agent is not running.")
+        else:
+            print("The ibridges agent has been stopped.")
+    else:
+        status = agent.send_request({"command": "status"})
+        if status is None:
+            print("The ibridges agent is not running.")
+        else:
+            print(f"The ibridges agent is running (pid {status['pid']}, "
+                  f"uptime {status['uptime']:.0f} s) with sessions for: "
+                  f"{', '.join(status['sessions']) or 'none'}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,485 @@
+"""Local agent that keeps sessions warm across calls of the command line interface.
+
+Every call of the command line interface normally has to authenticate with the iRODS
+server. The agent is an opt-in background process that listens on a Unix socket which
+is only accessible by the user who started it. It holds authenticated sessions and a
+short-lived cache of listings and search results. While the agent is running, the
+commands of the command line interface are sent to it and executed there, which removes
+the connection and authentication time of each call. Transfers can take a long time, so
+they are always run by the client, which lets the agent know when data has changed.
+
+The agent is started with :code:`ibridges agent start` and stops by itself after it has not
+been used for some time. Set the environment variable IBRIDGES_AGENT to "off" to run the
+commands without the agent.
+"""
+
+from __future__ import annotations
+
+import io
+import json
+import os
+import socket
+import socketserver
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager, redirect_stderr, redirect_stdout
+from pathlib import Path
+from typing import Callable, Optional, Union
+
+from ibridges.retry import reconnect_session
+from ibridges.session import Session
+
+AGENT_SUPPORTED = hasattr(socket, "AF_UNIX") and hasattr(os, "getuid")
+# The agent only accepts connections of the same user, which needs the credentials of the peer.
+PEER_CHECK_SUPPORTED = hasattr(socket, "SO_PEERCRED") or hasattr(socket, "LOCAL_PEERCRED")
+AGENT_LOG_FP = Path.home() / ".ibridges" / "agent.log"
+
+# Commands that only read from the iRODS server, of which the output can be cached.
+READ_COMMANDS = ("list", "tree", "search")
+# Commands that change the data on the iRODS server, which invalidate the cache.
+WRITE_COMMANDS = ("upload", "sync", "mkcoll")
+# Commands that are run by the client, after which the cached output is removed. After
+# 'init' the commands can refer to another server or user.
+INVALIDATING_COMMANDS = WRITE_COMMANDS + ("init",)
+# Commands that are run by the agent if it is running. Transfers are run by the client,
+# since the agent runs one command at a time.
+AGENT_COMMANDS = READ_COMMANDS + ("mkcoll",)
+
+# Number of seconds that a command waits for another command that the agent is running,
+# before it is run by the client instead.
+RUN_WAIT = 5.0
+# Number of seconds that the client waits for the response of the agent, before it runs
+# the command itself.
+RESPONSE_TIMEOUT = 60.0
+
+# Sessions are checked before reuse if they have been idle for this number of seconds.
+HEALTH_CHECK_INTERVAL = 60.0
+
+# Level of the LOCAL_PEERCRED socket option on macOS and BSD.
+_SOL_LOCAL = 0
+
+# The agent that is running commands in the current thread.
+_SERVING = threading.local()
+
+
+class AgentUnavailableError(Exception):
+    """The command cannot be run by the agent and should be run by the caller instead."""
+
+
+def agent_socket_path() -> Path:
+    """Get the location of the socket of the agent of the current user.
+
+    Returns
+    -------
+        Path to the socket, in a directory that is only accessible by the current user.
+
+    """
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    return Path(runtime_dir) / f"ibridges-{os.getuid()}" / "agent.sock"
+
+
+def _private_dir(socket_fp: Path) -> bool:
+    """Check that the directory of the socket is only accessible by the current user."""
+    try:
+        stat = socket_fp.parent.stat()
+    except OSError:
+        return False
+    return stat.st_uid == os.getuid() and stat.st_mode & 0o077 == 0
+
+
+class IbridgesAgent():  # pylint: disable=too-many-instance-attributes
+    """Agent that runs commands of the command line interface with warm sessions.
+
+    Parameters
+    ----------
+    runner:
+        Function that runs a subcommand of the command line interface, using the global
+        sys.argv as its arguments.
+    socket_fp:
+        Socket to listen on, by default :func:`agent_socket_path`.
+    idle_timeout:
+        Number of seconds without any commands after which the agent stops, by default 900.
+    cache_ttl:
+        Number of seconds that the output of listings and searches is cached, by default 30.
+        Use 0 to disable the cache.
+
+    Examples
+    --------
+    >>> IbridgesAgent(_run_subcommand, idle_timeout=3600).serve()
+
+    """
+
+    def __init__(self, runner: Callable[[str], None], socket_fp: Union[None, str, Path] = None,
+                 idle_timeout: float = 900.0, cache_ttl: float = 30.0):
+        """Prepare the agent, without listening yet."""
+        self.runner = runner
+        self.socket_fp = agent_socket_path() if socket_fp is None else Path(socket_fp)
+        self.idle_timeout = idle_timeout
+        self.cache_ttl = cache_ttl
+        self.sessions: dict[str, tuple[Session, float]] = {}
+        self.cache: dict[tuple, tuple[dict, float]] = {}
+        self.start_time = time.time()
+        self.last_request = time.monotonic()
+        self._stopped = False
+        self._lock = threading.Lock()
+
+    def serve(self):
+        """Listen for commands until the agent is idle for too long or stopped."""
+        if not AGENT_SUPPORTED:
+            raise OSError("The ibridges agent needs Unix sockets, which are not available.")
+        if not PEER_CHECK_SUPPORTED:
+            raise OSError("The ibridges agent cannot check which user connects to it on this "
+                          "platform, so it cannot be started safely.")
+        self.socket_fp.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        if not _private_dir(self.socket_fp):
+            raise PermissionError(f"Directory {self.socket_fp.parent} should only be accessible "
+                                  "by the current user.")
+        if self.socket_fp.exists():
+            if send_request({"command": "status"}, self.socket_fp) is not None:
+                raise RuntimeError(f"Another ibridges agent is listening on {self.socket_fp}.")
+            self.socket_fp.unlink()
+        server = _AgentServer(str(self.socket_fp), _AgentHandler, self)
+        try:
+            os.chmod(self.socket_fp, 0o600)
+            while not self._stopped and time.monotonic() - self.last_request < self.idle_timeout:
+                server.handle_request()
+        finally:
+            server.server_close()
+            self.socket_fp.unlink(missing_ok=True)
+            # Wait for a command that is still running before closing its session.
+            with self._lock:
+                for session, _ in self.sessions.values():
+                    session.close()
+                self.sessions = {}
+
+    def handle(self, request: dict) -> dict:
+        """Handle a single request of a client.
+
+        Parameters
+        ----------
+        request:
+            Request with the 'command' and its arguments.
+
+        Returns
+        -------
+            Response to be sent to the client.
+
+        """
+        self.last_request = time.monotonic()
+        command = request.get("command")
+        if command == "status":
+            return {"pid": os.getpid(), "uptime": time.time() - self.start_time,
+                    "sessions": list(self.sessions.copy()), "cached": len(self.cache)}
+        if command == "stop":
+            self._stopped = True
+            return {"stopped": True}
+        if command == "invalidate":
+            self.cache = {}
+            return {"invalidated": True}
+        if command == "run":
+            return self.run(request["subcommand"], request["argv"], request["cwd"],
+                            request.get("ienv_path"))
+        return {"error": f"Unknown command '{command}'."}
+
+    def run(self, subcommand: str, argv: list[str], cwd: str,
+            ienv_path: Optional[str] = None) -> dict:
+        """Run a subcommand of the command line interface.
+
+        Parameters
+        ----------
+        subcommand:
+            Subcommand to run, e.g. 'list'.
+        argv:
+            Arguments of the subcommand.
+        cwd:
+            Working directory of the client, which is used for relative paths.
+        ienv_path:
+            iRODS environment file that the command uses, so that the output for
+            different servers is cached separately.
+
+        Returns
+        -------
+            Output and exit code of the command, or a request to run the command in the
+            client instead, for instance when the agent is busy with another command.
+
+        """
+        if subcommand not in AGENT_COMMANDS:
+            return {"fallback": True}
+        key = (subcommand, tuple(argv), cwd, ienv_path)
+        now = time.monotonic()
+        if subcommand in READ_COMMANDS and key in self.cache:
+            response, cache_time = self.cache[key]
+            if now - cache_time <= self.cache_ttl:
+                return response
+        if subcommand in WRITE_COMMANDS:
+            self.cache = {}
+
+        # The CLI uses the global working directory, argv and output streams, so only one
+        # command can run at the same time.
+        if not self._lock.acquire(timeout=RUN_WAIT):  # pylint: disable=consider-using-with
+            return {"fallback": True}
+        stdout, stderr = io.StringIO(), io.StringIO()
+        exit_code = 0
+        try:
+            with _working_dir(cwd), _argv(argv), redirect_stdout(stdout), \
+                    redirect_stderr(stderr):
+                _SERVING.agent = self
+                try:
+                    self.runner(subcommand)
+                except AgentUnavailableError:
+                    return {"fallback": True}
+                except SystemExit as exc:
+                    exit_code = (exc.code if isinstance(exc.code, int)
+                                 else int(exc.code is not None))
+                except Exception as exc:  # pylint: disable=broad-exception-caught
+                    print(f"Error: {exc!r}", file=sys.stderr)
+                    exit_code = 1
+                finally:
+                    _SERVING.agent = None
+        finally:
+            self._lock.release()
+        response = {"stdout": stdout.getvalue(), "stderr": stderr.getvalue(),
+                    "exit_code": exit_code}
+        if subcommand in READ_COMMANDS and exit_code == 0 and self.cache_ttl > 0:
+            self.cache[key] = (response, time.monotonic())
+        return response
+
+    def session(self, ienv_path: Union[str, Path]) -> Session:
+        """Get the warm session for an iRODS environment, connecting if necessary.
+
+        Parameters
+        ----------
+        ienv_path:
+            iRODS environment file of the session.
+
+        Raises
+        ------
+        AgentUnavailableError:
+            If the session cannot be created without asking for a password.
+
+        Returns
+        -------
+            An authenticated session, which should not be closed.
+
+        """
+        key = str(Path(ienv_path).absolute())
+        if key in self.sessions:
+            session, last_used = self.sessions[key]
+            if time.monotonic() - last_used > HEALTH_CHECK_INTERVAL:
+                reconnect_session(session)
+        else:
+            try:
+                session = Session(ienv_path)
+            except Exception as exc:
+                # The client can ask for the password interactively.
+                raise AgentUnavailableError(repr(exc)) from exc
+        self.sessions[key] = (session, time.monotonic())
+        return session
+
+
+def agent_session(ienv_path: Union[str, Path]) -> Optional[Session]:
+    """Get the session of the agent if a command is run by the agent in this thread.
+
+    Parameters
+    ----------
+    ienv_path:
+        iRODS environment file of the session.
+
+    Returns
+    -------
+        The warm session of the agent, or None if the command is not run by the agent.
+
+    """
+    agent = getattr(_SERVING, "agent", None)
+    if agent is None:
+        return None
+    return agent.session(ienv_path)
+
+
+def send_request(request: dict, socket_fp: Union[None, str, Path] = None,
+                 timeout: Optional[float] = 1.0,
+                 response_timeout: Optional[float] = RESPONSE_TIMEOUT) -> Optional[dict]:
+    """Send a request to the agent.
+
+    Parameters
+    ----------
+    request:
+        Request to send.
+    socket_fp:
+        Socket of the agent, by default :func:`agent_socket_path`.
+    timeout:
+        Timeout to connect to the agent in seconds.
+    response_timeout:
+        Timeout to wait for the response in seconds, by default 60.
+
+    Returns
+    -------
+        The response of the agent, or None if the agent is not running or did not respond
+        in time.
+
+    """
+    if not AGENT_SUPPORTED:
+        return None
+    socket_fp = agent_socket_path() if socket_fp is None else Path(socket_fp)
+    if not socket_fp.exists() or not _private_dir(socket_fp):
+        return None
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.settimeout(timeout)
+            sock.connect(str(socket_fp))
+            sock.settimeout(response_timeout)
+            sock.sendall(json.dumps(request).encode("utf-8") + b"\n")
+            with sock.makefile("rb") as handle:
+                line = handle.readline()
+        except OSError:
+            return None
+    if not line:
+        return None
+    return json.loads(line)
+
+
+def forward(subcommand: str, argv: list[str], ienv_path: Optional[str] = None) -> Optional[int]:
+    """Run a subcommand of the command line interface with the agent, if it is running.
+
+    Parameters
+    ----------
+    subcommand:
+        Subcommand to run, e.g. 'list'.
+    argv:
+        Arguments of the subcommand.
+    ienv_path:
+        iRODS environment file that the command uses.
+
+    Returns
+    -------
+        Exit code of the command, or None if the command should be run without the agent.
+
+    """
+    if subcommand not in AGENT_COMMANDS or os.environ.get("IBRIDGES_AGENT") == "off":
+        return None
+    response = send_request({"command": "run", "subcommand": subcommand, "argv": argv,
+                             "cwd": os.getcwd(), "ienv_path": ienv_path})
+    if response is None or response.get("fallback") or "exit_code" not in response:
+        return None
+    sys.stdout.write(response["stdout"])
+    sys.stderr.write(response["stderr"])
+    return response["exit_code"]
+
+
+def notify_changed(subcommand: str):
+    """Let the agent know that a command run by the client might have changed data.
+
+    The cached listings and search results of the agent are then removed. This is also
+    done after 'init', which can switch to another server or user.
+
+    Parameters
+    ----------
+    subcommand:
+        Subcommand that was run, e.g. 'upload'.
+
+    """
+    if subcommand in INVALIDATING_COMMANDS and os.environ.get("IBRIDGES_AGENT") != "off":
+        send_request({"command": "invalidate"})
+
+
+def start_agent(idle_timeout: float = 900.0, cache_ttl: float = 30.0) -> bool:
+    """Start the agent in the background, if it is not running already.
+
+    Parameters
+    ----------
+    idle_timeout:
+        Number of seconds without any commands after which the agent stops.
+    cache_ttl:
+        Number of seconds that the output of listings and searches is cached.
+
+    Returns
+    -------
+        True if the agent is running.
+
+    """
+    if send_request({"command": "status"}) is not None:
+        return True
+    AGENT_LOG_FP.parent.mkdir(parents=True, exist_ok=True)
+    with open(AGENT_LOG_FP, "a", encoding="utf-8") as log_handle:
+        subprocess.Popen(  # pylint: disable=consider-using-with
+            [sys.executable, "-m", "ibridges", "agent", "serve", "--idle-timeout",
+             str(idle_timeout), "--cache-ttl", str(cache_ttl)],
+            stdin=subprocess.DEVNULL, stdout=log_handle, stderr=log_handle,
+            start_new_session=True)
+    for _ in range(50):
+        if send_request({"command": "status"}) is not None:
+            return True
+        time.sleep(0.1)
+    return False
+
+
+class _AgentServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Server that only accepts connections of the user running the agent.
+
+    Each connection is handled in its own thread, so that the status can be requested
+    and the agent can be stopped while it is running a command.
+    """
+
+    timeout = 1.0
+    daemon_threads = True
+    block_on_close = False
+
+    def __init__(self, socket_fp: str, handler, agent: IbridgesAgent):
+        self.agent = agent
+        super().__init__(socket_fp, handler)
+
+    def verify_request(self, request, client_address) -> bool:
+        """Reject connections of other users, and of peers that cannot be identified."""
+        try:
+            return _peer_uid(request) == os.getuid()
+        except OSError:
+            return False
+
+
+class _AgentHandler(socketserver.StreamRequestHandler):
+    """Read a single JSON request and write the JSON response."""
+
+    def handle(self):
+        line = self.rfile.readline()
+        try:
+            response = self.server.agent.handle(json.loads(line))  # type: ignore[attr-defined]
+        except (ValueError, KeyError, TypeError) as exc:
+            response = {"error": f"Invalid request: {exc!r}"}
+        self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+
+
+def _peer_uid(sock: socket.socket) -> Optional[int]:
+    """Get the user id of the process on the other side of a Unix socket."""
+    if hasattr(socket, "SO_PEERCRED"):
+        # Linux: struct ucred with the pid, uid and gid.
+        creds = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+        return struct.unpack("3i", creds)[1]
+    if hasattr(socket, "LOCAL_PEERCRED"):
+        # macOS and BSD: struct xucred with the version, uid, number of groups and groups.
+        creds = sock.getsockopt(_SOL_LOCAL, socket.LOCAL_PEERCRED, struct.calcsize("2Ih16I"))
+        return struct.unpack_from("2I", creds)[1]
+    return None
+
+
+@contextmanager
+def _working_dir(cwd: str):
+    old_cwd = os.getcwd()
+    os.chdir(cwd)
+    try:
+        yield
+    finally:
+        os.chdir(old_cwd)
+
+
+@contextmanager
+def _argv(argv: list[str]):
+    old_argv = sys.argv
+    sys.argv = ["ibridges"] + list(argv)
+    try:
+        yield
+    finally:
+        sys.argv = old_argv
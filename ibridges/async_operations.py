@@ -0,0 +1,221 @@
+"""Asynchronous data transfers for use with asyncio.
+
+These functions have the same purpose as the ones in :mod:`ibridges.data_operations`, but
+do not block the event loop. The operations are planned in a worker thread, after which
+they are executed with :meth:`ibridges.executor.Operations.execute_async`.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from functools import partial
+from pathlib import Path
+from typing import Callable, Optional, Union
+
+from ibridges import data_operations
+from ibridges.executor import Operations
+from ibridges.path import IrodsPath
+from ibridges.session import Session
+
+
+async def upload(
+    session: Session,
+    local_path: Union[str, Path],
+    irods_path: Union[str, IrodsPath],
+    ignore_err: bool = False,
+    dry_run: bool = False,
+    max_workers: int = 4,
+    progress: Optional[Callable] = None,
+    journal: Union[None, str, Path] = None,
+    **kwargs,
+) -> Operations:
+    """Upload a local directory or file to iRODS without blocking the event loop.
+
+    Parameters
+    ----------
+    session:
+        Session to upload the data to.
+    local_path:
+        Absolute path to the directory to upload
+    irods_path:
+        Absolute irods destination path
+    ignore_err:
+        If True, errors are converted into warnings and the remaining files are uploaded.
+    dry_run:
+        Only plan the upload, without executing it.
+    max_workers:
+        Maximum number of files that are uploaded at the same time, by default 4.
+    progress:
+        Function or coroutine function that receives the :class:`ibridges.executor.TransferEvent`
+        objects of the upload.
+    journal:
+        If not None, file in which the progress of the upload is recorded.
+    kwargs:
+        Other arguments for :func:`ibridges.data_operations.upload`, such as overwrite.
+
+    Returns
+    -------
+        Operations object that was executed, or can be executed in case of a dry-run.
+
+    Examples
+    --------
+    >>> await upload(session, Path("dir"), IrodsPath(session, "~/some_col"), max_workers=16)
+
+    """
+    ops = await _plan(data_operations.upload, session, local_path, irods_path,
+                      ignore_err=ignore_err, **kwargs)
+    if not dry_run:
+        await ops.execute_async(session, ignore_err=ignore_err, max_workers=max_workers,
+                                progress=progress, journal=journal)
+    return ops
+
+
+async def download(
+    session: Session,
+    irods_path: Union[str, IrodsPath],
+    local_path: Union[str, Path],
+    ignore_err: bool = False,
+    dry_run: bool = False,
+    max_workers: int = 4,
+    progress: Optional[Callable] = None,
+    journal: Union[None, str, Path] = None,
+    **kwargs,
+) -> Operations:
+    """Download a collection or data object without blocking the event loop.
+
+    Files only appear at their destination when they are completely downloaded, also
+    when the download is cancelled.
+
+    Parameters
+    ----------
+    session:
+        Session to download the collection from.
+    irods_path:
+        Absolute irods source path pointing to a collection or data object.
+    local_path:
+        Absolute path to the destination directory or file.
+    ignore_err:
+        If True, errors are converted into warnings and the remaining data objects are
+        downloaded.
+    dry_run:
+        Only plan the download, without executing it.
+    max_workers:
+        Maximum number of data objects that are downloaded at the same time, by default 4.
+    progress:
+        Function or coroutine function that receives the :class:`ibridges.executor.TransferEvent`
+        objects of the download.
+    journal:
+        If not None, file in which the progress of the download is recorded.
+    kwargs:
+        Other arguments for :func:`ibridges.data_operations.download`, such as overwrite.
+
+    Returns
+    -------
+        Operations object that was executed, or can be executed in case of a dry-run.
+
+    Examples
+    --------
+    >>> await download(session, IrodsPath(session, "~/some_col"), Path("dir"))
+
+    """
+    ops = await _plan(data_operations.download, session, irods_path, local_path,
+                      ignore_err=ignore_err, **kwargs)
+    if not dry_run:
+        await ops.execute_async(session, ignore_err=ignore_err, max_workers=max_workers,
+                                progress=progress, journal=journal)
+    return ops
+
+
+async def sync(
+    session: Session,
+    source: Union[str, Path, IrodsPath],
+    target: Union[str, Path, IrodsPath],
+    ignore_err: bool = False,
+    dry_run: bool = False,
+    max_workers: int = 4,
+    progress: Optional[Callable] = None,
+    journal: Union[None, str, Path] = None,
+    **kwargs,
+) -> Operations:
+    """Synchronize data between a local directory and iRODS without blocking the event loop.
+
+    Parameters
+    ----------
+    session:
+        Session to synchronize with.
+    source:
+        Existing local folder or iRODS collection to synchronize from.
+    target:
+        Local folder or iRODS collection to synchronize to.
+    ignore_err:
+        If True, errors are converted into warnings and the remaining files are transferred.
+    dry_run:
+        Only plan the synchronization, without executing it.
+    max_workers:
+        Maximum number of files/data objects that are transferred at the same time, by default 4.
+    progress:
+        Function or coroutine function that receives the :class:`ibridges.executor.TransferEvent`
+        objects of the synchronization.
+    journal:
+        If not None, file in which the progress of the synchronization is recorded.
+    kwargs:
+        Other arguments for :func:`ibridges.data_operations.sync`, such as max_level.
+
+    Returns
+    -------
+        Operations object that was executed, or can be executed in case of a dry-run.
+
+    Examples
+    --------
+    >>> await sync(session, Path("dir"), IrodsPath(session, "~/some_col"))
+
+    """
+    ops = await _plan(data_operations.sync, session, source, target,
+                      ignore_err=ignore_err, **kwargs)
+    if not dry_run:
+        await ops.execute_async(session, ignore_err=ignore_err, max_workers=max_workers,
+                                progress=progress, journal=journal)
+    return ops
+
+
+async def resume(
+    session: Session,
+    journal: Union[str, Path],
+    ignore_err: bool = False,
+    max_workers: int = 4,
+    progress: Optional[Callable] = None,
+) -> Operations:
+    """Resume an interrupted transfer without blocking the event loop.
+
+    See :func:`ibridges.data_operations.resume`.
+
+    Parameters
+    ----------
+    session:
+        Session to resume the transfer with.
+    journal:
+        Journal file of the interrupted transfer.
+    ignore_err:
+        If True, errors are converted into warnings and the remaining operations are done.
+    max_workers:
+        Maximum number of files/data objects that are transferred at the same time, by default 4.
+    progress:
+        Function or coroutine function that receives the :class:`ibridges.executor.TransferEvent`
+        objects of the transfer.
+
+    Returns
+    -------
+        Operations object with the operations that were not completed before.
+
+    """
+    ops = await _plan(data_operations.resume, session, journal)
+    await ops.execute_async(session, ignore_err=ignore_err, max_workers=max_workers,
+                            progress=progress, journal=journal)
+    return ops
+
+
+async def _plan(operation: Callable, *args, **kwargs) -> Operations:
+    """Plan the operations in a worker thread, since this queries the iRODS server."""
+    kwargs["dry_run"] = True
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, partial(operation, *args, **kwargs))
@@ -0,0 +1,163 @@
+"""Cache of the status of iRODS paths, shared by all paths of a session.
+
+Checking whether a path exists, or getting its size or checksum, needs a round trip to the
+iRODS server. Since the same paths are often checked several times in a row, the results
+are kept for a short time in a :class:`StatCache` that belongs to the session.
+
+Writes done by iBridges remove the affected paths from the cache. Changes made by other
+clients are only seen after the entries expire, so the cache can be turned off when
+strict consistency is needed, see :class:`ibridges.session.Session`.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+DEFAULT_TTL = 10.0
+DEFAULT_MAX_SIZE = 100000
+
+
+class StatCache():
+    """Thread-safe cache of the type, size and checksum of iRODS paths.
+
+    Entries are keyed by the absolute path and expire after a fixed time. When the cache
+    is full, the entries that were used least recently are removed first.
+
+    Parameters
+    ----------
+    ttl:
+        Number of seconds after which an entry expires, by default 10.
+    max_size:
+        Maximum number of paths in the cache, by default 100000.
+
+    Examples
+    --------
+    >>> session.stat_cache = StatCache(ttl=60)  # Keep the results for a minute.
+    >>> session.stat_cache.clear()  # Forget everything, for example after changes by others.
+    >>> session.stat_cache = None  # Always ask the server.
+
+    """
+
+    def __init__(self, ttl: float = DEFAULT_TTL, max_size: int = DEFAULT_MAX_SIZE):
+        """Create an empty cache."""
+        if ttl <= 0:
+            raise ValueError(f"Time to live of the cache should be positive, not {ttl}.")
+        if max_size < 1:
+            raise ValueError(f"Size of the cache should be at least 1, not {max_size}.")
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path: str, field: str):
+        """Get a cached value for a path.
+
+        Parameters
+        ----------
+        path:
+            Absolute iRODS path.
+        field:
+            One of "is_collection", "is_dataobject", "size" or "checksum".
+
+        Returns
+        -------
+            The cached value, or None if it is not known or has expired.
+
+        """
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None:
+                return None
+            expires, values = entry
+            if expires < time.monotonic():
+                del self._entries[path]
+                return None
+            self._entries.move_to_end(path)
+            return values.get(field)
+
+    def put(self, path: str, **values):
+        """Store values for a path, keeping other values that are still valid.
+
+        A path that is a collection is not a data object and the other way around,
+        so storing that one of them is true also stores that the other is false.
+
+        Parameters
+        ----------
+        path:
+            Absolute iRODS path.
+        values:
+            Values of the fields to store, see :meth:`get`.
+
+        """
+        if values.get("is_collection"):
+            values["is_dataobject"] = False
+        if values.get("is_dataobject"):
+            values["is_collection"] = False
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.pop(path, None)
+            old_values = entry[1] if entry is not None and entry[0] >= now else {}
+            self._entries[path] = (now + self.ttl, {**old_values, **values})
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, path: str, recursive: bool = False):
+        """Remove a path from the cache, after it has been changed.
+
+        The parent collections are also removed, since they might have been created.
+
+        Parameters
+        ----------
+        path:
+            Absolute iRODS path.
+        recursive:
+            Also remove all paths below it, for instance when a collection was moved or removed.
+
+        """
+        path = path.rstrip("/") or "/"
+        with self._lock:
+            parent = path
+            while True:
+                self._entries.pop(parent, None)
+                if parent == "/":
+                    break
+                parent = parent.rsplit("/", 1)[0] or "/"
+            if recursive:
+                prefix = path.rstrip("/") + "/"
+                for sub_path in [key for key in self._entries if key.startswith(prefix)]:
+                    del self._entries[sub_path]
+
+    def clear(self):
+        """Remove all entries."""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        """Get the number of paths in the cache, including expired ones."""
+        return len(self._entries)
+
+
+def get_stat_cache(session) -> Optional[StatCache]:
+    """Get the stat cache of a session, or None if it is turned off."""
+    return getattr(session, "stat_cache", None)
+
+
+def invalidate(session, path, recursive: bool = False):
+    """Remove a path that was changed from the stat cache of the session.
+
+    Parameters
+    ----------
+    session:
+        Session that was used to change the path.
+    path:
+        Absolute iRODS path, or IrodsPath.
+    recursive:
+        Also remove all paths below it.
+
+    """
+    cache = get_stat_cache(session)
+    if cache is not None:
+        cache.invalidate(str(path), recursive=recursive)
@@ -9,22 +9,29 @@ from __future__ import annotations
 
 import os
 import warnings
+from collections import defaultdict
 from pathlib import Path
-from typing import Optional, Union
+from typing import Iterator, Optional, Union
 
 import irods.collection
 import irods.data_object
 import irods.exception
 
 from ibridges.executor import Operations
-from ibridges.path import CachedIrodsPath, IrodsPath
+from ibridges.path import (
+    CachedIrodsPath,
+    IrodsPath,
+    _list_collection,
+    _list_data_objects,
+    _list_subcollections,
+)
 from ibridges.session import Session
+from ibridges.throttle import BULK
+from ibridges.transfer import BUNDLE_MAX_FILES, BUNDLE_MAX_SIZE
 from ibridges.util import checksums_equal
 
-NUM_THREADS = 4
 
-
-def upload(
+def upload(  # pylint: disable=too-many-arguments
     session: Session,
     local_path: Union[str, Path],
     irods_path: Union[str, IrodsPath],
@@ -35,13 +42,21 @@ def upload(
     options: Optional[dict] = None,
     dry_run: bool = False,
     metadata: Union[None, str, Path] = None,
+    max_workers: int = 1,
+    num_threads: Optional[int] = None,
+    bundle_threshold: Optional[int] = None,
+    journal: Union[None, str, Path] = None,
+    resumable_size: Optional[int] = None,
+    max_rate: Optional[float] = None,
+    priority: str = BULK,
 ) -> Operations:
     """Upload a local directory or file to iRODS.
 
     Parameters
     ----------
     session:
-        Session to upload the data to.
+        Session to upload the data to. This can also be a :class:`ibridges.pool.SessionPool`,
+        so that each worker uses its own session.
     local_path:
         Absolute path to the directory to upload
     irods_path:
@@ -62,6 +77,29 @@ def upload(
         Whether to do a dry run before uploading the files/folders.
     metadata:
         If not None, it should point to a file that contains the metadata for the upload.
+    max_workers:
+        Number of files/data objects that are transferred concurrently, by default 1.
+        Increasing this is mostly useful when transferring many small files.
+    num_threads:
+        Number of threads used to transfer a single file/data object. By default None,
+        in which case it is determined from the size of the file and the measured throughput.
+    bundle_threshold:
+        If not None, new files smaller than this size (in bytes) are packed into tar bundles
+        while uploading, which are then extracted on the iRODS server. This is much faster for
+        many small files. Larger files and existing data objects are uploaded as usual.
+    journal:
+        If not None, file in which the progress of the upload is recorded. An interrupted
+        upload can then be continued with :func:`resume`.
+    resumable_size:
+        If not None, files and data objects of at least this size (in bytes) are transferred in
+        byte ranges. If such a transfer is interrupted, retrying it only transfers the missing
+        ranges. The checksum is verified when the transfer is completed.
+    max_rate:
+        Maximum transfer rate in bytes per second, by default None (no limit). This limit
+        comes in addition to the global limit set by :func:`ibridges.throttle.set_global_rate`.
+    priority:
+        Priority of the transfers when the bandwidth is limited, either "bulk" (default) or
+        "interactive". Bulk transfers wait while interactive transfers are waiting for bandwidth.
 
     Returns
     -------
@@ -100,6 +138,7 @@ def upload(
             local_path, idest_path, copy_empty_folders=copy_empty_folders, depth=None,
             overwrite=overwrite, ignore_err=ignore_err
         )
+        _bundle_uploads(ops, idest_path, bundle_threshold)
         if not idest_path.collection_exists():
             ops.add_create_coll(idest_path)
         if not ipath.collection_exists():
@@ -108,7 +147,8 @@ def upload(
         idest_path = ipath / local_path.name if ipath.collection_exists() else ipath
         obj_exists = idest_path.dataobject_exists()
         if not obj_exists or _transfer_needed(idest_path, local_path, overwrite, ignore_err):
-            ops.add_upload(local_path, idest_path)
+            ops.add_upload(local_path, CachedIrodsPath(session, None, obj_exists, None,
+                                                       str(idest_path)))
 
     elif local_path.is_symlink():
         raise FileNotFoundError(
@@ -118,14 +158,19 @@ def upload(
         raise FileNotFoundError(f"Cannot upload {local_path}: file or directory does not exist.")
     ops.resc_name = resc_name
     ops.options = options
+    ops.num_threads = num_threads
+    ops.resumable_size = resumable_size
+    ops.limiter.set_rate(max_rate)
+    ops.priority = priority
     if metadata is not None:
         ops.add_meta_upload(idest_path, metadata)
     if not dry_run:
-        ops.execute(session, ignore_err=ignore_err)
+        ops.execute(session, ignore_err=ignore_err, max_workers=max_workers,
+                    journal=journal)
     return ops
 
 
-def download(
+def download(  # pylint: disable=too-many-arguments
     session: Session,
     irods_path: Union[str, IrodsPath],
     local_path: Union[str, Path],
@@ -136,13 +181,21 @@ def download(
     options: Optional[dict] = None,
     dry_run: bool = False,
     metadata: Union[None, str, Path] = None,
+    max_workers: int = 1,
+    num_threads: Optional[int] = None,
+    bundle_threshold: Optional[int] = None,
+    journal: Union[None, str, Path] = None,
+    resumable_size: Optional[int] = None,
+    max_rate: Optional[float] = None,
+    priority: str = BULK,
 ) -> Operations:
     """Download a collection or data object to the local filesystem.
 
     Parameters
     ----------
     session:
-        Session to download the collection from.
+        Session to download the collection from. This can also be a
+        :class:`ibridges.pool.SessionPool`, so that each worker uses its own session.
     irods_path:
         Absolute irods source path pointing to a collection
     local_path:
@@ -165,6 +218,30 @@ def download(
     metadata:
         If not None, the path to store the metadata to in JSON format.
         It is recommended to use the .json suffix.
+    max_workers:
+        Number of files/data objects that are transferred concurrently, by default 1.
+        Increasing this is mostly useful when transferring many small files.
+    num_threads:
+        Number of threads used to transfer a single file/data object. By default None,
+        in which case it is determined from the size of the file and the measured throughput.
+    bundle_threshold:
+        If not None, (sub)collections that only contain data objects smaller than this size
+        (in bytes) are packed into a tar archive on the iRODS server, which is extracted locally
+        while downloading. This is much faster for many small data objects.
+        Data objects larger than the threshold are downloaded as usual.
+    journal:
+        If not None, file in which the progress of the download is recorded. An interrupted
+        download can then be continued with :func:`resume`.
+    resumable_size:
+        If not None, files and data objects of at least this size (in bytes) are transferred in
+        byte ranges. If such a transfer is interrupted, retrying it only transfers the missing
+        ranges. The checksum is verified when the transfer is completed.
+    max_rate:
+        Maximum transfer rate in bytes per second, by default None (no limit). This limit
+        comes in addition to the global limit set by :func:`ibridges.throttle.set_global_rate`.
+    priority:
+        Priority of the transfers when the bandwidth is limited, either "bulk" (default) or
+        "interactive". Bulk transfers wait while interactive transfers are waiting for bandwidth.
 
     Returns
     -------
@@ -208,7 +285,7 @@ def download(
         ops = _down_sync_operations(
             irods_path, local_path / irods_path.name, metadata=metadata,
             copy_empty_folders=copy_empty_folders, overwrite=overwrite,
-            ignore_err=ignore_err
+            ignore_err=ignore_err, bundle_threshold=bundle_threshold
         )
         if not local_path.is_dir():
             ops.add_create_dir(Path(local_path))
@@ -217,6 +294,9 @@ def download(
 
         if local_path.is_dir():
             local_path = local_path / irods_path.name
+        # Retrieve the size and checksum once, so that they are not queried during execution.
+        obj = irods_path.dataobject
+        irods_path = CachedIrodsPath(session, obj.size, True, obj.checksum, str(irods_path))
         if not local_path.is_file() or _transfer_needed(
                 irods_path, local_path, overwrite, ignore_err):
             ops.add_download(irods_path, local_path)
@@ -228,8 +308,13 @@ def download(
 
     ops.resc_name = resc_name
     ops.options = options
+    ops.num_threads = num_threads
+    ops.resumable_size = resumable_size
+    ops.limiter.set_rate(max_rate)
+    ops.priority = priority
     if not dry_run:
-        ops.execute(session, ignore_err=ignore_err)
+        ops.execute(session, ignore_err=ignore_err, max_workers=max_workers,
+                    journal=journal)
     return ops
 
 
@@ -261,7 +346,7 @@ def create_collection(
     return IrodsPath.create_collection(session, coll_path)
 
 
-def sync(
+def sync(  # pylint: disable=too-many-arguments
     session: Session,
     source: Union[str, Path, IrodsPath],
     target: Union[str, Path, IrodsPath],
@@ -272,6 +357,13 @@ def sync(
     resc_name: str = "",
     options: Optional[dict] = None,
     metadata: Union[None, str, Path] = None,
+    max_workers: int = 1,
+    num_threads: Optional[int] = None,
+    bundle_threshold: Optional[int] = None,
+    journal: Union[None, str, Path] = None,
+    resumable_size: Optional[int] = None,
+    max_rate: Optional[float] = None,
+    priority: str = BULK,
 ) -> Operations:
     """Synchronize data between local and remote copies.
 
@@ -287,7 +379,8 @@ def sync(
     Parameters
     ----------
     session:
-        An authorized iBridges session.
+        An authorized iBridges session. This can also be a :class:`ibridges.pool.SessionPool`,
+        so that each worker uses its own session.
     source:
         Existing local folder or iRODS collection. An exception will be raised if it doesn't exist.
     target:
@@ -313,6 +406,29 @@ def sync(
         More options for the download/upload
     metadata:
         If not None, the location to get the metadata from or store it to.
+    max_workers:
+        Number of files/data objects that are transferred concurrently, by default 1.
+        Increasing this is mostly useful when transferring many small files.
+    num_threads:
+        Number of threads used to transfer a single file/data object. By default None,
+        in which case it is determined from the size of the file and the measured throughput.
+    bundle_threshold:
+        If not None, new files smaller than this size (in bytes) are packed into tar bundles
+        while uploading, which are then extracted on the iRODS server. This is much faster for
+        many small files. Larger files and existing data objects are uploaded as usual.
+    journal:
+        If not None, file in which the progress of the synchronization is recorded.
+        An interrupted synchronization can then be continued with :func:`resume`.
+    resumable_size:
+        If not None, files and data objects of at least this size (in bytes) are transferred in
+        byte ranges. If such a transfer is interrupted, retrying it only transfers the missing
+        ranges. The checksum is verified when the transfer is completed.
+    max_rate:
+        Maximum transfer rate in bytes per second, by default None (no limit). This limit
+        comes in addition to the global limit set by :func:`ibridges.throttle.set_global_rate`.
+    priority:
+        Priority of the transfers when the bandwidth is limited, either "bulk" (default) or
+        "interactive". Bulk transfers wait while interactive transfers are waiting for bandwidth.
 
 
     Returns
@@ -339,24 +455,79 @@ def sync(
 
     if isinstance(source, IrodsPath):
         ops = _down_sync_operations(
-            source, Path(target), copy_empty_folders=copy_empty_folders, depth=max_level,
-            metadata=metadata, overwrite=True
+            source, Path(target), copy_empty_folders=copy_empty_folders, depth=max_level,  # type: ignore
+            metadata=metadata, overwrite=True, bundle_threshold=bundle_threshold
         )
     else:
         ops = _up_sync_operations(
             Path(source), IrodsPath(session, target), copy_empty_folders=copy_empty_folders,
             depth=max_level, overwrite=True)
+        _bundle_uploads(ops, IrodsPath(session, target), bundle_threshold)
         if metadata is not None:
             ops.add_meta_upload(target, metadata)  # type: ignore
 
     ops.resc_name = resc_name
     ops.options = options
+    ops.num_threads = num_threads
+    ops.resumable_size = resumable_size
+    ops.limiter.set_rate(max_rate)
+    ops.priority = priority
     if not dry_run:
-        ops.execute(session, ignore_err=ignore_err)
+        ops.execute(session, ignore_err=ignore_err, max_workers=max_workers,
+                    journal=journal)
 
     return ops
 
 
+def resume(
+    session: Session,
+    journal: Union[str, Path],
+    ignore_err: bool = False,
+    max_workers: int = 1,
+    dry_run: bool = False,
+) -> Operations:
+    """Resume an interrupted upload, download or synchronization.
+
+    The operations that have not been completed are read from the journal, which was
+    written by :func:`upload`, :func:`download` or :func:`sync`. Completed operations
+    are skipped without contacting the iRODS server.
+
+    Parameters
+    ----------
+    session:
+        Session to resume the transfer with.
+    journal:
+        Journal file of the interrupted transfer.
+    ignore_err:
+        If an error occurs during the transfer, and ignore_err is set to True, any errors
+        encountered will be transformed into warnings and iBridges will continue with the
+        remaining operations.
+    max_workers:
+        Number of files/data objects that are transferred concurrently, by default 1.
+    dry_run:
+        Only return the remaining operations without executing them.
+
+    Returns
+    -------
+        Operations object with the operations that were not completed.
+
+    Raises
+    ------
+    ValueError:
+        If the journal does not contain any planned operations.
+
+    Examples
+    --------
+    >>> upload(session, "dir", "~/some_col", journal="upload.journal")  # Interrupted
+    >>> resume(session, "upload.journal")
+
+    """
+    ops = Operations.from_journal(session, journal)
+    if not dry_run:
+        ops.execute(session, ignore_err=ignore_err, max_workers=max_workers, journal=journal)
+    return ops
+
+
 def create_meta_archive(session: Session, source: Union[str, IrodsPath],
                         meta_fp: Union[str, Path], dry_run: bool = False):
     """Create a local archive file for the metadata.
@@ -403,11 +574,13 @@ def create_meta_archive(session: Session, source: Union[str, IrodsPath],
 
 
 def apply_meta_archive(session, meta_fp: Union[str, Path], ipath: Union[str, IrodsPath],
-                       dry_run: bool = False):
+                       dry_run: bool = False, diff: bool = False, max_workers: int = 1):
     """Apply a metadata archive to set the metadata of collections and data objects.
 
     The archive is a utf-8 encoded JSON file with the metadata of all subcollections
     and data objects. The archive can be created with the function :func:`create_meta_archive`.
+    The archive is compared with the current metadata on the server, so that only the
+    metadata entries that are missing are written.
 
     Parameters
     ----------
@@ -420,6 +593,15 @@ def apply_meta_archive(session, meta_fp: Union[str, Path], ipath: Union[str, Iro
         root collection should be the same as the ones in the metadata archive.
     dry_run, optional
         If True, only create an operations object, but do not execute the operation, default False.
+        The changes that would be made can be listed with ops.plan_meta_upload().
+    diff, optional
+        If True, also remove the metadata entries that are not in the archive, so that the
+        metadata of the items in the archive becomes the same as in the archive. Items that
+        are not in the archive are not changed. By default False, which only adds entries.
+    max_workers, optional
+        Number of collections/data objects of which the metadata is changed at the same time,
+        by default 1. Each worker uses its own session, which is borrowed from the pool if the
+        session is a :class:`ibridges.pool.SessionPool`.
 
     Returns
     -------
@@ -434,6 +616,10 @@ def apply_meta_archive(session, meta_fp: Union[str, Path], ipath: Union[str, Iro
     Examples
     --------
     >>> apply_meta_archive(session, "meta_archive.json", "/some/home/collection")
+    >>> ops = apply_meta_archive(session, "meta_archive.json", "/some/home/collection",
+    >>>                          dry_run=True, diff=True)
+    >>> print(ops.plan_meta_upload())  # List the entries that would be added and removed.
+    >>> apply_meta_archive(pool, "meta_archive.json", "/some/home/collection", max_workers=8)
 
     """
     ipath = IrodsPath(session, ipath)
@@ -441,9 +627,9 @@ def apply_meta_archive(session, meta_fp: Union[str, Path], ipath: Union[str, Iro
         raise ValueError("Cannot apply metadata archive, since there is no collection"
                          f" present at '{ipath}")
     operations = Operations()
-    operations.add_meta_upload(ipath, meta_fp)
+    operations.add_meta_upload(ipath, meta_fp, diff=diff)
     if not dry_run:
-        operations.execute(session)
+        operations.execute(session, max_workers=max_workers)
     return operations
 
 
@@ -469,69 +655,225 @@ def _transfer_needed(ipath, lpath, overwrite, ignore_err):
     return True
 
 
+def _bundle_uploads(operations: Operations, root_ipath: IrodsPath,
+                    bundle_threshold: Optional[int]):
+    """Move uploads of small new files into bundles."""
+    if bundle_threshold is None:
+        return
+    single_uploads = []
+    bundle: list[tuple[Path, IrodsPath]] = []
+    bundle_size = 0
+    for lpath, ipath in operations.upload:
+        size = lpath.stat().st_size
+        if size >= bundle_threshold or ipath.dataobject_exists():
+            single_uploads.append((lpath, ipath))
+            continue
+        bundle.append((lpath, ipath))
+        bundle_size += size
+        if len(bundle) >= BUNDLE_MAX_FILES or bundle_size >= BUNDLE_MAX_SIZE:
+            operations.add_upload_bundle(bundle, root_ipath)
+            bundle, bundle_size = [], 0
+    # Bundling a single file does not save anything.
+    if len(bundle) == 1:
+        single_uploads.extend(bundle)
+    elif len(bundle) > 1:
+        operations.add_upload_bundle(bundle, root_ipath)
+    operations.upload = single_uploads
+
+
 def _down_sync_operations(isource_path: IrodsPath, ldest_path: Path,
                           overwrite: bool,
                           ignore_err: bool = False,
                           copy_empty_folders: bool  =True, depth: Optional[int] = None,
-                          metadata: Union[None, str, Path] = None) -> Operations:
+                          metadata: Union[None, str, Path] = None,
+                          bundle_threshold: Optional[int] = None) -> Operations:
     operations = Operations()
-    for ipath in isource_path.walk(depth=depth):
-        if metadata is not None:
-            operations.add_meta_download(isource_path, ipath, metadata)
-        lpath = ldest_path.joinpath(*ipath.relative_to(isource_path).parts)
-        if ipath.dataobject_exists():
-            if lpath.is_file():
-                if _transfer_needed(ipath, lpath, overwrite, ignore_err):
-                    operations.add_download(ipath, lpath)
-            else:
+    session = isource_path.session
+    root_path = str(isource_path.absolute())
+    # Number of data objects in each (sub)collection, relative to the source.
+    n_objects: dict[str, int] = defaultdict(int)
+    # Collections are listed one at a time, depth first, so that only the listings
+    # of the current collection and the names of the pending ones are in memory. The
+    # data objects of a collection are listed after its subcollections, which keeps
+    # the order of IrodsPath.walk for the metadata archive.
+    pending: list[tuple[tuple[str, ...], bool]] = [((), False)]
+    while pending:
+        rel_parts, list_objects = pending.pop()
+        coll_path = "/".join((root_path, *rel_parts))
+        lfolder = ldest_path.joinpath(*rel_parts)
+        if not list_objects:
+            if metadata is not None:
+                coll_ipath = (CachedIrodsPath(session, None, False, None, coll_path)
+                              if rel_parts else isource_path)
+                operations.add_meta_download(isource_path, coll_ipath, metadata)
+            if copy_empty_folders and not lfolder.exists():
+                operations.add_create_dir(lfolder)
+            if depth is not None and len(rel_parts) >= depth:
+                continue
+            pending.append((rel_parts, True))
+            pending.extend(((*rel_parts, name), False)
+                           for name in reversed(_list_subcollections(session, coll_path)))
+            continue
+        data_objects = _list_data_objects(session, coll_path)
+        for obj, local_name in _merge_join(data_objects, _local_files(lfolder)):
+            if obj is None:
+                continue
+            name, size, checksum = obj
+            ipath = CachedIrodsPath(session, size, True, checksum, coll_path, name)
+            lpath = lfolder / name
+            if metadata is not None:
+                operations.add_meta_download(isource_path, ipath, metadata)
+            for i_part in range(len(rel_parts) + 1):
+                n_objects["/".join(rel_parts[:i_part])] += 1
+            if local_name is None or _transfer_needed(ipath, lpath, overwrite, ignore_err):
                 operations.add_download(ipath, lpath)
-            if not lpath.parent.exists():
-                operations.add_create_dir(lpath.parent)
-        elif ipath.collection_exists() and copy_empty_folders:
-            if not lpath.exists():
-                operations.add_create_dir(lpath)
+        if data_objects and not lfolder.exists():
+            operations.add_create_dir(lfolder)
+    # Bundles contain the complete collection, which would ignore the depth.
+    if bundle_threshold is not None and depth is None:
+        _bundle_downloads(operations, isource_path, ldest_path, n_objects, bundle_threshold)
     return operations
 
 
+def _merge_join(left: list, right: list) -> Iterator[tuple]:
+    """Join two listings that are sorted by name, yielding pairs with the same name.
+
+    Items of the listings are either names or tuples that start with the name. If an
+    item is only present in one of the listings, the other item of the pair is None.
+    """
+    i_left, i_right = 0, 0
+    while i_left < len(left) or i_right < len(right):
+        left_name = _item_name(left[i_left]) if i_left < len(left) else None
+        right_name = _item_name(right[i_right]) if i_right < len(right) else None
+        if right_name is None or (left_name is not None and left_name < right_name):
+            yield left[i_left], None
+            i_left += 1
+        elif left_name is None or right_name < left_name:
+            yield None, right[i_right]
+            i_right += 1
+        else:
+            yield left[i_left], right[i_right]
+            i_left += 1
+            i_right += 1
+
+
+def _item_name(item: Union[str, tuple]) -> str:
+    return item if isinstance(item, str) else item[0]
+
+
+def _local_files(folder: Path) -> list[str]:
+    """Get the sorted names of the files in a folder, empty if the folder does not exist."""
+    try:
+        with os.scandir(folder) as entries:
+            return sorted(entry.name for entry in entries if entry.is_file())
+    except (FileNotFoundError, NotADirectoryError):
+        return []
+
+
+def _rel_parent_collections(ipath: IrodsPath, root_ipath: IrodsPath) -> list[str]:
+    """Get all collections between the root and the ipath, relative to the root."""
+    rel_parts = ipath.relative_to(root_ipath).parts[:-1]
+    return ["/".join(rel_parts[:i_part]) for i_part in range(len(rel_parts) + 1)]
+
+
+def _bundle_downloads(operations: Operations, isource_path: IrodsPath, ldest_path: Path,
+                      n_objects: dict[str, int], bundle_threshold: int):
+    """Move downloads of collections with only small data objects into bundles."""
+    n_small: dict[str, int] = defaultdict(int)
+    for ipath, _ in operations.download:
+        if ipath.size < bundle_threshold:
+            for rel_coll in _rel_parent_collections(ipath, isource_path):
+                n_small[rel_coll] += 1
+
+    # Only bundle the largest collections for which all data objects need to be downloaded.
+    bundle_colls: list[str] = []
+    for rel_coll in sorted(n_objects, key=lambda c: 0 if c == "" else c.count("/") + 1):
+        if n_objects[rel_coll] < 2 or n_small[rel_coll] != n_objects[rel_coll]:
+            continue
+        if not any(_rel_in_collection(rel_coll, other) for other in bundle_colls):
+            bundle_colls.append(rel_coll)
+    if len(bundle_colls) == 0:
+        return
+
+    bundle_files: dict[str, list] = defaultdict(list)
+    single_downloads = []
+    for ipath, lpath in operations.download:
+        rel_parent = _rel_parent_collections(ipath, isource_path)[-1]
+        for rel_coll in bundle_colls:
+            if _rel_in_collection(rel_parent, rel_coll):
+                bundle_files[rel_coll].append((ipath, lpath))
+                break
+        else:
+            single_downloads.append((ipath, lpath))
+    for rel_coll in bundle_colls:
+        rel_parts = rel_coll.split("/") if rel_coll else []
+        operations.add_download_bundle(isource_path.joinpath(*rel_parts),
+                                       ldest_path.joinpath(*rel_parts), bundle_files[rel_coll])
+    operations.download = single_downloads
+
+
+def _rel_in_collection(rel_path: str, rel_coll: str) -> bool:
+    return rel_coll == "" or rel_path == rel_coll or rel_path.startswith(rel_coll + "/")
+
+
 def _up_sync_operations(lsource_path: Path, idest_path: IrodsPath,  # pylint: disable=too-many-branches
                         overwrite: bool,
                         copy_empty_folders: bool = True, depth: Optional[int] = None,
                         ignore_err: bool = False) -> Operations:
     operations = Operations()
     session = idest_path.session
-    try:
-        remote_ipaths = {str(ipath): ipath for ipath in idest_path.walk()}
-    except irods.exception.CollectionDoesNotExist:
-        remote_ipaths = {}
+    root_path = str(idest_path.absolute())
+    # Whether the collection of a folder exists, which is known from the listing of the
+    # collection of its parent. Entries are removed once the folder has been visited.
+    remote_exists = {Path("."): idest_path.collection_exists()}
     for root, folders, files in os.walk(lsource_path):
+        folders.sort()
         root_part = Path(root).relative_to(lsource_path)
-        if depth is not None and len(root_part.parts) > depth:
-            continue
+        coll_exists = remote_exists.pop(root_part, False)
+        # Folders below the maximum depth are not scanned at all.
+        prune = depth is not None and len(root_part.parts) >= depth
         root_ipath = idest_path.joinpath(*root_part.parts)
-        for cur_file in files:
-            ipath = root_ipath / cur_file
-            lpath = lsource_path / root_part / cur_file
-
+        coll_path = "/".join((root_path, *root_part.parts))
+        if coll_exists:
+            data_objects, sub_collections = _list_collection(session, coll_path)
+        else:
+            data_objects, sub_collections = [], []
+
+        local_files = []
+        for cur_file in sorted(files):
             # Ignore symlinks
+            lpath = lsource_path / root_part / cur_file
             if lpath.is_symlink():
                 warnings.warn(f"Ignoring symlink {lpath}.")
+            else:
+                local_files.append(cur_file)
+        for cur_file, obj in _merge_join(local_files, data_objects):
+            if cur_file is None:
                 continue
-            if str(ipath) in remote_ipaths:
-                ipath = remote_ipaths[str(ipath)]
+            lpath = lsource_path / root_part / cur_file
+            if obj is None:
+                ipath = CachedIrodsPath(session, None, False, None, str(root_ipath / cur_file))
+                operations.add_upload(lpath, ipath)
+            else:
+                _, size, checksum = obj
+                ipath = CachedIrodsPath(session, size, True, checksum, coll_path, cur_file)
                 if _transfer_needed(ipath, lpath, overwrite, ignore_err):
                     operations.add_upload(lpath, ipath)
-            else:
-                ipath = CachedIrodsPath(session, None, False, None, str(ipath))
-                operations.add_upload(lpath, ipath)
-        if copy_empty_folders:
-            for fold in folders:
-                # Ignore folder symlinks
-                lpath = lsource_path / root_part / fold
-                if lpath.is_symlink():
+
+        remote_folders = set(sub_collections)
+        for fold in folders:
+            # Ignore folder symlinks
+            lpath = lsource_path / root_part / fold
+            if lpath.is_symlink():
+                if copy_empty_folders:
                     warnings.warn(f"Ignoring symlink {lpath}.")
-                    continue
-                if str(root_ipath / fold) not in remote_ipaths:
-                    operations.add_create_coll(root_ipath / fold)
-        if str(root_ipath) not in remote_ipaths:
+                continue
+            if not prune:
+                remote_exists[root_part / fold] = fold in remote_folders
+            if copy_empty_folders and fold not in remote_folders:
+                operations.add_create_coll(root_ipath / fold)
+        if not coll_exists:
             operations.add_create_coll(root_ipath)
+        if prune:
+            folders.clear()
     return operations
@@ -1,27 +1,50 @@
 """Operations to be performed for upload/download/sync."""
+# pylint: disable=too-many-lines
 from __future__ import annotations
 
+import asyncio
+import inspect
 import json
+import threading
+import time
 import warnings
-from collections import defaultdict
-from inspect import signature
+from collections import defaultdict, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import ExitStack, contextmanager
+from functools import partial
+from itertools import chain
 from pathlib import Path
-from typing import Optional, Union
+from typing import Callable, Iterable, Optional, Union
 
-import irods.collection
-import irods.data_object
-import irods.exception
-import irods.keywords as kw
 from tqdm import tqdm
 from tqdm.std import tqdm as tqdm_type
 
-from ibridges.path import IrodsPath
+import ibridges.icat_columns as icat
+from ibridges.journal import TransferJournal, journal_key
+from ibridges.meta import _is_blacklisted
+from ibridges.meta_apply import MetaApplyReport, MetaChange, apply_meta_changes
+from ibridges.path import CachedIrodsPath, IrodsPath, _subtree_queries
+from ibridges.plan import TransferList
+from ibridges.pool import borrowed, worker_sessions
+from ibridges.retry import DEFAULT_POLICY, RetryPolicy
 from ibridges.session import Session
-
-NUM_THREADS = 4
-
-
-class Operations():  # pylint: disable=too-many-instance-attributes
+from ibridges.telemetry import TelemetrySummary, TransferTelemetry
+from ibridges.throttle import BULK, RateLimiter, Throttle
+from ibridges.transfer import (
+    TransferTuner,
+    _bundle_get,
+    _bundle_put,
+    _obj_get,
+    _obj_put,
+)
+
+# Progress event of an asynchronous transfer. The event is one of 'started', 'progress',
+# 'completed' or 'failed'. For 'progress' events n_bytes is the number of bytes transferred
+# since the previous event, for 'failed' events error is the exception that was raised.
+TransferEvent = namedtuple("TransferEvent", ["event", "op", "src", "dest", "n_bytes", "error"])
+
+
+class Operations():  # pylint: disable=too-many-instance-attributes,too-many-public-methods
     """Storage for all data and metadata operations.
 
     This class should generally not be used directly by the user to create and execute
@@ -55,12 +78,40 @@ class Operations():  # pylint: disable=too-many-instance-attributes
         """
         self.create_dir: set[str] = set()
         self.create_collection: set[str] = set()
-        self.upload: list[tuple[Path, IrodsPath]] = []
-        self.download: list[tuple[IrodsPath, Path]] = []
+        self._upload = TransferList(irods_source=False)
+        self.upload_bundles: list[tuple[list[tuple[Path, IrodsPath]], IrodsPath]] = []
+        self._download = TransferList(irods_source=True)
+        self.download_bundles: list[tuple[IrodsPath, Path, list[tuple[IrodsPath, Path]]]] = []
         self.meta_download: dict = defaultdict(lambda: {"items": []})
         self.meta_upload: list[tuple[IrodsPath, Union[str, Path]]] = []
+        self.meta_upload_diff: set[str] = set()
         self.resc_name: str = "" if resc_name is None else resc_name
         self.options: Optional[dict] = {} if resc_name is None else options
+        self.num_threads: Optional[int] = None
+        self.resumable_size: Optional[int] = None
+        self.limiter = RateLimiter()
+        self.priority: str = BULK
+        self.errors: list[tuple[Union[Path, IrodsPath], Union[Path, IrodsPath], Exception]] = []
+        self.telemetry = TransferTelemetry()
+        self.retry_policy = RetryPolicy()
+
+    @property
+    def upload(self) -> TransferList:
+        """Planned uploads as (local path, IrodsPath) tuples, see :mod:`ibridges.plan`."""
+        return self._upload
+
+    @upload.setter
+    def upload(self, transfers: Iterable[tuple[Path, IrodsPath]]):
+        self._upload = TransferList(False, transfers, self._upload.memory_limit)
+
+    @property
+    def download(self) -> TransferList:
+        """Planned downloads as (IrodsPath, local path) tuples."""
+        return self._download
+
+    @download.setter
+    def download(self, transfers: Iterable[tuple[IrodsPath, Path]]):
+        self._download = TransferList(True, transfers, self._download.memory_limit)
 
     def add_meta_download(self, root_ipath: IrodsPath, ipath: IrodsPath, meta_fp: Union[str, Path]):
         """Add operation for downloading metadata archives.
@@ -81,7 +132,8 @@ class Operations():  # pylint: disable=too-many-instance-attributes
         self.meta_download[str(meta_fp)]["root_ipath"] = root_ipath
         self.meta_download[str(meta_fp)]["items"].append(ipath)
 
-    def add_meta_upload(self, root_ipath: IrodsPath, meta_fp: Union[str, Path]):
+    def add_meta_upload(self, root_ipath: IrodsPath, meta_fp: Union[str, Path],
+                        diff: bool = False):
         """Add operation to use a metadata archive.
 
         This basic operation adds one metadata archive to be applied to a collection
@@ -95,9 +147,15 @@ class Operations():  # pylint: disable=too-many-instance-attributes
             Root irods path to which all paths are relative to.
         meta_fp
             File that contains the metadata.
+        diff
+            If True, also remove the metadata entries of the items in the archive that are not
+            in the archive, so that their metadata becomes the same as in the archive.
+            By default, entries are only added.
 
         """
         self.meta_upload.append((root_ipath, meta_fp))
+        if diff:
+            self.meta_upload_diff.add(str(meta_fp))
 
     def add_download(self, ipath: IrodsPath, lpath: Path):
         """Add operation to download a data object.
@@ -110,7 +168,26 @@ class Operations():  # pylint: disable=too-many-instance-attributes
             Local path for the data to be stored in.
 
         """
-        self.download.append((ipath, lpath))
+        self.download.append(ipath, lpath)
+
+    def add_download_bundle(self, root_ipath: IrodsPath, root_lpath: Path,
+                            files: list[tuple[IrodsPath, Path]]):
+        """Add operation to download a collection as a single bundle.
+
+        The collection is packed into a tar archive on the iRODS server, which is
+        extracted locally while it is being downloaded.
+
+        Parameters
+        ----------
+        root_ipath
+            Collection to be downloaded as a bundle.
+        root_lpath
+            Local directory in which the bundle is extracted.
+        files
+            All data objects in the collection and their local destinations.
+
+        """
+        self.download_bundles.append((root_ipath, root_lpath, list(files)))
 
     def add_create_dir(self, new_dir: Path):
         """Add operation to create a new directory.
@@ -134,7 +211,24 @@ class Operations():  # pylint: disable=too-many-instance-attributes
             Destination IrodsPath for the data object to be created.
 
         """
-        self.upload.append((lpath, ipath))
+        self.upload.append(lpath, ipath)
+
+    def add_upload_bundle(self, files: list[tuple[Path, IrodsPath]], root_ipath: IrodsPath):
+        """Add operation to upload multiple files in one bundle.
+
+        The files are packed into a tar archive while uploading, which is then
+        extracted on the iRODS server. The data objects should not exist yet.
+
+        Parameters
+        ----------
+        files
+            List of local paths and their destination IrodsPaths.
+        root_ipath
+            Collection in which the bundle is extracted, all destinations
+            should be located below this collection.
+
+        """
+        self.upload_bundles.append((list(files), root_ipath))
 
     def add_create_coll(self, new_col: IrodsPath):
         """Add operation to create a new collection.
@@ -147,7 +241,8 @@ class Operations():  # pylint: disable=too-many-instance-attributes
         """
         self.create_collection.add(str(new_col))
 
-    def execute(self, session: Session, ignore_err: bool = False):
+    def execute(self, session: Session, ignore_err: bool = False, max_workers: int = 1,
+                journal: Union[None, str, Path, TransferJournal] = None) -> TelemetrySummary:
         """Execute all added operations.
 
         This also creates a progress bar to see the status updates.
@@ -155,107 +250,625 @@ class Operations():  # pylint: disable=too-many-instance-attributes
         Parameters
         ----------
         session
-            Session to perform the operations with.
+            Session to perform the operations with. If this is a
+            :class:`ibridges.pool.SessionPool`, each worker borrows its own session.
         ignore_err, optional
             Whether to ignore errors when encountered, by default False
             Note that not all errors will be ignored.
+        max_workers, optional
+            Number of data objects/files that are transferred at the same time, by default 1.
+            Using more workers is mostly beneficial for many small files, where the
+            transfer time is dominated by the latency of the iRODS server.
+        journal, optional
+            File to keep a journal of the operations in, by default None. If the execution
+            is interrupted, it can be resumed with :meth:`from_journal`. Operations that
+            are completed according to an existing journal are skipped.
+
+        Returns
+        -------
+            Summary of the timing, throughput and errors of the transfers, see
+            :class:`ibridges.telemetry.TelemetrySummary`. The complete telemetry is
+            also available as the :attr:`telemetry` attribute.
 
         """
-        up_sizes = [lpath.stat().st_size for lpath, _ in self.upload]
-        down_sizes = [ipath.size for ipath, _ in self.download]
-        disable = len(up_sizes) + len(down_sizes) == 0
+        if journal is not None and not isinstance(journal, TransferJournal):
+            journal = TransferJournal(journal)
+        if journal is not None and not journal.has_plan:
+            journal.write_plan(self._journal_header(), self._journal_records())
+        # Sizes are summed while iterating, so that large plans are not copied.
+        sizes = chain(
+            (lpath.stat().st_size for lpath, _ in self.upload
+             if _pending(journal, "upload", lpath)),
+            (lpath.stat().st_size for files, _ in self.upload_bundles
+             if _pending(journal, "upload_bundle", files) for lpath, _ in files),
+            (ipath.size for ipath, _ in self.download if _pending(journal, "download", ipath)),
+            (ipath.size for root_ipath, _, files in self.download_bundles
+             if _pending(journal, "download_bundle", root_ipath) for ipath, _ in files))
+        n_transfers, total_size = 0, 0
+        for size in sizes:
+            n_transfers += 1
+            total_size += size
+        disable = n_transfers == 0
         pbar = tqdm(
-            total=sum(up_sizes) + sum(down_sizes),
+            total=total_size,
             unit="B",
             unit_scale=True,
             unit_divisor=1024,
             disable=disable,
         )
-        self.execute_create_dir()
-        self.execute_create_coll(session)
-        self.execute_download(session, pbar, ignore_err=ignore_err)
-        self.execute_upload(session, pbar, ignore_err=ignore_err)
-        self.execute_meta_download()
-        self.execute_meta_upload()
+        tuner = TransferTuner(self.num_threads)
+        self.telemetry.start()
+        try:
+            self.execute_create_dir()
+            self.execute_create_coll(session)
+            self.execute_download(session, pbar, ignore_err=ignore_err, max_workers=max_workers,
+                                  tuner=tuner, journal=journal)
+            self.execute_download_bundles(session, pbar, ignore_err=ignore_err,
+                                          max_workers=max_workers, journal=journal)
+            self.execute_upload(session, pbar, ignore_err=ignore_err, max_workers=max_workers,
+                                tuner=tuner, journal=journal)
+            self.execute_upload_bundles(session, pbar, ignore_err=ignore_err,
+                                        max_workers=max_workers, journal=journal)
+            self.execute_meta_download(journal=journal)
+            self.execute_meta_upload(journal=journal, ignore_err=ignore_err,
+                                     max_workers=max_workers)
+        finally:
+            self.telemetry.stop()
+            if journal is not None:
+                journal.close()
+        return self.telemetry.summary()
+
+    async def execute_async(self, session: Session,  # pylint: disable=too-many-locals
+                            ignore_err: bool = False, max_workers: int = 4,
+                            progress: Optional[Callable] = None,
+                            journal: Union[None, str, Path, TransferJournal] = None
+                            ) -> TelemetrySummary:
+        """Execute all added operations without blocking the asyncio event loop.
+
+        The transfers are run on a pool of worker threads, with at most max_workers
+        transfers at the same time. Each worker uses its own clone of the session, or borrows
+        one if the session is a :class:`ibridges.pool.SessionPool`. Downloads are written to a
+        temporary file first, so that cancelling the execution does not leave partially written
+        files behind.
+        Transfers that are still running when the execution is cancelled are completed
+        in the background, but their results are discarded. The sessions of the workers and
+        the journal are closed when these transfers are done.
+
+        Parameters
+        ----------
+        session
+            Session to perform the operations with.
+        ignore_err, optional
+            Whether to ignore errors when encountered, by default False.
+        max_workers, optional
+            Number of data objects/files that are transferred at the same time, by default 4.
+        progress, optional
+            Function or coroutine function that is called with a :class:`TransferEvent`
+            when a transfer is started, completed or failed, and when bytes are transferred.
+        journal, optional
+            File to keep a journal of the operations in, by default None.
+            See :meth:`execute`.
+
+        Returns
+        -------
+            Summary of the timing, throughput and errors of the transfers.
+
+        Examples
+        --------
+        >>> async def print_event(event):
+        >>>     print(event.event, event.src, event.n_bytes)
+        >>> await ops.execute_async(session, max_workers=8, progress=print_event)
+
+        """
+        loop = asyncio.get_running_loop()
+        self.telemetry.start()
+        if journal is not None and not isinstance(journal, TransferJournal):
+            journal = TransferJournal(journal)
+        pool = ThreadPoolExecutor(max_workers=max_workers)
+        emitter = _EventEmitter(loop, progress)
+        cancelled = threading.Event()
+        tuner = TransferTuner(self.num_threads)
+
+        workers = ExitStack()
+        run = workers.enter_context(_transfer_sessions(session, max_workers))
+
+        def _worker_transfer(worker_session, op, transfer_func, src, dest, pbar, queued):
+            self._run_transfer(transfer_func, worker_session,
+                               _with_session(src, session, worker_session),
+                               _with_session(dest, session, worker_session),
+                               pbar, tuner, journal, op, queued)
+
+        async def _run(op, transfer_func, src, dest):
+            emitter.emit("started", op, src, dest)
+            try:
+                await loop.run_in_executor(pool, partial(
+                    run, _worker_transfer, op, transfer_func, src, dest,
+                    emitter.progress_bar(op, src, dest), time.perf_counter()))
+            except Exception as error:  # pylint: disable=broad-exception-caught
+                emitter.emit("failed", op, src, dest, error=error)
+                self.errors.append((src, dest, error))
+                if not ignore_err:
+                    raise
+                warnings.warn(f"Failed to transfer {src} -> {dest}: {error!r}")
+            else:
+                emitter.emit("completed", op, src, dest)
+
+        running: set = set()
+        try:
+            if journal is not None and not journal.has_plan:
+                await loop.run_in_executor(pool, lambda: journal.write_plan(  # type: ignore
+                    self._journal_header(), self._journal_records()))
+            await loop.run_in_executor(pool, self.execute_create_dir)
+            await loop.run_in_executor(pool, self.execute_create_coll, session)
+            for job in self._transfer_jobs(cancelled):
+                if not _pending(journal, job[0], job[2]):
+                    continue
+                if len(running) >= max_workers:
+                    done, running = await asyncio.wait(running,
+                                                       return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        task.result()
+                running.add(loop.create_task(_run(*job)))
+            while running:
+                done, running = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    task.result()
+            await loop.run_in_executor(pool, self.execute_meta_download, journal)
+            await loop.run_in_executor(pool, partial(self.execute_meta_upload, journal,
+                                                     ignore_err, max_workers))
+        except BaseException:
+            cancelled.set()
+            for task in running:
+                task.cancel()
+            raise
+        finally:
+            self.telemetry.stop()
+            _close_workers(pool, workers, journal, background=cancelled.is_set())
+            await emitter.flush()
+        return self.telemetry.summary()
+
+    def _transfer_jobs(self, cancelled: threading.Event):
+        """Generate all transfers as (journal operation, transfer function, source, destination)."""
+        throttle = self._throttle()
+        get_func = _atomic_download(partial(_obj_get, resumable_size=self.resumable_size,
+                                            throttle=throttle),
+                                    cancelled)
+        for ipath, lpath in self.download:
+            yield "download", get_func, ipath, lpath
+        get_bundle = self._bundle_get_func()
+        for root_ipath, root_lpath, _ in self.download_bundles:
+            yield "download_bundle", get_bundle, root_ipath, root_lpath
+        put_func = partial(_obj_put, resumable_size=self.resumable_size, throttle=throttle)
+        for lpath, ipath in self.upload:
+            yield "upload", put_func, lpath, ipath
+        for files, root_ipath in self.upload_bundles:
+            yield "upload_bundle", partial(_bundle_put, throttle=throttle), files, root_ipath
+
+    @classmethod
+    def from_journal(cls, session: Session,  # pylint: disable=too-many-branches
+                     journal: Union[str, Path, TransferJournal]) -> Operations:
+        """Create the operations that have not been completed according to a journal.
+
+        The iRODS server is not contacted for the completed operations, nor for
+        checking the remaining ones.
+
+        Parameters
+        ----------
+        session
+            Session to create the IrodsPaths with.
+        journal
+            Journal written by an earlier (interrupted) call to :meth:`execute`.
+
+        Returns
+        -------
+            Operations object with the remaining operations.
+
+        Raises
+        ------
+        ValueError
+            If the journal does not contain any planned operations.
+
+        Examples
+        --------
+        >>> ops = Operations.from_journal(session, "upload.journal")
+        >>> ops.execute(session, journal="upload.journal")
+
+        """
+        if not isinstance(journal, TransferJournal):
+            journal = TransferJournal(journal)
+        if journal.header is None:
+            raise ValueError(f"No planned operations found in journal {journal.journal_fp}.")
+        ops = cls()
+        ops.resc_name = journal.header["resc_name"]
+        ops.options = journal.header["options"]
+        ops.num_threads = journal.header["num_threads"]
+        ops.resumable_size = journal.header.get("resumable_size")
+        ops.limiter.set_rate(journal.header.get("max_rate"))
+        ops.priority = journal.header.get("priority", BULK)
+        ops.create_dir = set(journal.header["create_dir"])
+        ops.create_collection = set(journal.header["create_collection"])
+        for record in journal.pending():
+            if record["op"] == "upload":
+                ops.add_upload(Path(record["src"]), IrodsPath(session, record["dest"]))
+            elif record["op"] == "upload_bundle":
+                ops.add_upload_bundle(
+                    [(Path(lpath), IrodsPath(session, ipath)) for lpath, ipath in record["files"]],
+                    IrodsPath(session, record["dest"]))
+            elif record["op"] == "download":
+                ops.add_download(
+                    CachedIrodsPath(session, record["size"], True, record["checksum"],
+                                    record["src"]),
+                    Path(record["dest"]))
+            elif record["op"] == "download_bundle":
+                ops.add_download_bundle(
+                    IrodsPath(session, record["src"]), Path(record["dest"]),
+                    [(CachedIrodsPath(session, size, True, checksum, ipath), Path(lpath))
+                     for ipath, lpath, size, checksum in record["files"]])
+            elif record["op"] == "meta_download":
+                root_ipath = IrodsPath(session, record["root"])
+                for ipath in record["items"]:
+                    ops.add_meta_download(root_ipath, IrodsPath(session, ipath), record["dest"])
+            elif record["op"] == "meta_upload":
+                ops.add_meta_upload(IrodsPath(session, record["dest"]), record["src"],
+                                    diff=record.get("diff", False))
+        return ops
+
+    def _journal_header(self) -> dict:
+        options = self.options
+        try:
+            json.dumps(options)
+        except TypeError:
+            warnings.warn("Transfer options cannot be stored in the journal, resuming the "
+                          "transfer will use the default options.")
+            options = None
+        return {
+            "resc_name": self.resc_name,
+            "options": options,
+            "num_threads": self.num_threads,
+            "resumable_size": self.resumable_size,
+            "max_rate": self.limiter.rate,
+            "priority": self.priority,
+            "create_dir": sorted(self.create_dir),
+            "create_collection": sorted(self.create_collection),
+        }
+
+    def _journal_records(self):
+        for lpath, ipath in self.upload:
+            yield {"op": "upload", "key": journal_key("upload", lpath),
+                   "src": str(lpath), "dest": str(ipath)}
+        for files, root_ipath in self.upload_bundles:
+            yield {"op": "upload_bundle", "key": journal_key("upload_bundle", files),
+                   "files": [(str(lpath), str(ipath)) for lpath, ipath in files],
+                   "dest": str(root_ipath)}
+        for ipath, lpath in self.download:
+            yield {"op": "download", "key": journal_key("download", ipath),
+                   "src": str(ipath), "dest": str(lpath), "size": ipath.size,
+                   "checksum": getattr(ipath, "_checksum", None)}
+        for root_ipath, root_lpath, files in self.download_bundles:
+            yield {"op": "download_bundle", "key": journal_key("download_bundle", root_ipath),
+                   "src": str(root_ipath), "dest": str(root_lpath),
+                   "files": [(str(ipath), str(lpath), ipath.size, getattr(ipath, "_checksum", None))
+                             for ipath, lpath in files]}
+        for meta_fp, meta_op in self.meta_download.items():
+            yield {"op": "meta_download", "key": journal_key("meta_download", meta_fp),
+                   "root": str(meta_op["root_ipath"]), "dest": meta_fp,
+                   "items": [str(ipath) for ipath in meta_op["items"]]}
+        for root_ipath, meta_fp in self.meta_upload:
+            yield {"op": "meta_upload", "key": journal_key("meta_upload", meta_fp),
+                   "src": str(meta_fp), "dest": str(root_ipath),
+                   "diff": str(meta_fp) in self.meta_upload_diff}
 
     def execute_download(self, session: Session,
-                         pbar: Optional[tqdm_type], ignore_err: bool = False):
+                         pbar: Optional[tqdm_type], ignore_err: bool = False,
+                         max_workers: int = 1, tuner: Optional[TransferTuner] = None,
+                         journal: Optional[TransferJournal] = None):
         """Execute all download operations.
 
         Parameters
         ----------
         session
             Session to perform the downloads with.
-        down_sizes
-            Sizes of the data objects to be downloaded.
         pbar
             The progress bar to be updated.
         ignore_err, optional
             Whether to ignore errors when encountered, by default False.
+        max_workers, optional
+            Number of data objects to download concurrently, by default 1.
+        tuner, optional
+            Tuner that determines the number of threads per data object, by default
+            a new tuner is created.
+        journal, optional
+            Journal to record the progress in and to skip completed operations, by default None.
 
         """
-        for ipath, lpath in self.download:
-            _obj_get(
-                session,
-                ipath,
-                lpath,
-                overwrite=True,
-                ignore_err=ignore_err,
-                options=self.options,
-                resc_name=self.resc_name,
-                pbar=pbar,
-            )
+        transfer_func = partial(_obj_get, resumable_size=self.resumable_size,
+                                throttle=self._throttle())
+        self._execute_transfers(transfer_func, session, self.download, pbar, ignore_err=ignore_err,
+                                max_workers=max_workers, tuner=tuner, journal=journal,
+                                journal_op="download")
 
     def execute_upload(self, session: Session,
-                       pbar: Optional[tqdm_type], ignore_err: bool = False):
+                       pbar: Optional[tqdm_type], ignore_err: bool = False,
+                       max_workers: int = 1, tuner: Optional[TransferTuner] = None,
+                       journal: Optional[TransferJournal] = None):
         """Execute all upload operations.
 
         Parameters
         ----------
         session
             Session to perform the downloads with.
-        up_sizes
-            Sizes of the files to be uploaded.
         pbar
             Progress bar to be updated while uploading.
         ignore_err
             Whether to ignore errors when encountered, by default False.
+        max_workers, optional
+            Number of files to upload concurrently, by default 1.
+        tuner, optional
+            Tuner that determines the number of threads per file, by default
+            a new tuner is created.
+        journal, optional
+            Journal to record the progress in and to skip completed operations, by default None.
+
+        """
+        transfer_func = partial(_obj_put, resumable_size=self.resumable_size,
+                                throttle=self._throttle())
+        self._execute_transfers(transfer_func, session, self.upload, pbar, ignore_err=ignore_err,
+                                max_workers=max_workers, tuner=tuner, journal=journal,
+                                journal_op="upload")
+
+    def execute_download_bundles(self, session: Session, pbar: Optional[tqdm_type],
+                                 ignore_err: bool = False, max_workers: int = 1,
+                                 journal: Optional[TransferJournal] = None):
+        """Execute all bundled download operations.
+
+        Parameters
+        ----------
+        session
+            Session to perform the downloads with.
+        pbar
+            Progress bar to be updated while downloading.
+        ignore_err
+            Whether to ignore errors when encountered, by default False.
+        max_workers, optional
+            Number of bundles to download concurrently, by default 1.
+        journal, optional
+            Journal to record the progress in and to skip completed operations, by default None.
+
+        """
+        self._execute_transfers(self._bundle_get_func(), session,
+                                [(root_ipath, root_lpath)
+                                 for root_ipath, root_lpath, _ in self.download_bundles],
+                                pbar, ignore_err=ignore_err, max_workers=max_workers,
+                                journal=journal, journal_op="download_bundle")
+
+    def execute_upload_bundles(self, session: Session, pbar: Optional[tqdm_type],
+                               ignore_err: bool = False, max_workers: int = 1,
+                               journal: Optional[TransferJournal] = None):
+        """Execute all bundled upload operations.
+
+        Parameters
+        ----------
+        session
+            Session to perform the uploads with.
+        pbar
+            Progress bar to be updated while uploading.
+        ignore_err
+            Whether to ignore errors when encountered, by default False.
+        max_workers, optional
+            Number of bundles to upload concurrently, by default 1.
+        journal, optional
+            Journal to record the progress in and to skip completed operations, by default None.
+
+        """
+        put_bundle = partial(_bundle_put, throttle=self._throttle())
+        self._execute_transfers(put_bundle, session, self.upload_bundles, pbar,
+                                ignore_err=ignore_err, max_workers=max_workers,
+                                journal=journal, journal_op="upload_bundle")
+
+    def _bundle_get_func(self) -> Callable:
+        """Create a transfer function that downloads a bundle from its root collection."""
+        bundle_files = {str(root_ipath): files for root_ipath, _, files in self.download_bundles}
+
+        throttle = self._throttle()
+
+        def _get_bundle(session, root_ipath, root_lpath, **kwargs):
+            _bundle_get(session, root_ipath, root_lpath, bundle_files[str(root_ipath)],
+                        throttle=throttle, **kwargs)
+        return _get_bundle
+
+    def _throttle(self) -> Throttle:
+        """Create the throttle for the transfers, combining the global and own rate limits."""
+        return Throttle(self.limiter, self.priority)
+
+    def _run_transfer(self, transfer_func: Callable, session: Session, src, dest,  # pylint: disable=too-many-arguments
+                      pbar, tuner: TransferTuner, journal: Optional[TransferJournal],
+                      journal_op: str, queued: Optional[float] = None):
+        """Run a single transfer with a borrowed session if a pool is used."""
+        # Errors are not ignored here, so that failures can be recorded.
+        key = journal_key(journal_op, src)
+        if journal is not None:
+            journal.started(key)
+        try:
+            with borrowed(session), self.telemetry.measure(
+                    journal_op, src, dest, self._transfer_size(journal_op, src), queued):
+                self.retry_policy.call(
+                    transfer_func, session, src, dest, overwrite=True, ignore_err=False,
+                    options=self.options, resc_name=self.resc_name, pbar=pbar, tuner=tuner,
+                    reconnect=session)
+        except Exception as error:
+            if journal is not None:
+                journal.failed(key, error)
+            raise
+        if journal is not None:
+            journal.completed(key)
+
+    def _transfer_size(self, op: str, src) -> int:
+        """Get the planned number of bytes of a transfer, 0 if it cannot be determined."""
+        try:
+            if op == "upload":
+                return src.stat().st_size
+            if op == "download":
+                return src.size
+            if op == "upload_bundle":
+                return sum(lpath.stat().st_size for lpath, _ in src)
+            if op == "download_bundle":
+                return sum(ipath.size for root_ipath, _, files in self.download_bundles
+                           if str(root_ipath) == str(src) for ipath, _ in files)
+        except (OSError, ValueError):
+            pass
+        return 0
+
+    def _execute_transfers(self, transfer_func: Callable, session: Session,  # pylint: disable=too-many-branches
+                           transfers: Iterable[tuple], pbar: Optional[tqdm_type],
+                           ignore_err: bool = False, max_workers: int = 1,
+                           tuner: Optional[TransferTuner] = None,
+                           journal: Optional[TransferJournal] = None, journal_op: str = ""):
+        """Run transfers on a bounded pool of workers.
+
+        Each worker uses its own clone of the session, or borrows one if the session is a
+        :class:`ibridges.pool.SessionPool`. Errors raised by individual transfers are collected
+        in :attr:`errors` and converted into warnings if ignore_err is True. Otherwise the
+        remaining transfers are cancelled and the first error is raised. Transfers that are
+        completed according to the journal are skipped.
+        """
+        if tuner is None:
+            tuner = TransferTuner(self.num_threads)
+        if journal is not None:
+            transfers = (item for item in transfers if _pending(journal, journal_op, item[0]))
+
+        def _transfer(src, dest):
+            self._run_transfer(transfer_func, session, src, dest, pbar, tuner, journal,
+                               journal_op)
+
+        def _worker_transfer(worker_session, src, dest, queued):
+            self._run_transfer(transfer_func, worker_session,
+                               _with_session(src, session, worker_session),
+                               _with_session(dest, session, worker_session),
+                               pbar, tuner, journal, journal_op, queued)
+
+        def _handle_error(src, dest, error: Exception):
+            self.errors.append((src, dest, error))
+            if not ignore_err:
+                raise error
+            warnings.warn(f"Failed to transfer {src} -> {dest}: {error!r}")
+
+        if max_workers <= 1:
+            for src, dest in transfers:
+                try:
+                    _transfer(src, dest)
+                except Exception as error:  # pylint: disable=broad-exception-caught
+                    _handle_error(src, dest, error)
+            return
+
+        # Keep a bounded number of transfers in flight, so that very large plans
+        # do not create a future for every file at once.
+        transfer_iter = iter(transfers)
+        with worker_sessions(session) as run, ThreadPoolExecutor(max_workers=max_workers) as pool:
+            running: dict = {}
+            try:
+                while True:
+                    for src, dest in transfer_iter:
+                        future = pool.submit(run, _worker_transfer, src, dest,
+                                             time.perf_counter())
+                        running[future] = (src, dest)
+                        if len(running) >= 2 * max_workers:
+                            break
+                    if len(running) == 0:
+                        break
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        src, dest = running.pop(future)
+                        exc = future.exception()
+                        if exc is not None:
+                            _handle_error(src, dest, exc)  # type: ignore
+            except BaseException:
+                for future in running:
+                    future.cancel()
+                raise
+
+    def execute_meta_download(self, journal: Optional[TransferJournal] = None):
+        """Execute all metadata download operations.
+
+        Parameters
+        ----------
+        journal, optional
+            Journal to record the progress in and to skip completed operations, by default None.
 
         """
-        for lpath, ipath in self.upload:
-            _obj_put(
-                session,
-                lpath,
-                ipath,
-                overwrite=True,
-                ignore_err=ignore_err,
-                options=self.options,
-                resc_name=self.resc_name,
-                pbar=pbar,
-            )
-
-    def execute_meta_download(self):
-        """Execute all metadata download operations."""
         for meta_fp, op in self.meta_download.items():
+            if not _pending(journal, "meta_download", meta_fp):
+                continue
             meta_dict = _empty_metadict(op["root_ipath"])
+            # The metadata of a collection tree is retrieved with a few queries for all items.
+            tree_meta = _walk_metadata(op["root_ipath"], op["items"])
             for ipath in op["items"]:
-                _add_to_metadict(meta_dict, ipath, op["root_ipath"])
+                _add_to_metadict(meta_dict, ipath, op["root_ipath"], tree_meta.get(str(ipath)))
             with open(meta_fp, "w", encoding="utf-8") as handle:
                 json.dump(meta_dict, handle, indent=4)
+            if journal is not None:
+                journal.completed(journal_key("meta_download", meta_fp))
 
-    def execute_meta_upload(self):
+    def execute_meta_upload(self, journal: Optional[TransferJournal] = None,
+                            ignore_err: bool = False, max_workers: int = 1):
         """Execute all metadata upload operations.
 
+        The changes for each item are sent as one atomic request. Items for which this
+        fails are recorded in :attr:`errors`, the other items are still changed.
+
         Parameters
         ----------
-        session
-            Session to use with uploading the operations.
+        journal, optional
+            Journal to record the progress in and to skip completed operations, by default None.
+        ignore_err, optional
+            If True, items that could not be changed only give a warning, otherwise
+            the first error is raised after all items have been processed.
+        max_workers, optional
+            Number of items that are changed at the same time, by default 1.
 
         """
         for root_ipath, meta_fp in self.meta_upload:
+            if not _pending(journal, "meta_upload", meta_fp):
+                continue
             with open(meta_fp, "r", encoding="utf-8") as handle:
                 meta_dict = json.load(handle)
-            _set_metadata_from_dict(root_ipath, meta_dict)
+            report = _set_metadata_from_dict(root_ipath, meta_dict, max_workers=max_workers,
+                                             diff=str(meta_fp) in self.meta_upload_diff)
+            for path, error in report.failed:
+                self.errors.append((Path(meta_fp), IrodsPath(root_ipath.session, path), error))
+                if ignore_err:
+                    warnings.warn(f"Failed to set metadata of {path}: {error!r}")
+            if report.failed and not ignore_err:
+                raise report.failed[0][1]
+            if journal is not None and not report.failed:
+                journal.completed(journal_key("meta_upload", meta_fp))
+
+    def plan_meta_upload(self) -> MetaApplyReport:
+        """Compute the metadata changes of the metadata upload operations without applying them.
+
+        The current metadata on the server is compared with the metadata archives, so that
+        only the entries that differ are listed.
+
+        Returns
+        -------
+            Report of the changes that would be made, see
+            :class:`ibridges.meta_apply.MetaApplyReport`.
+
+        Examples
+        --------
+        >>> ops = apply_meta_archive(session, "meta_archive.json", ipath, dry_run=True, diff=True)
+        >>> print(ops.plan_meta_upload())
+
+        """
+        report = MetaApplyReport(dry_run=True)
+        for root_ipath, meta_fp in self.meta_upload:
+            with open(meta_fp, "r", encoding="utf-8") as handle:
+                meta_dict = json.load(handle)
+            changes = _plan_meta_changes(root_ipath, meta_dict,
+                                         diff=str(meta_fp) in self.meta_upload_diff)
+            for change in changes:
+                if change.add or change.remove:
+                    report.record(change)
+        return report
 
     def execute_create_dir(self):
         """Execute all create directory operations.
@@ -282,9 +895,9 @@ class Operations():  # pylint: disable=too-many-instance-attributes
 
         """
         for col in self.create_collection:
-            IrodsPath.create_collection(session, col)
+            self.retry_policy.call(IrodsPath.create_collection, session, col, reconnect=session)
 
-    def print_summary(self):
+    def print_summary(self):  # pylint: disable=too-many-branches
         """Print a summary of all the operations added to the object."""
         summary_strings = []
         if len(self.create_collection) > 0:
@@ -305,12 +918,30 @@ class Operations():  # pylint: disable=too-many-instance-attributes
                 summary += f"{lpath} -> {ipath}\n"
             summary_strings.append(summary)
 
+        if len(self.upload_bundles) > 0:
+            summary = "Upload bundles:\n\n"
+            for i_bundle, (files, root_ipath) in enumerate(self.upload_bundles):
+                bundle_size = sum(lpath.stat().st_size for lpath, _ in files)
+                summary += (f"Bundle {i_bundle+1} -> {root_ipath} ({len(files)} files, "
+                            f"{bundle_size} bytes)\n")
+                for lpath, ipath in files:
+                    summary += f"    {lpath} -> {ipath}\n"
+            summary_strings.append(summary)
+
         if len(self.download) > 0:
             summary = "Download files:\n\n"
             for ipath, lpath in self.download:
                 summary += f"{ipath} -> {lpath}\n"
             summary_strings.append(summary)
 
+        if len(self.download_bundles) > 0:
+            summary = "Download bundles:\n\n"
+            for root_ipath, root_lpath, files in self.download_bundles:
+                bundle_size = sum(ipath.size for ipath, _ in files)
+                summary += (f"{root_ipath} -> {root_lpath} ({len(files)} data objects, "
+                            f"{bundle_size} bytes)\n")
+            summary_strings.append(summary)
+
         if len(self.meta_download) > 0:
             summary = "Metadata to download:\n\n"
             for meta_fp, meta_item in self.meta_download.items():
@@ -323,179 +954,82 @@ class Operations():  # pylint: disable=too-many-instance-attributes
         if len(self.meta_upload) > 0:
             summary = "Metadata to upload:\n\n"
             for (ipath, meta_fp) in self.meta_upload:
-                summary += f"{meta_fp} -> {ipath}\n"
+                mode = " (diff)" if str(meta_fp) in self.meta_upload_diff else ""
+                summary += f"{meta_fp} -> {ipath}{mode}\n"
             summary_strings.append(summary)
         print("\n\n".join(summary_strings))
 
 
-def _obj_put(  # pylint: disable=too-many-branches
-    session: Session,
-    local_path: Union[str, Path],
-    irods_path: Union[str, IrodsPath],
-    overwrite: bool = False,
-    resc_name: str = "",
-    options: Optional[dict] = None,
-    ignore_err: bool = False,
-    pbar: Optional[tqdm_type] = None,
-):
-    """Upload `local_path` to `irods_path` following iRODS `options`.
+class _EventEmitter():
+    """Deliver transfer events from the worker threads to a callback on the event loop."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, callback: Optional[Callable]):
+        self.loop = loop
+        self.callback = callback
+        self._tasks: set = set()
+
+    def emit(self, event: str, op: str, src, dest, n_bytes: int = 0,
+             error: Optional[Exception] = None):
+        """Call the callback with an event, should be called from the event loop."""
+        if self.callback is None:
+            return
+        result = self.callback(TransferEvent(event, op, src, dest, n_bytes, error))
+        if inspect.isawaitable(result):
+            task = asyncio.ensure_future(result)
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def progress_bar(self, op: str, src, dest) -> Optional[_EventProgress]:
+        """Create an object that can be used as a progress bar for a single transfer."""
+        if self.callback is None:
+            return None
+        return _EventProgress(self, op, src, dest)
+
+    async def flush(self):
+        """Wait until all events have been handled."""
+        # Let progress events that were scheduled from the worker threads run first.
+        await asyncio.sleep(0)
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+class _EventProgress():  # pylint: disable=too-few-public-methods
+    """Progress bar replacement that creates progress events."""
+
+    def __init__(self, emitter: _EventEmitter, op: str, src, dest):
+        self.emitter = emitter
+        self.op = op
+        self.src = src
+        self.dest = dest
+
+    def update(self, n_bytes: int):
+        """Emit a progress event, can be called from any thread."""
+        self.emitter.loop.call_soon_threadsafe(self.emitter.emit, "progress", self.op,
+                                               self.src, self.dest, n_bytes)
+
+
+def _atomic_download(transfer_func: Callable, cancelled: threading.Event) -> Callable:
+    """Wrap a download function, so that files only appear when completely downloaded."""
+    def _download(session, ipath: IrodsPath, lpath: Path, **kwargs):
+        part_path = lpath.parent / f".{lpath.name}.ibridges_download"
+        try:
+            transfer_func(session, ipath, part_path, **kwargs)
+            if cancelled.is_set():
+                raise asyncio.CancelledError()
+            part_path.replace(lpath)
+        finally:
+            if part_path.exists():
+                part_path.unlink()
+    return _download
 
-    Parameters
-    ----------
-    session :
-        Session to upload the object.
-    local_path : str or Path
-        Path of local file.
-    irods_path : str or IrodsPath
-        Path of iRODS data object or collection.
-    resc_name : str
-        Optional resource name.
-    overwrite :
-        Whether to overwrite the object if it exists.
-    options :
-        Extra options to the python irodsclient put method.
-    ignore_err:
-        If True, convert errors into warnings.
-    pbar:
-        Optional progress bar.
 
-    """
-    local_path = Path(local_path)
-    irods_path = IrodsPath(session, irods_path)
-
-    if not local_path.is_file():
-        err_msg = f"local_path '{local_path}' must be a file."
-        if not ignore_err:
-            raise ValueError(err_msg)
-        warnings.warn(err_msg)
-        return
+def _pending(journal: Optional[TransferJournal], op: str, src) -> bool:
+    """Check whether an operation still needs to be done according to the journal."""
+    return journal is None or not journal.is_completed(journal_key(op, src))
 
-    # Check if irods object already exists
-    obj_exists = (
-        IrodsPath(session, irods_path / local_path.name).dataobject_exists()
-        or irods_path.dataobject_exists()
-    )
-
-    if options is None:
-        options = {}
-    options.update({kw.NUM_THREADS_KW: NUM_THREADS, kw.REG_CHKSUM_KW: "", kw.VERIFY_CHKSUM_KW: ""})
-
-    if pbar is not None:
-        upd_put = "updatables" in signature(session.irods_session.data_objects.put).parameters
-        if upd_put:
-            options["updatables"] = [pbar.update]
-
-    if overwrite:
-        options[kw.FORCE_FLAG_KW] = ""
-    if resc_name not in ["", None]:
-        options[kw.RESC_NAME_KW] = resc_name
-    if overwrite or not obj_exists:
-        try:
-            session.irods_session.data_objects.put(local_path, str(irods_path), **options)
-        except (PermissionError, OSError) as error:
-            err_msg = f"Cannot read {error.filename}."
-            if not ignore_err:
-                raise PermissionError(err_msg) from error
-            warnings.warn(err_msg)
-        except irods.exception.CAT_NO_ACCESS_PERMISSION as error:
-            err_msg = f"Cannot write {str(irods_path)}."
-            if not ignore_err:
-                raise PermissionError(err_msg) from error
-            warnings.warn(err_msg)
-        except irods.exception.OVERWRITE_WITHOUT_FORCE_FLAG as error:
-            # This should generally not occur, but a race condition might trigger this.
-            # obj does not exist -> someone else writes to object -> overwrite error
-            if not ignore_err:
-                raise FileExistsError(
-                    f"Dataset {irods_path} already exists. "
-                    "Use overwrite=True to overwrite the existing file."
-                    "This error might be the result of simultaneous writing "
-                    "to the same data object."
-                ) from error
-    else:
-        if not ignore_err:
-            raise FileExistsError(
-                f"Dataset {irods_path} already exists. "
-                "Use overwrite=True to overwrite the existing file."
-            )
-        warnings.warn(f"Cannot overwrite dataobject with name '{local_path.name}',"
-                      "it already exists. Use overwrite=False to suppress this warning.")
-    if pbar is not None and not upd_put:
-        pbar.update(IrodsPath(session, irods_path).size)
-
-
-def _obj_get(
-    session: Session,
-    irods_path: IrodsPath,
-    local_path: Path,
-    overwrite: bool = False,
-    resc_name: Optional[str] = "",
-    options: Optional[dict] = None,
-    ignore_err: bool = False,
-    pbar: Optional[tqdm_type] = None,
-):
-    """Download `irods_path` to `local_path` following iRODS `options`.
 
-    Parameters
-    ----------
-    session :
-        Session to get the object from.
-    irods_path : str or IrodsPath
-        Path of iRODS data object.
-    local_path : str or Path
-        Path of local file or directory/folder.
-    overwrite :
-        Whether to overwrite the local file if it exists.
-    resc_name:
-        Name of the resource to get the object from.
-    options : dict
-        Extra options to the python irodsclient get method.
-    ignore_err:
-        If True, convert errors into warnings.
-    pbar:
-        Optional progress bar.
-
-    """
-    if options is None:
-        options = {}
-    options.update(
-        {
-            kw.NUM_THREADS_KW: NUM_THREADS,
-            kw.VERIFY_CHKSUM_KW: "",
-        }
-    )
-    if overwrite:
-        options[kw.FORCE_FLAG_KW] = ""
-    if resc_name not in ["", None]:
-        options[kw.RESC_NAME_KW] = resc_name
-
-    # Compatibility with PRC<2.1
-    if pbar is not None:
-        upd_put = "updatables" in signature(session.irods_session.data_objects.put).parameters
-        if upd_put:
-            options["updatables"] = [pbar.update]
-
-    # Quick fix for #126
-    if Path(local_path).is_dir():
-        local_path = Path(local_path).joinpath(irods_path.name)
-
-    try:
-        session.irods_session.data_objects.get(str(irods_path), local_path, **options)
-    except (OSError, irods.exception.CAT_NO_ACCESS_PERMISSION) as error:
-        msg = f"Cannot write to {local_path}."
-        if not ignore_err:
-            raise PermissionError(msg) from error
-        warnings.warn(msg)
-    except irods.exception.CUT_ACTION_PROCESSED_ERR as exc:
-        msg = f"During download operation from '{irods_path}': iRODS server forbids action."
-        if not ignore_err:
-            raise PermissionError(msg) from exc
-        warnings.warn(msg)
-    if pbar is not None and not upd_put:
-        pbar.update(IrodsPath(session, irods_path).size)
-
-
-def _add_to_metadict(meta_dict: dict, ipath: IrodsPath, root_ipath: IrodsPath):
+def _add_to_metadict(meta_dict: dict, ipath: IrodsPath, root_ipath: IrodsPath,
+                     item_meta: Optional[dict] = None):
     """Add an item to the metadata archive dictionary.
 
     Parameters
@@ -506,8 +1040,17 @@ def _add_to_metadict(meta_dict: dict, ipath: IrodsPath, root_ipath: IrodsPath):
         IrodsPath to the item that the metadata is extracted from.
     root_ipath
         Root IrodsPath to which the relative path is calculated.
+    item_meta
+        Type and metadata of the item retrieved with :func:`_walk_metadata`, by default
+        they are retrieved from the server.
 
     """
+    new_metadata = {"rel_path": str(ipath.relative_to(root_ipath))}
+    if item_meta is not None:
+        new_metadata.update(item_meta)
+        meta_dict["items"].append(new_metadata)
+        return
+
     meta = ipath.meta
     if ipath.collection_exists():
         item_type = "collection"
@@ -515,15 +1058,112 @@ def _add_to_metadict(meta_dict: dict, ipath: IrodsPath, root_ipath: IrodsPath):
         item_type = "data object"
     else:
         item_type = "unknown"
-
-    new_metadata = {
-        "rel_path": str(ipath.relative_to(root_ipath)),
-        "type": item_type,
-    }
+    new_metadata["type"] = item_type
     new_metadata.update(meta.to_dict())
     meta_dict["items"].append(new_metadata)
 
 
+def _walk_metadata(root_ipath: IrodsPath, items: Iterable[IrodsPath]) -> dict[str, dict]:
+    """Retrieve the metadata of all collections and data objects in a collection tree.
+
+    The collections, data objects and their metadata are each retrieved with (at most) two
+    queries for the whole tree, page by page, instead of several queries per item. The tree
+    is limited to the depth of the deepest item.
+
+    Parameters
+    ----------
+    root_ipath
+        Root collection of the tree.
+    items
+        Paths for which the metadata is needed.
+
+    Returns
+    -------
+        Dictionary with the absolute paths as keys and the type and metadata as values,
+        in the format of the items of the archive. Items outside of the tree are not included.
+
+    """
+    session = root_ipath.session
+    with borrowed(session):
+        if not root_ipath.collection_exists():
+            return {}
+        root_path = str(root_ipath)
+        prefix = root_path.rstrip("/") + "/"
+        max_level = max((str(ipath)[len(prefix):].count("/") + 1 for ipath in items
+                         if str(ipath).startswith(prefix)), default=0)
+        tree_meta: dict[str, dict] = {}
+
+        def _rows(columns: tuple, max_coll_level: int):
+            for query in _subtree_queries(session, columns, root_path, max_coll_level):
+                for res in DEFAULT_POLICY.iterate(iter, query, reconnect=session):
+                    yield [res[column] for column in columns]
+
+        for coll_path, coll_id in _rows((icat.COLL_NAME, icat.COLL_ID), max_level):
+            tree_meta[coll_path] = {"type": "collection", "name": coll_path.rsplit("/", 1)[-1],
+                                    "irods_id": coll_id, "metadata": []}
+        for coll_path, name, data_id, checksum in _rows(
+                (icat.COLL_NAME, icat.DATA_NAME, icat.DATA_ID, icat.DATA_CHECKSUM), max_level - 1):
+            # Replicas with different checksums are returned as separate rows.
+            tree_meta.setdefault(f"{coll_path}/{name}", {
+                "type": "data object", "name": name, "irods_id": data_id, "checksum": checksum,
+                "metadata": []})
+        for coll_path, *avu in _rows((icat.COLL_NAME, icat.META_COLL_ATTR_NAME,
+                                      icat.META_COLL_ATTR_VALUE, icat.META_COLL_ATTR_UNITS),
+                                     max_level):
+            if coll_path in tree_meta and not _is_blacklisted(avu[0]):
+                tree_meta[coll_path]["metadata"].append(tuple(avu))
+        for coll_path, name, *avu in _rows((icat.COLL_NAME, icat.DATA_NAME,
+                                            icat.META_DATA_ATTR_NAME, icat.META_DATA_ATTR_VALUE,
+                                            icat.META_DATA_ATTR_UNITS), max_level - 1):
+            obj_path = f"{coll_path}/{name}"
+            if obj_path in tree_meta and not _is_blacklisted(avu[0]):
+                tree_meta[obj_path]["metadata"].append(tuple(avu))
+    return tree_meta
+
+
+def _close_workers(pool: ThreadPoolExecutor, workers: ExitStack,
+                   journal: Optional[TransferJournal], background: bool):
+    """Close the sessions of the workers and the journal once all transfers are done.
+
+    In the background, this waits for the transfers that are still running without blocking.
+    """
+    def _close():
+        pool.shutdown(wait=True)
+        workers.close()
+        if journal is not None:
+            journal.close()
+
+    if background:
+        threading.Thread(target=_close).start()
+    else:
+        _close()
+
+
+@contextmanager
+def _transfer_sessions(session, max_workers: int):
+    """Give each worker its own session, unless there is only one worker."""
+    if max_workers <= 1:
+        yield lambda func, *args: func(session, *args)
+    else:
+        with worker_sessions(session) as run:
+            yield run
+
+
+def _with_session(item, session, worker_session):
+    """Let a planned IrodsPath use the session of a worker, keeping the planned information.
+
+    Only paths of the session that is executing the operations are changed, other paths and
+    local paths are returned as they are. For bundles, only the collection is changed.
+    """
+    if not isinstance(item, IrodsPath) or item.session is not session or session is worker_session:
+        return item
+    if isinstance(item, CachedIrodsPath):
+        # pylint: disable=protected-access
+        return CachedIrodsPath(worker_session, item._size, item._is_dataobj, item._checksum,
+                               str(item))
+    return IrodsPath(worker_session, str(item))
+
+
 def _empty_metadict(root_ipath: IrodsPath, recursive: bool = True) -> dict:
     """Create an empty dictionary for metadata archival.
 
@@ -546,7 +1186,8 @@ def _empty_metadict(root_ipath: IrodsPath, recursive: bool = True) -> dict:
         "items": [],
     }
 
-def _set_metadata_from_dict(ipath: IrodsPath, metadata_dict: dict):
+def _set_metadata_from_dict(ipath: IrodsPath, metadata_dict: dict,
+                            max_workers: int = 1, diff: bool = False) -> MetaApplyReport:
     """Set the metadata of an iRODS item from a metadata archive dictionary.
 
     Parameters
@@ -555,17 +1196,61 @@ def _set_metadata_from_dict(ipath: IrodsPath, metadata_dict: dict):
         Path of the iRODS item for which the metadata is going to be set.
     metadata_dict
         Metadata to be set for the item.
+    max_workers
+        Number of items that are changed at the same time, by default 1.
+    diff
+        Also remove the metadata entries of the items that are not in the archive.
 
     Raises
     ------
     ValueError
         When the irods path does not point to a data object or collection.
 
+    Returns
+    -------
+        Report of the changes and the items for which they failed.
+
+    """
+    changes = _plan_meta_changes(ipath, metadata_dict, diff=diff)
+    return apply_meta_changes(ipath.session, changes, max_workers=max_workers)
+
+
+def _plan_meta_changes(root_ipath: IrodsPath, metadata_dict: dict,
+                       diff: bool = False) -> list[MetaChange]:
+    """Compute the metadata entries of an archive that are not present on the server yet.
+
+    The current metadata of the tree is retrieved in bulk with :func:`_walk_metadata`.
+    With diff, the entries on the server that are not in the archive are also removed.
+    Items that are not in the archive are left alone.
     """
-    for item_data in metadata_dict["items"]:
-        new_path = ipath / item_data["rel_path"]
-        if not new_path.exists():
-            raise ValueError(f"Path {new_path} for which there exists metadata does not exist "
-                             "itself.")
-        meta = new_path.meta
-        meta.from_dict(item_data)
+    targets = [root_ipath / item_data["rel_path"] for item_data in metadata_dict["items"]]
+    tree_meta = _walk_metadata(root_ipath, targets)
+    changes = []
+    for item_data, target in zip(metadata_dict["items"], targets):
+        cur_meta = tree_meta.get(str(target))
+        if cur_meta is None:
+            if not target.exists():
+                raise ValueError(f"Path {target} for which there exists metadata does not exist "
+                                 "itself.")
+            is_dataobj = target.dataobject_exists()
+            server_avus = [(meta.name, meta.value, meta.units) for meta in target.meta]
+        else:
+            is_dataobj = cur_meta["type"] == "data object"
+            server_avus = cur_meta["metadata"]
+        present = {_avu_key(*avu) for avu in server_avus}
+        to_add = []
+        for avu in item_data["metadata"]:
+            if _avu_key(*avu) not in present:
+                present.add(_avu_key(*avu))
+                to_add.append(tuple(avu))
+        to_remove = []
+        if diff:
+            wanted = {_avu_key(*avu) for avu in item_data["metadata"]}
+            to_remove = [tuple(avu) for avu in server_avus if _avu_key(*avu) not in wanted]
+        changes.append(MetaChange(str(target), is_dataobj, to_add, to_remove))
+    return changes
+
+
+def _avu_key(name: str, value: str, units: Optional[str] = None) -> tuple[str, str, str]:
+    """Metadata entry for comparisons, where no units and empty units are the same."""
+    return (name, value, units or "")
@@ -26,3 +26,5 @@ USER_TYPE = imodels.User.type
 
 # operators
 LIKE = cm.Like
+NOT_LIKE = cm.NotLike  # pylint: disable=invalid-name
+IN = cm.In  # pylint: disable=invalid-name
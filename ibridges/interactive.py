@@ -13,7 +13,8 @@ DEFAULT_IRODSA_PATH = Path.home() / ".irods" / ".irodsA"
 
 
 def interactive_auth(
-    password: Optional[str] = None, irods_env_path: Union[None, str, Path] = None
+    password: Optional[str] = None, irods_env_path: Union[None, str, Path] = None,
+    lazy: bool = False,
 ) -> Session:
     """Interactive authentication with iRODS server.
 
@@ -28,6 +29,9 @@ def interactive_auth(
         Password to make the connection with. If not supplied, you will be asked interactively.
     irods_env_path:
         Path to the irods environment.
+    lazy:
+        If True and a cached password exists, the session only connects to the server
+        when it is first needed. The cached password is then not checked beforehand.
 
     Raises
     ------
@@ -49,7 +53,7 @@ def interactive_auth(
 
     session = None
     if DEFAULT_IRODSA_PATH.is_file() and password is None:
-        session = _from_pw_file(irods_env_path)
+        session = _from_pw_file(irods_env_path, lazy)
 
     if password is not None:
         session = _from_password(irods_env_path, password)
@@ -78,9 +82,9 @@ def interactive_auth(
     raise LoginError("Connection to iRODS could not be established.")
 
 
-def _from_pw_file(irods_env_path):
+def _from_pw_file(irods_env_path, lazy=False):
     try:
-        session = Session(irods_env_path)
+        session = Session(irods_env_path, lazy=lazy)
         return session
     except IndexError:
         print("INFO: The cached password in ~/.irods/.irodsA has been corrupted")
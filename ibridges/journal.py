@@ -0,0 +1,179 @@
+"""Persistent journal to resume interrupted transfers."""
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+import warnings
+from pathlib import Path
+from typing import IO, Iterable, Optional, Union
+
+JOURNAL_VERSION = "1.0"
+
+
+class TransferJournal():
+    """Append-only journal of the operations of an :class:`ibridges.executor.Operations` run.
+
+    The journal is a file with one JSON record per line. It starts with a record
+    describing the run, followed by a record for each planned operation. During the execution,
+    records are appended when an operation is started, completed or has failed. Since the
+    journal is only appended to, it remains usable when the process is interrupted.
+
+    If the journal already exists, it is read, so that completed operations can be skipped
+    without contacting the iRODS server. Usually the journal is used through the `journal`
+    argument of :func:`ibridges.data_operations.upload` and similar functions, and
+    :func:`ibridges.data_operations.resume`.
+
+    Parameters
+    ----------
+    journal_fp:
+        File to store the journal in.
+
+    Examples
+    --------
+    >>> with TransferJournal("upload.journal") as journal:
+    >>>     journal.write_plan({"resc_name": ""}, [{"op": "upload", "key": "upload:x", ...}])
+    >>>     journal.started("upload:x")
+    >>>     journal.completed("upload:x")
+
+    """
+
+    def __init__(self, journal_fp: Union[str, Path]):
+        """Read the journal if it exists."""
+        self.journal_fp = Path(journal_fp)
+        self.header: Optional[dict] = None
+        self.planned: dict[str, dict] = {}
+        self.completed_keys: set[str] = set()
+        self.failed_keys: set[str] = set()
+        self._lock = threading.Lock()
+        self._handle: Optional[IO[str]] = None
+        if self.journal_fp.is_file():
+            self._read()
+
+    def __enter__(self):
+        """Use the journal as a context manager, closing it on exit."""
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_trace_back):
+        """Close the journal file."""
+        self.close()
+
+    def _read(self):
+        with open(self.journal_fp, "r", encoding="utf-8") as handle:
+            for line in handle:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # The last record might be incomplete if the process was killed.
+                    warnings.warn(f"Skipping corrupted record in journal {self.journal_fp}.")
+                    continue
+                event = record["event"]
+                if event == "run":
+                    self.header = record
+                elif event == "planned":
+                    self.planned[record["key"]] = record
+                elif event == "completed":
+                    self.completed_keys.add(record["key"])
+                    self.failed_keys.discard(record["key"])
+                elif event == "failed":
+                    self.failed_keys.add(record["key"])
+
+    def _write(self, record: dict, sync: bool = False):
+        with self._lock:
+            if self._handle is None:
+                self.journal_fp.parent.mkdir(parents=True, exist_ok=True)
+                self._handle = open(self.journal_fp, "a", encoding="utf-8")  # pylint: disable=consider-using-with
+            self._handle.write(json.dumps(record) + "\n")
+            self._handle.flush()
+            if sync:
+                os.fsync(self._handle.fileno())
+
+    @property
+    def has_plan(self) -> bool:
+        """Whether the operations have already been written to the journal."""
+        return self.header is not None
+
+    def write_plan(self, header: dict, records: Iterable[dict]):
+        """Write the description of the run and all planned operations.
+
+        Parameters
+        ----------
+        header
+            Settings of the run, such as the resource name.
+        records
+            One dictionary for each operation, which should contain a unique 'key' and
+            the type of operation 'op'.
+
+        Raises
+        ------
+        ValueError
+            If the journal already contains a plan.
+
+        """
+        if self.has_plan:
+            raise ValueError(f"Journal {self.journal_fp} already contains planned operations.")
+        self.header = {"event": "run", "version": JOURNAL_VERSION, "time": time.time()}
+        self.header.update(header)
+        self._write(self.header)
+        for record in records:
+            record = dict(record, event="planned")
+            self.planned[record["key"]] = record
+            self._write(record)
+        self._write({"event": "plan_complete", "time": time.time()}, sync=True)
+
+    def is_completed(self, key: str) -> bool:
+        """Check whether an operation has been completed in this or an earlier run."""
+        return key in self.completed_keys
+
+    def pending(self) -> list[dict]:
+        """Get all planned operations that have not been completed yet."""
+        return [record for key, record in self.planned.items()
+                if key not in self.completed_keys]
+
+    def started(self, key: str):
+        """Record that an operation has been started."""
+        self._write({"event": "started", "key": key, "time": time.time()})
+
+    def completed(self, key: str):
+        """Record that an operation has been completed succesfully."""
+        self._write({"event": "completed", "key": key, "time": time.time()})
+        with self._lock:
+            self.completed_keys.add(key)
+            self.failed_keys.discard(key)
+
+    def failed(self, key: str, error: Exception):
+        """Record that an operation has failed."""
+        self._write({"event": "failed", "key": key, "time": time.time(), "error": repr(error)})
+        with self._lock:
+            self.failed_keys.add(key)
+
+    def close(self):
+        """Flush the journal to disk and close the file."""
+        with self._lock:
+            if self._handle is not None:
+                self._handle.flush()
+                os.fsync(self._handle.fileno())
+                self._handle.close()
+                self._handle = None
+
+
+def journal_key(op: str, src) -> str:
+    """Create the key of an operation in the journal.
+
+    Parameters
+    ----------
+    op
+        Type of operation, e.g. 'upload' or 'download'.
+    src
+        Source of the operation. For bundles of uploads this is the list of
+        (local path, irods path) tuples, of which the first local path is used.
+
+    Returns
+    -------
+        A key that identifies the operation.
+
+    """
+    if isinstance(src, list):
+        src = src[0][0]
+    return f"{op}:{src}"
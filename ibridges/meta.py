@@ -10,6 +10,15 @@ import irods
 import irods.exception
 import irods.meta
 
+from ibridges.retry import DEFAULT_POLICY
+
+# Metadata names that are ignored by default, since they are managed by the iRODS server.
+DEFAULT_BLACKLIST = r"^org_*"
+
+# Errors of a retried change that show that the first attempt was applied by the server.
+ADD_DONE_ERRORS = (irods.exception.CATALOG_ALREADY_HAS_ITEM_BY_THAT_NAME,)
+REMOVE_DONE_ERRORS = (irods.exception.CAT_SUCCESS_BUT_WITH_NO_INFO,)
+
 
 class MetaData:
     """iRODS metadata operations.
@@ -24,6 +33,9 @@ class MetaData:
     blacklist:
         A regular expression for metadata names/keys that should be ignored.
         By default all metadata starting with `org_` is ignored.
+    session:
+        Session of the item, which is reconnected if it cannot reach the server anymore
+        before retrying a change. By default None, in which case it is not reconnected.
 
 
     Examples
@@ -48,22 +60,19 @@ class MetaData:
     def __init__(
         self,
         item: Union[irods.data_object.iRODSDataObject, irods.collection.iRODSCollection],
-        blacklist: str = r"^org_*",
+        blacklist: Optional[str] = DEFAULT_BLACKLIST,
+        session=None,
     ):
         """Initialize the metadata object."""
         self.item = item
         self.blacklist = blacklist
+        self.session = session
 
     def __iter__(self) -> Iterator:
         """Iterate over all metadata key/value/units triplets."""
-        if self.blacklist is None:
-            yield from self.item.metadata.items()
         for meta in self.item.metadata.items():
-            if re.match(self.blacklist, meta.name) is None:
+            if not _is_blacklisted(meta.name, self.blacklist):
                 yield meta
-            else:
-                warnings.warn(f"Ignoring metadata entry with value {meta.name}, because it matches "
-                              f"the blacklist {self.blacklist}.")
 
     def __len__(self) -> int:
         """Get the number of non-blacklisted metadata entries."""
@@ -148,7 +157,8 @@ class MetaData:
         try:
             if (key, value, units) in self:
                 raise ValueError("ADD META: Metadata already present")
-            self.item.metadata.add(key, value, units)
+            DEFAULT_POLICY.call(self.item.metadata.add, key, value, units,
+                                reconnect=self.session, done_errors=ADD_DONE_ERRORS)
         except irods.exception.CAT_NO_ACCESS_PERMISSION as error:
             raise PermissionError("UPDATE META: no permissions") from error
 
@@ -220,9 +230,12 @@ class MetaData:
                 all_metas = self.item.metadata.get_all(key)
                 for meta in all_metas:
                     if value is ... or value == meta.value and units is ... or units == meta.units:
-                        self.item.metadata.remove(meta)
+                        DEFAULT_POLICY.call(self.item.metadata.remove, meta,
+                                            reconnect=self.session,
+                                            done_errors=REMOVE_DONE_ERRORS)
             else:
-                self.item.metadata.remove(key, value, units)
+                DEFAULT_POLICY.call(self.item.metadata.remove, key, value, units,
+                                    reconnect=self.session, done_errors=REMOVE_DONE_ERRORS)
         except irods.exception.CAT_SUCCESS_BUT_WITH_NO_INFO as error:
             raise KeyError(
                 f"Cannot delete metadata with key '{key}', value '{value}'"
@@ -255,7 +268,8 @@ class MetaData:
 
         """
         for meta in self:
-            self.item.metadata.remove(meta)
+            DEFAULT_POLICY.call(self.item.metadata.remove, meta, reconnect=self.session,
+                                done_errors=REMOVE_DONE_ERRORS)
 
     def to_dict(self, keys: Optional[list] = None) -> dict:
         """Convert iRODS metadata (AVUs) and system information to a python dictionary.
@@ -323,3 +337,25 @@ class MetaData:
                 self.add(*meta_tuple)
             except ValueError:
                 pass
+
+
+def _is_blacklisted(name: str, blacklist: Optional[str] = DEFAULT_BLACKLIST) -> bool:
+    """Check whether a metadata name should be ignored, with a warning if so.
+
+    Parameters
+    ----------
+    name:
+        Name (key) of the metadata entry.
+    blacklist:
+        Regular expression for the names to ignore, None to ignore nothing.
+
+    Returns
+    -------
+        True if the entry should be ignored.
+
+    """
+    if blacklist is None or re.match(blacklist, name) is None:
+        return False
+    warnings.warn(f"Ignoring metadata entry with value {name}, because it matches "
+                  f"the blacklist {blacklist}.")
+    return True
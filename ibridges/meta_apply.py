@@ -0,0 +1,217 @@
+"""Apply metadata changes to many collections and data objects at once.
+
+The changes for each item are sent to the server as one atomic request, so that an item
+either gets all of its changes or none of them. The requests for different items are
+independent, and can be sent concurrently on separate sessions. Failed items are collected
+in a :class:`MetaApplyReport` instead of stopping the other items.
+"""
+
+from __future__ import annotations
+
+import threading
+import warnings
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Iterable, Optional
+
+import irods.exception
+from irods.meta import AVUOperation, iRODSMeta
+from irods.models import Collection, DataObject
+
+from ibridges.meta import ADD_DONE_ERRORS, REMOVE_DONE_ERRORS
+from ibridges.pool import borrowed, worker_sessions
+from ibridges.retry import DEFAULT_POLICY
+
+# Changes to the metadata of one item. The path is the absolute path of the item, and
+# add and remove are lists of (name, value, units) tuples. The entries are removed first.
+MetaChange = namedtuple("MetaChange", ["path", "is_dataobj", "add", "remove"])
+
+# Servers before this version do not support atomic metadata requests.
+ATOMIC_META_VERSION = (4, 2, 8)
+
+
+class MetaApplyReport():
+    """Result of applying metadata changes.
+
+    Parameters
+    ----------
+    dry_run:
+        Whether the changes were only planned, and not sent to the server.
+
+    Examples
+    --------
+    >>> report = apply_meta_changes(session, changes, max_workers=4)
+    >>> print(report)
+    >>> for path, error in report.failed:
+    >>>     print(path, error)
+
+    """
+
+    def __init__(self, dry_run: bool = False):
+        """Create an empty report."""
+        self.dry_run = dry_run
+        self.changes: list[MetaChange] = []
+        self.failed: list[tuple[str, Exception]] = []
+        self._lock = threading.Lock()
+
+    def record(self, change: MetaChange, error: Optional[Exception] = None):
+        """Record that the changes for an item were applied, or that they failed."""
+        with self._lock:
+            if error is None:
+                self.changes.append(change)
+            else:
+                self.failed.append((change.path, error))
+
+    @property
+    def n_added(self) -> int:
+        """Number of metadata entries that were added."""
+        return sum(len(change.add) for change in self.changes)
+
+    @property
+    def n_removed(self) -> int:
+        """Number of metadata entries that were removed."""
+        return sum(len(change.remove) for change in self.changes)
+
+    def __str__(self) -> str:
+        """Summarize the changes and list the failures, for a dry run also list the changes."""
+        verb = "Would change" if self.dry_run else "Changed"
+        summary = (f"{verb} metadata of {len(self.changes)} items: {self.n_added} entries added, "
+                   f"{self.n_removed} entries removed.")
+        if self.dry_run:
+            for change in self.changes:
+                summary += f"\n\n{change.path}"
+                summary += "".join(f"\n  - {_avu_str(avu)}" for avu in change.remove)
+                summary += "".join(f"\n  + {_avu_str(avu)}" for avu in change.add)
+        if self.failed:
+            summary += f"\nFailed for {len(self.failed)} items:\n"
+            summary += "\n".join(f"{path}: {error!r}" for path, error in self.failed)
+        return summary
+
+
+def apply_meta_changes(session, changes: Iterable[MetaChange], max_workers: int = 1,
+                       dry_run: bool = False) -> MetaApplyReport:
+    """Apply metadata changes, with one atomic request per item.
+
+    Parameters
+    ----------
+    session:
+        Session to apply the changes with, which can also be a :class:`ibridges.pool.SessionPool`.
+    changes:
+        Changes for each item, items without changes are skipped.
+    max_workers:
+        Number of items that are changed at the same time, by default 1. With more workers,
+        the session is cloned for each worker, or sessions are borrowed from the pool.
+    dry_run:
+        If True, only record the changes in the report, without applying them.
+
+    Returns
+    -------
+        Report with the applied changes and the items for which they failed.
+
+    Examples
+    --------
+    >>> change = MetaChange("/zone/home/user/data.txt", True, add=[("author", "Ben", "")],
+    >>>                     remove=[("author", "Emma", "")])
+    >>> report = apply_meta_changes(session, [change])
+
+    """
+    report = MetaApplyReport(dry_run=dry_run)
+    changes = (change for change in changes if change.add or change.remove)
+    if dry_run:
+        for change in changes:
+            report.record(change)
+        return report
+
+    def _apply(cur_session, change: MetaChange):
+        try:
+            _apply_change(cur_session, change)
+        except Exception as error:  # pylint: disable=broad-exception-caught
+            report.record(change, error)
+        else:
+            report.record(change)
+
+    if max_workers <= 1:
+        with borrowed(session):
+            for change in changes:
+                _apply(session, change)
+        return report
+
+    # Keep a bounded number of requests in flight, so that a future is not created for
+    # every item at once.
+    with worker_sessions(session) as run, ThreadPoolExecutor(max_workers) as executor:
+        running: set = set()
+        try:
+            for change in changes:
+                running.add(executor.submit(run, _apply, change))
+                if len(running) >= 2 * max_workers:
+                    done, running = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        future.result()
+            for future in running:
+                future.result()
+        except BaseException:
+            for future in running:
+                future.cancel()
+            raise
+    return report
+
+
+def _apply_change(session, change: MetaChange):
+    """Send the changes of one item to the server."""
+    model = DataObject if change.is_dataobj else Collection
+    manager = session.irods_session.metadata
+    removes = [iRODSMeta(*avu) for avu in change.remove]
+    adds = [iRODSMeta(*avu) for avu in change.add]
+    try:
+        if _supports_atomic(session):
+            operations = ([AVUOperation(operation="remove", avu=avu) for avu in removes]
+                          + [AVUOperation(operation="add", avu=avu) for avu in adds])
+            retried = False
+
+            def _apply_atomic():
+                nonlocal retried
+                # The server may have applied the request before the answer was lost,
+                # in which case sending it again would fail.
+                if retried and _is_applied(manager, model, change):
+                    return
+                retried = True
+                manager.apply_atomic_operations(model, change.path, *operations)
+            DEFAULT_POLICY.call(_apply_atomic, reconnect=session)
+            return
+        warnings.warn("The iRODS server does not support atomic metadata changes, "
+                      "the metadata is changed one entry at a time.")
+        for avu in removes:
+            DEFAULT_POLICY.call(manager.remove, model, change.path, avu, reconnect=session,
+                                done_errors=REMOVE_DONE_ERRORS)
+        for avu in adds:
+            DEFAULT_POLICY.call(manager.add, model, change.path, avu, reconnect=session,
+                                done_errors=ADD_DONE_ERRORS)
+    except irods.exception.CAT_NO_ACCESS_PERMISSION as error:
+        raise PermissionError(f"UPDATE META: no permissions for {change.path}") from error
+
+
+def _is_applied(manager, model, change: MetaChange) -> bool:
+    """Check whether the item already has the metadata that results from the change."""
+    current = {_avu_key(avu) for avu in manager.get(model, change.path)}
+    adds = {_avu_key(avu) for avu in change.add}
+    removes = {_avu_key(avu) for avu in change.remove} - adds
+    return adds <= current and not removes & current
+
+
+def _avu_key(avu) -> tuple[str, str, str]:
+    if isinstance(avu, iRODSMeta):
+        return avu.name, avu.value, avu.units or ""
+    name, value, units = (tuple(avu) + (None,))[:3]
+    return name, value, units or ""
+
+
+def _avu_str(avu) -> str:
+    name, value, units = (tuple(avu) + (None,))[:3]
+    return f"{name}: {value}" + (f" ({units})" if units else "")
+
+
+def _supports_atomic(session) -> bool:
+    try:
+        return tuple(session.server_version) >= ATOMIC_META_VERSION
+    except (AttributeError, TypeError):
+        return False
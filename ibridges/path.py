@@ -1,16 +1,23 @@
 """A class to handle iRODS paths."""
+# pylint: disable=too-many-lines
 
 from __future__ import annotations
 
 from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
 from pathlib import PurePosixPath
-from typing import Iterable, Optional, Union
+from typing import Any, Callable, Iterable, Iterator, Optional, Union
 
 import irods
-from irods.models import DataObject
+from irods.models import Collection, DataObject
 
 import ibridges.icat_columns as icat
+from ibridges.cache import get_stat_cache, invalidate
 from ibridges.meta import MetaData
+from ibridges.pool import SessionPool, borrowed, worker_sessions
+from ibridges.retry import DEFAULT_POLICY
+from ibridges.throttle import INTERACTIVE, Throttle, ThrottledStream
 
 
 class IrodsPath:
@@ -25,6 +32,8 @@ class IrodsPath:
     behavior in some cases.
     """
 
+    __slots__ = ("session", "_path", "_abs_str", "_abs_home")
+
     _current_working_path = ""
 
     def __init__(self, session, *args):
@@ -63,6 +72,9 @@ class IrodsPath:
         # path outside of the IrodsPath object.
         args = [a._path if isinstance(a, IrodsPath) else a for a in args]
         self._path = PurePosixPath(*args)
+        # The absolute path is cached, together with the home collection it was based on.
+        self._abs_str: Optional[str] = None
+        self._abs_home: Optional[str] = None
 
         super().__init__()
 
@@ -81,35 +93,51 @@ class IrodsPath:
         IrodsPath(/, zone, user)
 
         """
-        # absolute path
-        if len(self._path.parts) == 0:
-            return IrodsPath(self.session, self.session.home)
-        if self._path.parts[0] == "~" or self._path.parts[0] == ".":
-            begin, end = self.session.home, self._path.parts[1:]
-        elif self._path.parts[0] == "/":
-            begin, end = "/", self._path.parts[1:]
-        else:
-            begin, end = self.session.home, self._path.parts
-        abs_str = str(PurePosixPath(begin, *end))
-        return IrodsPath(self.session, abs_str)
+        return IrodsPath(self.session, self._absolute_str())
+
+    def _absolute_str(self) -> str:
+        """Get the absolute path as a string, which is only computed once."""
+        parts = self._path.parts
+        if len(parts) > 0 and parts[0] == "/":
+            if self._abs_str is None:
+                self._abs_str = str(self._path)
+            return self._abs_str
+        # Relative paths depend on the home collection of the session.
+        home = self.session.home
+        if self._abs_str is not None and self._abs_home == home:
+            return self._abs_str
+        if len(parts) > 0 and parts[0] in ("~", "."):
+            parts = parts[1:]
+        self._abs_str = str(PurePosixPath(home, *parts))
+        self._abs_home = home
+        return self._abs_str
 
     def __str__(self) -> str:
         """Get the absolute path if converting to string."""
-        return str(self.absolute()._path)
+        return self._absolute_str()
 
     def __repr__(self) -> str:
         """Representation of the IrodsPath object in line with a Path object."""
         return f"IrodsPath({', '.join(self._path.parts)})"
 
+    def __eq__(self, other) -> bool:
+        """Compare the absolute paths, other types of paths are never equal."""
+        if not isinstance(other, IrodsPath):
+            return NotImplemented
+        return self._absolute_str() == other._absolute_str()
+
+    def __hash__(self) -> int:
+        """Hash the absolute path, so that paths can be used as dictionary keys."""
+        return hash(self._absolute_str())
+
     def __truediv__(self, other) -> IrodsPath:
         """Ensure that we can append just like the Path object."""
-        return self.__class__(self.session, self._path, other)
+        return IrodsPath(self.session, self._path, other)
 
-    def __getattribute__(self, attr):
-        """Make the IrodsPath transparent so that some Path functionality is available."""
-        if attr in ["parts"]:
-            return self._path.__getattribute__(attr)
-        return super().__getattribute__(attr)
+    @property
+    def parts(self) -> tuple[str, ...]:
+        """Components of the path, as they were given."""
+        return self._path.parts
 
     def joinpath(self, *args) -> IrodsPath:
         """Concatenate another path to this one.
@@ -142,7 +170,7 @@ class IrodsPath:
         IrodsPath("/", "zone", "home")
 
         """
-        return IrodsPath(self.session, self.absolute()._path.parent)  # pylint: disable=protected-access
+        return IrodsPath(self.session, self._absolute_str().rsplit("/", 1)[0] or "/")
 
     @property
     def name(self) -> str:
@@ -159,7 +187,7 @@ class IrodsPath:
         "user"
 
         """
-        return self.absolute().parts[-1]
+        return self._absolute_str().rsplit("/", 1)[-1] or "/"
 
     def remove(self):
         """Remove the data behind an iRODS path.
@@ -183,6 +211,8 @@ class IrodsPath:
                 obj.unlink()
         except irods.exception.CUT_ACTION_PROCESSED_ERR as exc:
             raise PermissionError(f"While removing {self}: iRODS server forbids action.") from exc
+        finally:
+            invalidate(self.session, self, recursive=True)
 
     @staticmethod
     def create_collection(
@@ -221,6 +251,8 @@ class IrodsPath:
             raise PermissionError(
                 "While creating collection '{coll_path}': iRODS server forbids action."
             ) from exc
+        finally:
+            invalidate(session, IrodsPath(session, coll_path))
 
     def rename(self, new_name: Union[str, IrodsPath]) -> IrodsPath:
         """Change the name or the path of a data object or collection.
@@ -273,6 +305,9 @@ class IrodsPath:
             ) from err
         except irods.exception.CAT_NO_ACCESS_PERMISSION as err:
             raise PermissionError(f"Not allowed to move data to {new_path}") from err
+        finally:
+            invalidate(self.session, self, recursive=True)
+            invalidate(self.session, new_path, recursive=True)
 
     def collection_exists(self) -> bool:
         """Check if the path points to an iRODS collection.
@@ -287,7 +322,8 @@ class IrodsPath:
         True
 
         """
-        return self.session.irods_session.collections.exists(str(self))
+        return self._cached("is_collection",
+                            lambda: self.session.irods_session.collections.exists(str(self)))
 
     def dataobject_exists(self) -> bool:
         """Check if the path points to an iRODS data object.
@@ -302,7 +338,20 @@ class IrodsPath:
         True
 
         """
-        return self.session.irods_session.data_objects.exists(str(self))
+        return self._cached("is_dataobject",
+                            lambda: self.session.irods_session.data_objects.exists(str(self)))
+
+    def _cached(self, field: str, func: Callable):
+        """Get a value from the stat cache of the session, or compute it and store it there."""
+        cache = get_stat_cache(self.session)
+        if cache is None:
+            return func()
+        path = self._absolute_str()
+        value = cache.get(path, field)
+        if value is None:
+            value = func()
+            cache.put(path, **{field: value})
+        return value
 
     def exists(self) -> bool:
         """Check if the path already exists on the iRODS server.
@@ -380,7 +429,7 @@ class IrodsPath:
 
         raise irods.exception.DataObjectDoesNotExist(str(IrodsPath))
 
-    def open(self, mode="r", **kwargs):
+    def open(self, mode="r", throttle: Optional[Throttle] = None, **kwargs):
         """Open a data object for reading or writing.
 
         Parameters
@@ -392,6 +441,9 @@ class IrodsPath:
             mode, so to write a string you need to encode it, while reading a string from
             a data object requires you to decode it. You are advised to use a consistent
             (utf-8) encoding for all your data objects.
+        throttle, optional
+            Throttle that limits the bandwidth of reading and writing. By default, the global
+            rate limit is applied with interactive priority.
         kwargs:
             Extra keyword arguments for the python-irodsclient to parse.
 
@@ -423,13 +475,22 @@ class IrodsPath:
         # Create the data object if it does not exist.
         if mode == "w" and not self.dataobject_exists():
             self.session.irods_session.data_objects.create(str(self))
-        return self.dataobject.open(mode=mode, **kwargs)
-
-    def walk(self, depth: Optional[int] = None) -> Iterable[IrodsPath]:
+        if mode != "r":
+            invalidate(self.session, self)
+        handle = self.dataobject.open(mode=mode, **kwargs)
+        if throttle is None:
+            throttle = Throttle(priority=INTERACTIVE)
+        if throttle.active:
+            return ThrottledStream(handle, throttle)
+        return handle
+
+    def walk(self, depth: Optional[int] = None, ordered: bool = True,
+             max_workers: int = 1) -> Iterable[IrodsPath]:
         """Walk on a collection.
 
-        This iterates over all collections and data object for the path. If the
-        path is pointing to a data object, it will simply yield this data object.
+        This iterates over all collections and data object for the path. The results
+        are yielded while they are being retrieved from the server, so the first results
+        arrive quickly, even for very large collections.
 
         Parameters
         ----------
@@ -437,6 +498,21 @@ class IrodsPath:
             The maximum depth relative to the starting collection over which is walked.
             For example if depth equals 1, then it will iterate only over the subcollections
             and data objects directly under the starting collection.
+        ordered : bool
+            If True (default), each collection is followed by its subcollections (recursively)
+            and then by its data objects, both sorted by name. The paths of all collections are
+            kept in memory, and the data objects of a collection until its subcollections have
+            been walked.
+            If False, all collections are yielded first and then all data objects, in the
+            order in which the server returns them, which needs constant memory.
+            In both cases the tree is retrieved with two queries, on a session that is taken
+            from the pool if the session is a :class:`ibridges.pool.SessionPool`.
+        max_workers : int
+            Number of subtrees that are queried at the same time, by default 1. With more
+            workers, the top of the tree is listed first, after which the subtrees below it
+            are queried in parallel, each with its own connection. If the session is a
+            :class:`ibridges.pool.SessionPool` the connections are borrowed from the pool,
+            otherwise the session is cloned for each worker.
 
         Returns
         -------
@@ -452,19 +528,27 @@ class IrodsPath:
         >>> for ipath in IrodsPath(session, "~").walk(depth=1):
         >>>     print(ipath)
         IrodsPath(~, x)
+        >>> n_objects = sum(ipath.dataobject_exists() for ipath in ipath.walk(ordered=False))
+        >>> for ipath in IrodsPath(session, "~/large_project").walk(max_workers=8):
+        >>>     print(ipath)
 
         """
-        all_data_objects: dict[str, list[IrodsPath]] = defaultdict(list)
-        for path, name, size, checksum in _get_data_objects(self.session, self.collection):
-            abs_path = IrodsPath(self.session, path).absolute()
-            ipath = CachedIrodsPath(self.session, size, True, checksum, path, name)
-            all_data_objects[str(abs_path)].append(ipath)
-        all_collections = _get_subcoll_paths(self.session, self.collection)
-        all_collections = sorted(all_collections, key=str)
-        sub_collections: dict[str, list[IrodsPath]] = defaultdict(list)
-        for cur_col in all_collections:
-            sub_collections[str(cur_col.parent)].append(cur_col)
-        yield from _recursive_walk(self, sub_collections, all_data_objects, self, 0, depth)
+        with borrowed(self.session):
+            coll_path = self.collection.path
+        if max_workers > 1:
+            yield from _ParallelWalk(self, coll_path, depth, max_workers).walk(ordered)
+            return
+        # The queries of the walk are not run on the session that the current thread
+        # has borrowed from a pool, since they are paused while the caller uses it.
+        with _query_session(self.session) as session:
+            if ordered:
+                yield from _ordered_walk(self, session, coll_path, depth)
+                return
+            yield self
+            for sub_path in _iter_subcoll_paths(session, coll_path, depth):
+                yield CachedIrodsPath(self.session, None, False, None, sub_path)
+            for path, name, size, checksum in _iter_data_objects(session, coll_path, depth):
+                yield CachedIrodsPath(self.session, size, True, checksum, path, name)
 
     def relative_to(self, other: IrodsPath) -> PurePosixPath:
         """Calculate the relative path compared to our path.
@@ -476,7 +560,7 @@ class IrodsPath:
         >>> IrodsPath(session, "~/col/dataobj.txt").relative_to(IrodsPath(session, "~/col"))
         PurePosixPath(dataobj.txt)
         """
-        return PurePosixPath(str(self.absolute())).relative_to(PurePosixPath(str(other.absolute())))
+        return PurePosixPath(str(self)).relative_to(PurePosixPath(str(other)))
 
     @property
     def size(self) -> int:
@@ -506,9 +590,10 @@ class IrodsPath:
                 " it is neither a collection nor a dataobject."
             )
         if self.dataobject_exists():
-            return self.dataobject.size
-        all_objs = _get_data_objects(self.session, self.collection)
-        return sum(size for _, _, size, _ in all_objs)
+            return self._cached("size", lambda: self.dataobject.size)
+        with borrowed(self.session):
+            return sum(size for _, _, size, _ in _iter_data_objects(self.session,
+                                                                     self.collection.path))
 
     @property
     def checksum(self) -> str:
@@ -532,12 +617,15 @@ class IrodsPath:
 
         """
         if self.dataobject_exists():
-            dataobj = self.dataobject
-            return dataobj.checksum if dataobj.checksum is not None else dataobj.chksum()
+            return self._cached("checksum", self._get_checksum)
         if self.collection_exists():
             raise ValueError("Cannot take checksum of a collection.")
         raise ValueError("Cannot take checksum of irods path neither a dataobject or collection.")
 
+    def _get_checksum(self) -> str:
+        dataobj = self.dataobject
+        return dataobj.checksum if dataobj.checksum is not None else dataobj.chksum()
+
     @property
     def meta(self) -> MetaData:
         """Metadata linked to the dataobject or collection.
@@ -553,25 +641,229 @@ class IrodsPath:
 
         """
         if self.dataobject_exists():
-            return MetaData(self.dataobject)
+            return MetaData(self.dataobject, session=self.session)
         if self.collection_exists():
-            return MetaData(self.collection)
+            return MetaData(self.collection, session=self.session)
         raise ValueError("Cannot get metadata for path that is neither dataobject or collection:"
                          f" {self}")
 
 
 
-def _recursive_walk(cur_col: IrodsPath, sub_collections: dict[str, list[IrodsPath]],
-                    all_dataobjects: dict[str, list[IrodsPath]], start_col: IrodsPath,
-                    depth: int, max_depth: Optional[int]):
-    yield cur_col
-    if max_depth is not None and depth >= max_depth:
+def _ordered_walk(root: IrodsPath, query_session, coll_path: str,
+                  max_depth: Optional[int]) -> Iterator[IrodsPath]:
+    """Walk a collection in order, with two queries for the whole subtree.
+
+    The collections and data objects are both retrieved ordered by collection name,
+    after which the walk is ordered locally, one level at a time.
+    """
+    session = root.session
+    yield root
+    if max_depth is not None and max_depth < 1:
+        return
+    sub_collections: dict[str, list[str]] = defaultdict(list)
+    # Position of each collection in the order of the server.
+    coll_rank = {coll_path: -1}
+    for sub_path in _iter_subcoll_paths(query_session, coll_path, max_depth, ordered=True):
+        coll_rank[sub_path] = len(coll_rank)
+        sub_collections[_parent(sub_path)].append(sub_path)
+    objects = _ObjectGroups(_iter_data_objects(query_session, coll_path, max_depth,
+                                               ordered=True), coll_rank)
+
+    def _walk_coll(cur_path: str, depth: int) -> Iterator[IrodsPath]:
+        for sub_path in sorted(sub_collections.pop(cur_path, [])):
+            yield CachedIrodsPath(session, None, False, None, sub_path)
+            if max_depth is None or depth + 1 < max_depth:
+                yield from _walk_coll(sub_path, depth + 1)
+        for path, name, size, checksum in objects.pop(cur_path):
+            yield CachedIrodsPath(session, size, True, checksum, path, name)
+
+    yield from _walk_coll(coll_path, 0)
+
+
+class _ObjectGroups():  # pylint: disable=too-few-public-methods
+    """Data objects of a subtree, grouped by collection.
+
+    The rows are read when the data objects of a collection are requested. Since the rows
+    are ordered by collection in the same way as the collections, all rows of a collection
+    have been read once a row of a collection with a higher rank has been read. The rows
+    of other collections that were read are kept until they are requested.
+    """
+
+    def __init__(self, rows: Iterator[tuple[str, str, int, str]], coll_rank: dict[str, int]):
+        self.rows = rows
+        self.coll_rank = coll_rank
+        self.groups: dict[str, dict[str, tuple[str, str, int, str]]] = defaultdict(dict)
+        self.read_rank = -2
+
+    def pop(self, coll_path: str) -> list[tuple[str, str, int, str]]:
+        """Remove and return the data objects of a collection, sorted by name."""
+        rank = self.coll_rank[coll_path]
+        while self.read_rank <= rank:
+            row = next(self.rows, None)
+            if row is None:
+                break
+            # Collections that were created after they were listed are not walked.
+            if row[0] in self.coll_rank:
+                self.read_rank = self.coll_rank[row[0]]
+                # Data objects with multiple replicas can be returned multiple times.
+                self.groups[row[0]].setdefault(row[1], row)
+        group = self.groups.pop(coll_path, {})
+        return [group[name] for name in sorted(group)]
+
+
+class _ParallelWalk():  # pylint: disable=too-few-public-methods
+    """Walk a collection by querying its subtrees in parallel.
+
+    The top of the tree is listed breadth first, one collection at a time, until there
+    are enough subtrees to keep the workers busy. The data objects and collections of each
+    subtree are then retrieved with two queries on a separate connection. Only a limited
+    number of subtrees is queried ahead of the ones that are being yielded.
+    """
+
+    def __init__(self, root: IrodsPath, coll_path: str, max_depth: Optional[int],
+                 max_workers: int):
+        self.root = root
+        self.session = root.session
+        self.coll_path = coll_path
+        self.root_level = _n_parts(coll_path)
+        self.max_depth = max_depth
+        self.max_workers = max_workers
+        # Listings of the collections at the top of the tree.
+        self.listings: dict[str, tuple[list[tuple[str, int, str]], list[str]]] = {}
+        pending = [coll_path] if self._expand(coll_path) else []
+        while 0 < len(pending) < 2 * max_workers:
+            next_pending: list[str] = []
+            for cur_path in pending:
+                with _query_session(self.session) as session:
+                    self.listings[cur_path] = _list_collection(session, cur_path)
+                next_pending.extend(
+                    sub_path for sub_path in (_join(cur_path, name)
+                                              for name in self.listings[cur_path][1])
+                    if self._expand(sub_path))
+            pending = next_pending
+
+    def _expand(self, coll_path: str) -> bool:
+        """Check whether the contents of a collection are within the maximum depth."""
+        return self.max_depth is None or _n_parts(coll_path) - self.root_level < self.max_depth
+
+    def _sub_depth(self, coll_path: str) -> Optional[int]:
+        """Get the maximum depth of the walk relative to a collection."""
+        if self.max_depth is None:
+            return None
+        return self.max_depth - (_n_parts(coll_path) - self.root_level)
+
+    def _top(self, coll_path: str) -> Iterator[tuple[str, Any]]:
+        """Generate the top of the tree in walk order, with placeholders for the subtrees."""
+        yield "collection", coll_path
+        if coll_path in self.listings:
+            data_objects, sub_names = self.listings[coll_path]
+            for name in sub_names:
+                yield from self._top(_join(coll_path, name))
+            for name, size, checksum in data_objects:
+                yield "data_object", (coll_path, name, size, checksum)
+        elif self._expand(coll_path):
+            yield "subtree", coll_path
+
+    def walk(self, ordered: bool) -> Iterator[IrodsPath]:
+        """Yield all collections and data objects, see :meth:`IrodsPath.walk`."""
+        top = list(self._top(self.coll_path))
+        subtrees = iter([coll_path for kind, coll_path in top if kind == "subtree"])
+        with worker_sessions(self.session) as run, \
+                ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            # Subtrees that are being queried, in the order in which they were submitted.
+            running: dict[str, Future] = {}
+
+            def _submit_next():
+                for sub_path in subtrees:
+                    running[sub_path] = executor.submit(run, _query_subtree, sub_path,
+                                                        self._sub_depth(sub_path))
+                    return
+
+            try:
+                for _ in range(2 * self.max_workers):
+                    _submit_next()
+                for kind, value in top:
+                    if kind != "subtree":
+                        yield self._make_path(kind, value)
+                    elif ordered:
+                        collections, data_objects = running.pop(value).result()
+                        _submit_next()
+                        yield from self._ordered_subtree(value, collections, data_objects)
+                while running:
+                    done, _ = wait(running.values(), return_when=FIRST_COMPLETED)
+                    for sub_path in [path for path, fut in running.items() if fut in done]:
+                        collections, data_objects = running.pop(sub_path).result()
+                        _submit_next()
+                        yield from (CachedIrodsPath(self.session, None, False, None, path)
+                                    for path in collections)
+                        yield from (self._make_path("data_object", obj) for obj in data_objects)
+            finally:
+                for future in running.values():
+                    future.cancel()
+
+    def _ordered_subtree(self, sub_path: str, collections: list[str],
+                         data_objects: list[tuple[str, str, int, str]]) -> Iterator[IrodsPath]:
+        sub_collections: dict[str, list[str]] = defaultdict(list)
+        for path in collections:
+            sub_collections[_parent(path)].append(path)
+        coll_objects: dict[str, dict[str, tuple]] = defaultdict(dict)
+        for path, name, size, checksum in data_objects:
+            coll_objects[path].setdefault(name, (path, name, size, checksum))
+
+        def _walk_coll(cur_path: str) -> Iterator[IrodsPath]:
+            if not self._expand(cur_path):
+                return
+            for path in sorted(sub_collections[cur_path]):
+                yield CachedIrodsPath(self.session, None, False, None, path)
+                yield from _walk_coll(path)
+            for name in sorted(coll_objects[cur_path]):
+                yield self._make_path("data_object", coll_objects[cur_path][name])
+
+        yield from _walk_coll(sub_path)
+
+    def _make_path(self, kind: str, value) -> IrodsPath:
+        if kind == "collection":
+            if value == self.coll_path:
+                return self.root
+            return CachedIrodsPath(self.session, None, False, None, value)
+        path, name, size, checksum = value
+        return CachedIrodsPath(self.session, size, True, checksum, path, name)
+
+
+@contextmanager
+def _query_session(session) -> Iterator:
+    """Get a session to run queries with, taking it from the pool if a pool is given.
+
+    Unlike :func:`ibridges.pool.borrowed`, the session is not borrowed for the current
+    thread, so the context can stay open while the caller uses the pool in between.
+    """
+    if not isinstance(session, SessionPool):
+        yield session
         return
-    for sub_col in sub_collections[str(cur_col)]:
-        yield from _recursive_walk(
-            sub_col, sub_collections, all_dataobjects, start_col, depth + 1, max_depth
-        )
-    yield from sorted(all_dataobjects[str(cur_col)], key=str)
+    query_session = session.acquire()
+    try:
+        yield query_session
+    finally:
+        session.release(query_session)
+
+
+def _query_subtree(session, coll_path: str, max_depth: Optional[int]
+                   ) -> tuple[list[str], list[tuple[str, str, int, str]]]:
+    """Get all collections and data objects below a collection, up to a maximum depth."""
+    return (list(_iter_subcoll_paths(session, coll_path, max_depth)),
+            list(_iter_data_objects(session, coll_path, max_depth)))
+
+
+def _n_parts(coll_path: str) -> int:
+    return coll_path.rstrip("/").count("/")
+
+
+def _join(coll_path: str, name: str) -> str:
+    return f"{coll_path.rstrip('/')}/{name}"
+
+
+def _parent(coll_path: str) -> str:
+    return coll_path.rsplit("/", 1)[0] or "/"
 
 
 class CachedIrodsPath(IrodsPath):
@@ -579,11 +871,15 @@ class CachedIrodsPath(IrodsPath):
 
     This version should generally not be used by users, but is used for performance reasons.
     It will cache the size checksum and whether it is a data object. This can be invalidated
-    when other ibridges operations are used.
+    when other ibridges operations are used. Paths that do not exist are represented with
+    :code:`is_dataobj=None`, see :func:`stat_paths`.
     """
 
+    __slots__ = ("_is_dataobj", "_size", "_checksum")
+
     def __init__(
-        self, session, size: Optional[int], is_dataobj: bool, checksum: Optional[str], *args
+        self, session, size: Optional[int], is_dataobj: Optional[bool], checksum: Optional[str],
+        *args
     ):
         """Initialize CachedIrodsPath.
 
@@ -594,7 +890,7 @@ class CachedIrodsPath(IrodsPath):
         size:
             Size of the dataobject, None for collections.
         is_dataobj:
-            Whether the path points to a data object.`
+            Whether the path points to a data object, or None if the path does not exist.
         checksum:
             The checksum of the dataobject, None for collections.
         args:
@@ -609,6 +905,9 @@ class CachedIrodsPath(IrodsPath):
     @property
     def size(self) -> int:
         """See IrodsPath."""
+        if self._is_dataobj is None:
+            raise ValueError(f"Path '{str(self)}' does not exist;"
+                             " it is neither a collection nor a dataobject.")
         if self._size is None:
             return super().size
         return self._size
@@ -616,56 +915,266 @@ class CachedIrodsPath(IrodsPath):
     @property
     def checksum(self) -> str:
         """See IrodsPath."""
+        if self._is_dataobj is None:
+            raise ValueError("Cannot take checksum of irods path neither a dataobject or "
+                             "collection.")
         if self._checksum is None:
             return super().checksum
         return self._checksum
 
     def dataobject_exists(self) -> bool:
         """See IrodsPath."""
-        return self._is_dataobj
+        return self._is_dataobj is True
 
     def collection_exists(self) -> bool:
         """See IrodsPath."""
-        return not self._is_dataobj
+        return self._is_dataobj is False
+
 
+def stat_paths(session, paths: Iterable[Union[str, IrodsPath]],
+               max_workers: int = 1) -> list[CachedIrodsPath]:
+    """Look up whether many paths exist, and the sizes and checksums of the data objects.
 
-def _get_data_objects(
-    session, coll: irods.collection.iRODSCollection
-) -> list[tuple[str, str, int, str]]:
-    """Retrieve all data objects in a collection and all its subcollections.
+    Instead of two or three queries per path, the paths are grouped by their parent
+    collection, and the data objects of each parent are looked up with a few queries.
+    The collections are looked up together, independent of their parent.
 
     Parameters
     ----------
     session:
-        Session to get the data objects with.
-    coll : irods.collection.iRODSCollection
-        The collection to search for all data objects
+        Session to query with, which can also be a :class:`ibridges.pool.SessionPool`.
+    paths:
+        Paths to look up, relative paths are relative to the home collection.
+    max_workers:
+        Number of queries that are done at the same time, by default 1. With more workers,
+        the session is cloned for each worker, or sessions are borrowed from the pool.
 
     Returns
     -------
-    list of all data objects
-        [(collection path, name, size, checksum)]
+        A CachedIrodsPath for each of the paths, in the same order. Paths that do not
+        exist are included, for those both :meth:`IrodsPath.collection_exists` and
+        :meth:`IrodsPath.dataobject_exists` return False.
 
-    """
-    # all objects in the collection
-    objs = [(obj.collection.path, obj.name, obj.size, obj.checksum) for obj in coll.data_objects]
+    Examples
+    --------
+    >>> ipaths = stat_paths(session, ["~/data/a.txt", "~/data/b.txt", "~/data/sub"])
+    >>> missing = [ipath for ipath in ipaths if not ipath.exists()]
+    >>> total_size = sum(ipath.size for ipath in ipaths if ipath.dataobject_exists())
 
-    # all objects in subcollections
-    data_query = session.irods_session.query(
-        icat.COLL_NAME, icat.DATA_NAME, DataObject.size, DataObject.checksum
-    )
-    data_query = data_query.filter(icat.LIKE(icat.COLL_NAME, coll.path + "/%"))
-    for res in data_query.get_results():
-        path, name, size, checksum = res.values()
-        objs.append((path, name, size, checksum))
+    """
+    abs_paths = [str(IrodsPath(session, path)) for path in paths]
+    names_by_parent: dict[str, list[str]] = defaultdict(list)
+    for path in dict.fromkeys(abs_paths):
+        names_by_parent[_parent(path)].append(path.rsplit("/", 1)[-1])
+    tasks: list[tuple[Callable, tuple]] = [
+        (_stat_data_objects, (parent, chunk)) for parent, names in names_by_parent.items()
+        for chunk in _in_chunks(names)]
+    tasks.extend((_stat_collections, (chunk,)) for chunk in _in_chunks(list(dict.fromkeys(
+        abs_paths))))
+
+    found: dict[str, tuple[bool, Optional[int], Optional[str]]] = {}
+    if max_workers > 1 and len(tasks) > 1:
+        with worker_sessions(session) as run, ThreadPoolExecutor(max_workers) as executor:
+            for result in executor.map(lambda task: run(task[0], *task[1]), tasks):
+                found.update(result)
+    else:
+        with borrowed(session):
+            for func, args in tasks:
+                found.update(func(session, *args))
+
+    cache = get_stat_cache(session)
+    ipaths = []
+    for path in abs_paths:
+        is_dataobj, size, checksum = found.get(path, (None, None, None))
+        if cache is not None:
+            cache.put(path, is_dataobject=is_dataobj is True, is_collection=is_dataobj is False,
+                      **({} if size is None else {"size": size}),
+                      **({} if checksum is None else {"checksum": checksum}))
+        ipaths.append(CachedIrodsPath(session, size, is_dataobj, checksum, path))
+    return ipaths
+
+
+# Maximum number of characters of the values in a single 'in' condition of a query.
+_IN_QUERY_CHARS = 2000
+
+
+def _in_chunks(values: list[str]) -> Iterator[list[str]]:
+    """Split values into chunks that fit in a single 'in' condition.
+
+    Values with quotes cannot be part of an 'in' condition, so they get a chunk of their own.
+    """
+    chunk: list[str] = []
+    n_chars = 0
+    for value in values:
+        if "'" in value:
+            yield [value]
+            continue
+        if chunk and n_chars + len(value) + 3 > _IN_QUERY_CHARS:
+            yield chunk
+            chunk, n_chars = [], 0
+        chunk.append(value)
+        n_chars += len(value) + 3
+    if chunk:
+        yield chunk
+
+
+def _name_filter(column, values: list[str]):
+    if len(values) == 1:
+        return column == values[0]
+    return icat.IN(column, values)
+
+
+def _stat_data_objects(session, coll_path: str, names: list[str]
+                       ) -> dict[str, tuple[bool, Optional[int], Optional[str]]]:
+    """Look up data objects in a collection, as path -> (True, size, checksum)."""
+    data_query = session.irods_session.query(DataObject.name, DataObject.size,
+                                             DataObject.checksum)
+    data_query = data_query.filter(Collection.name == coll_path,
+                                   _name_filter(DataObject.name, names))
+    found: dict[str, tuple[bool, Optional[int], Optional[str]]] = {}
+    for res in DEFAULT_POLICY.iterate(iter, data_query, reconnect=session):
+        # Data objects with multiple replicas are returned multiple times.
+        found.setdefault(_join(coll_path, res[DataObject.name]),
+                         (True, res[DataObject.size], res[DataObject.checksum]))
+    return found
+
+
+def _stat_collections(session, coll_paths: list[str]
+                      ) -> dict[str, tuple[bool, Optional[int], Optional[str]]]:
+    """Look up which of the paths are collections, as path -> (False, None, None)."""
+    coll_query = session.irods_session.query(Collection.name)
+    coll_query = coll_query.filter(_name_filter(Collection.name, coll_paths))
+    return {res[Collection.name]: (False, None, None)
+            for res in DEFAULT_POLICY.iterate(iter, coll_query, reconnect=session)}
+
+
+def _iter_data_objects(session, coll_path: str, max_depth: Optional[int] = None,
+                       ordered: bool = False) -> Iterator[tuple[str, str, int, str]]:
+    """Iterate over all data objects in a collection and all its subcollections.
+
+    The results are fetched page by page while iterating, so that the memory use
+    does not depend on the number of data objects.
 
-    return objs
+    Parameters
+    ----------
+    session:
+        Session to get the data objects with.
+    coll_path:
+        Absolute path of the collection.
+    max_depth:
+        Only get the data objects in collections less than this number of levels below
+        the collection, by default all data objects. The limit is part of the query,
+        so that deeper data objects are not retrieved at all.
+    ordered:
+        If True, the server orders the data objects by the name of their collection,
+        in the same way as :func:`_iter_subcoll_paths`.
 
+    Returns
+    -------
+    Generator of all data objects
+        (collection path, name, size, checksum)
 
-def _get_subcoll_paths(session, coll: irods.collection.iRODSCollection) -> list:
-    """Retrieve all sub collections in a sub tree starting at coll and returns their IrodsPaths."""
+    """
+    columns = (icat.COLL_NAME, icat.DATA_NAME, DataObject.size, DataObject.checksum)
+    queries = _subtree_queries(session, columns, coll_path,
+                               None if max_depth is None else max_depth - 1)
+    for data_query in queries:
+        if ordered:
+            data_query = data_query.order_by(icat.COLL_NAME)
+        last = None
+        for res in DEFAULT_POLICY.iterate(iter, data_query, reconnect=session):
+            path, name, size, checksum = (res[icat.COLL_NAME], res[icat.DATA_NAME],
+                                          res[DataObject.size], res[DataObject.checksum])
+            # Replicas with different checksums are returned as separate rows.
+            if (path, name) != last:
+                yield path, name, size, checksum
+            last = (path, name)
+
+
+def _subtree_queries(session, columns: tuple, coll_path: str,
+                     max_level: Optional[int] = None) -> list:
+    """Create queries for the rows of a collection and all collections below it.
+
+    The rows are selected on the collection name, so the columns should be joined with
+    :code:`icat.COLL_NAME`. With max_level, only the collections up to that number of levels
+    below the collection are included, where 0 means only the collection itself.
+    """
+    queries = []
+    if max_level is None or max_level >= 0:
+        queries.append(session.irods_session.query(*columns).filter(icat.COLL_NAME == coll_path))
+    if max_level is None or max_level >= 1:
+        sub_query = session.irods_session.query(*columns).filter(
+            icat.LIKE(icat.COLL_NAME, coll_path.rstrip("/") + "/%"))
+        if max_level is not None:
+            sub_query = sub_query.filter(
+                icat.NOT_LIKE(icat.COLL_NAME, coll_path.rstrip("/") + "/%" * (max_level + 1)))
+        queries.append(sub_query)
+    return queries
+
+
+def _iter_subcoll_paths(session, coll_path: str, max_depth: Optional[int] = None,
+                        ordered: bool = False) -> Iterator[str]:
+    """Iterate over the paths of all collections below a collection, page by page.
+
+    With max_depth, only the collections up to that number of levels below the
+    collection are queried. If ordered, the server orders the collections by name.
+    """
+    if max_depth is not None and max_depth < 1:
+        return
     coll_query = session.irods_session.query(icat.COLL_NAME)
-    coll_query = coll_query.filter(icat.LIKE(icat.COLL_NAME, coll.path + "/%"))
+    if max_depth == 1:
+        coll_query = coll_query.filter(Collection.parent_name == coll_path)
+    else:
+        coll_query = coll_query.filter(icat.LIKE(icat.COLL_NAME, coll_path.rstrip("/") + "/%"))
+    if max_depth is not None and max_depth > 1:
+        coll_query = coll_query.filter(
+            icat.NOT_LIKE(icat.COLL_NAME, coll_path.rstrip("/") + "/%" * (max_depth + 1)))
+    if ordered:
+        coll_query = coll_query.order_by(icat.COLL_NAME)
+    for res in DEFAULT_POLICY.iterate(iter, coll_query, reconnect=session):
+        if res[icat.COLL_NAME] != coll_path:
+            yield res[icat.COLL_NAME]
+
+
+def _list_collection(session, coll_path: str) -> tuple[list[tuple[str, int, str]], list[str]]:
+    """List the data objects and subcollections directly in a single collection.
+
+    Since only one collection is listed, the memory use is bounded by the size of the
+    widest collection instead of the whole subtree.
+
+    Parameters
+    ----------
+    session:
+        Session to list the collection with.
+    coll_path:
+        Absolute path of the collection.
+
+    Returns
+    -------
+        The data objects as (name, size, checksum) and the names of the subcollections,
+        both sorted by name.
 
-    return [CachedIrodsPath(session, None, False, None, p) for r in coll_query.get_results()
-            for p in r.values()] + [CachedIrodsPath(session, None, False, None, coll.path)]
+    """
+    return _list_data_objects(session, coll_path), _list_subcollections(session, coll_path)
+
+
+def _list_data_objects(session, coll_path: str) -> list[tuple[str, int, str]]:
+    """List the data objects directly in a collection as (name, size, checksum), sorted."""
+    data_query = session.irods_session.query(DataObject.name, DataObject.size,
+                                             DataObject.checksum)
+    data_query = data_query.filter(Collection.name == coll_path)
+    data_objects: dict[str, tuple[str, int, str]] = {}
+    for res in DEFAULT_POLICY.iterate(iter, data_query, reconnect=session):
+        # Data objects with multiple replicas are returned multiple times.
+        name = res[DataObject.name]
+        data_objects.setdefault(name, (name, res[DataObject.size], res[DataObject.checksum]))
+    return sorted(data_objects.values())
+
+
+def _list_subcollections(session, coll_path: str) -> list[str]:
+    """List the names of the subcollections directly in a collection, sorted."""
+    coll_query = session.irods_session.query(Collection.name)
+    coll_query = coll_query.filter(Collection.parent_name == coll_path)
+    return sorted(PurePosixPath(res[Collection.name]).name
+                  for res in DEFAULT_POLICY.iterate(iter, coll_query, reconnect=session)
+                  if res[Collection.name] != coll_path)
@@ -0,0 +1,320 @@
+"""Compact storage of the planned transfers of an :class:`ibridges.executor.Operations` object.
+
+Plans for very large trees can contain millions of transfers. Instead of keeping a local
+Path and an IrodsPath object for every transfer, a :class:`TransferList` stores the
+transfers in columns: the parent directories of all paths are interned, and the sizes and
+flags are kept in arrays. The path objects are only created again while iterating.
+
+Above a memory limit, the transfers are moved to a temporary SQLite database on disk,
+so that the size of the plan is not limited by the available memory.
+"""
+
+from __future__ import annotations
+
+import sqlite3
+import sys
+import threading
+from array import array
+from pathlib import Path, PurePosixPath
+from typing import Iterable, Iterator, Optional, Union
+
+from ibridges.path import CachedIrodsPath, IrodsPath
+
+# Kind of IrodsPath that is stored for a transfer.
+_PLAIN = 0
+_CACHED = 1
+_CACHED_DATAOBJ = 2
+# Other objects, such as paths of other types, are kept as they are.
+_OBJECT = 3
+_CACHED_MISSING = 4
+
+# Estimate of the number of bytes per transfer, not counting the names.
+_ENTRY_OVERHEAD = 80
+
+_MEMORY_LIMIT: Optional[int] = None
+
+
+def set_plan_memory_limit(n_bytes: Optional[int]):
+    """Limit the memory used by the planned transfers of each new Operations object.
+
+    Plans that grow beyond the limit are moved to a temporary database on disk.
+
+    Parameters
+    ----------
+    n_bytes:
+        Approximate maximum number of bytes, None to keep all plans in memory.
+
+    Examples
+    --------
+    >>> set_plan_memory_limit(500*1024**2)  # Spill plans larger than about 500 MiB to disk.
+    >>> set_plan_memory_limit(None)  # Always keep plans in memory.
+
+    """
+    global _MEMORY_LIMIT  # pylint: disable=global-statement
+    if n_bytes is not None and n_bytes <= 0:
+        raise ValueError(f"Memory limit should be positive, not {n_bytes}.")
+    _MEMORY_LIMIT = n_bytes
+
+
+def get_plan_memory_limit() -> Optional[int]:
+    """Get the memory limit for the planned transfers, see :func:`set_plan_memory_limit`."""
+    return _MEMORY_LIMIT
+
+
+class _Interned():
+    """Table that maps strings or objects to small integers and back."""
+
+    __slots__ = ("_ids", "_values")
+
+    def __init__(self):
+        self._ids: dict = {}
+        self._values: list = []
+
+    def intern(self, value, key=None) -> int:
+        """Get the integer for a value, adding the value if it is new."""
+        key = value if key is None else key
+        value_id = self._ids.get(key)
+        if value_id is None:
+            value_id = len(self._values)
+            self._ids[key] = value_id
+            self._values.append(value)
+        return value_id
+
+    def __getitem__(self, value_id: int):
+        return self._values[value_id]
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+
+class TransferList():  # pylint: disable=too-many-instance-attributes
+    """Compact list of planned transfers between local paths and iRODS paths.
+
+    The list behaves like a list of (source, destination) tuples: transfers can be appended,
+    iterated over, indexed and sliced, and the list compares equal to a list with the same
+    tuples. Slices are returned as normal lists. For uploads the source is the local path,
+    for downloads the source is the iRODS path.
+
+    Parameters
+    ----------
+    irods_source:
+        Whether the iRODS paths are the sources (downloads) or destinations (uploads).
+    transfers:
+        Initial (source, destination) tuples.
+    memory_limit:
+        Approximate number of bytes above which the transfers are moved to a temporary
+        database on disk, by default the limit set with :func:`set_plan_memory_limit`.
+
+    Examples
+    --------
+    >>> uploads = TransferList(irods_source=False)
+    >>> uploads.append(Path("data.txt"), IrodsPath(session, "~/data.txt"))
+    >>> for lpath, ipath in uploads:
+    >>>     print(lpath, ipath)
+    >>> lpath, ipath = uploads[0]
+
+    """
+
+    # Like a list, the contents can change, so the list cannot be hashed.
+    __hash__ = None  # type: ignore[assignment]
+
+    __slots__ = ("irods_source", "memory_limit", "_prefixes", "_sessions", "_local_dir",
+                 "_local_name", "_irods_dir", "_irods_name", "_kind", "_size", "_checksum",
+                 "_session", "_n_bytes", "_spilled", "_n_spilled", "_objects", "_lock")
+
+    def __init__(self, irods_source: bool, transfers: Iterable[tuple] = (),
+                 memory_limit: Optional[int] = None):
+        """Create the list, with the initial transfers if given."""
+        self.irods_source = irods_source
+        self.memory_limit = _MEMORY_LIMIT if memory_limit is None else memory_limit
+        self._prefixes = _Interned()
+        self._sessions = _Interned()
+        self._objects: list = []
+        self._spilled: Optional[sqlite3.Connection] = None
+        self._n_spilled = 0
+        self._lock = threading.Lock()
+        self._clear_columns()
+        self.extend(transfers)
+
+    def _clear_columns(self):
+        self._local_dir = array("L")
+        self._local_name: list[str] = []
+        self._irods_dir = array("L")
+        self._irods_name: list[str] = []
+        self._kind = array("b")
+        self._size = array("q")
+        self._checksum: list[Optional[str]] = []
+        self._session = array("H")
+        self._n_bytes = 0
+
+    def append(self, src: Union[Path, IrodsPath], dest: Union[Path, IrodsPath]):
+        """Add a transfer to the end of the list.
+
+        Parameters
+        ----------
+        src:
+            Source of the transfer.
+        dest:
+            Destination of the transfer.
+
+        """
+        lpath, ipath = (dest, src) if self.irods_source else (src, dest)
+        lpath = Path(lpath)  # type: ignore
+        local_name = lpath.name
+        with self._lock:
+            self._local_dir.append(self._prefixes.intern(str(lpath.parent)))
+            self._local_name.append(local_name)
+            self._n_bytes += _ENTRY_OVERHEAD + sys.getsizeof(local_name)
+            if isinstance(ipath, IrodsPath):
+                self._append_ipath(ipath, local_name)
+            else:
+                self._irods_dir.append(len(self._objects))
+                self._irods_name.append("")
+                self._objects.append(ipath)
+                self._kind.append(_OBJECT)
+                self._size.append(-1)
+                self._checksum.append(None)
+                self._session.append(0)
+            if self.memory_limit is not None and self._n_bytes > self.memory_limit:
+                self._spill()
+
+    def _append_ipath(self, ipath: IrodsPath, local_name: str):
+        """Add the columns of an IrodsPath, needs the lock."""
+        irods_path = PurePosixPath(str(ipath))
+        irods_name = irods_path.name
+        if irods_name == local_name:
+            irods_name = local_name
+        else:
+            self._n_bytes += sys.getsizeof(irods_name)
+        kind, size, checksum = _PLAIN, -1, None
+        if isinstance(ipath, CachedIrodsPath):
+            # pylint: disable=protected-access
+            kind = {True: _CACHED_DATAOBJ, False: _CACHED,
+                    None: _CACHED_MISSING}[ipath._is_dataobj]
+            size = -1 if ipath._size is None else ipath._size
+            checksum = ipath._checksum
+            if checksum is not None:
+                self._n_bytes += sys.getsizeof(checksum)
+        self._irods_dir.append(self._prefixes.intern(str(irods_path.parent)))
+        self._irods_name.append(irods_name)
+        self._kind.append(kind)
+        self._size.append(size)
+        self._checksum.append(checksum)
+        self._session.append(self._sessions.intern(ipath.session, id(ipath.session)))
+
+    def extend(self, transfers: Iterable[tuple]):
+        """Add multiple (source, destination) tuples to the end of the list."""
+        for src, dest in transfers:
+            self.append(src, dest)
+
+    @property
+    def spilled(self) -> bool:
+        """Whether (part of) the transfers are stored on disk."""
+        return self._spilled is not None
+
+    def _rows(self) -> Iterator[tuple]:
+        return zip(self._local_dir, self._local_name, self._irods_dir, self._irods_name,
+                   self._kind, self._size, self._checksum, self._session)
+
+    def _spill(self):
+        """Move the transfers in memory to the database on disk, needs the lock."""
+        if self._spilled is None:
+            # An empty file name creates a temporary database that is removed when closed.
+            self._spilled = sqlite3.connect("", check_same_thread=False)
+            self._spilled.execute(
+                "CREATE TABLE transfers (local_dir INTEGER, local_name TEXT, irods_dir INTEGER, "
+                "irods_name TEXT, kind INTEGER, size INTEGER, checksum TEXT, session INTEGER)")
+        self._spilled.executemany("INSERT INTO transfers VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                  self._rows())
+        self._spilled.commit()
+        self._n_spilled += len(self._local_name)
+        self._clear_columns()
+
+    def _make_pair(self, row: tuple) -> tuple:
+        local_dir, local_name, irods_dir, irods_name, kind, size, checksum, session_id = row
+        lpath = Path(self._prefixes[local_dir], local_name)
+        ipath: IrodsPath
+        if kind == _OBJECT:
+            ipath = self._objects[irods_dir]
+            return (ipath, lpath) if self.irods_source else (lpath, ipath)
+        session = self._sessions[session_id]
+        irods_path = (self._prefixes[irods_dir], irods_name)
+        if kind == _PLAIN:
+            ipath = IrodsPath(session, *irods_path)
+        else:
+            is_dataobj = None if kind == _CACHED_MISSING else kind == _CACHED_DATAOBJ
+            ipath = CachedIrodsPath(session, None if size < 0 else size, is_dataobj,
+                                    checksum, *irods_path)
+        return (ipath, lpath) if self.irods_source else (lpath, ipath)
+
+    def __iter__(self) -> Iterator[tuple]:
+        """Iterate over the (source, destination) tuples in the order they were added."""
+        if self._spilled is not None:
+            with self._lock:
+                rows = self._spilled.execute("SELECT * FROM transfers ORDER BY rowid").fetchmany
+                n_rows = self._n_spilled
+            # Rows are fetched in batches, so that only part of the plan is in memory.
+            while n_rows > 0:
+                batch = rows(min(n_rows, 10000))
+                n_rows -= len(batch)
+                for row in batch:
+                    yield self._make_pair(row)
+        for row in self._rows():
+            yield self._make_pair(row)
+
+    def __getitem__(self, index: Union[int, slice]):
+        """Get the transfer at an index, or a list of transfers for a slice."""
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        n_transfers = len(self)
+        if index < 0:
+            index += n_transfers
+        if not 0 <= index < n_transfers:
+            raise IndexError("TransferList index out of range")
+        with self._lock:
+            if index < self._n_spilled:
+                assert self._spilled is not None
+                # Rows are only ever appended, so the row ids are consecutive from 1.
+                row = self._spilled.execute("SELECT * FROM transfers WHERE rowid = ?",
+                                            (index + 1,)).fetchone()
+            else:
+                i_mem = index - self._n_spilled
+                row = (self._local_dir[i_mem], self._local_name[i_mem], self._irods_dir[i_mem],
+                       self._irods_name[i_mem], self._kind[i_mem], self._size[i_mem],
+                       self._checksum[i_mem], self._session[i_mem])
+        return self._make_pair(row)
+
+    def __contains__(self, transfer) -> bool:
+        """Check whether a (source, destination) tuple is in the list."""
+        return any(pair == transfer for pair in self)
+
+    def __eq__(self, other) -> bool:
+        """Compare the transfers with another TransferList, list or tuple of transfers."""
+        if not isinstance(other, (TransferList, list, tuple)):
+            return NotImplemented
+        if len(self) != len(other):
+            return False
+        return all(pair == tuple(other_pair) for pair, other_pair in zip(self, other))
+
+    def __len__(self) -> int:
+        """Get the number of transfers."""
+        return self._n_spilled + len(self._local_name)
+
+    def __bool__(self) -> bool:
+        """Check whether there are any transfers."""
+        return len(self) > 0
+
+    def __repr__(self) -> str:
+        """Show the number of transfers."""
+        return (f"<TransferList: {len(self)} {'downloads' if self.irods_source else 'uploads'}"
+                f"{', spilled to disk' if self.spilled else ''}>")
+
+    def clear(self):
+        """Remove all transfers."""
+        with self._lock:
+            if self._spilled is not None:
+                self._spilled.close()
+                self._spilled = None
+            self._n_spilled = 0
+            self._objects = []
+            self._clear_columns()
@@ -0,0 +1,379 @@
+"""Pool of sessions for multi-threaded and multi-process workloads.
+
+A :class:`SessionPool` can be used instead of a :class:`ibridges.session.Session` by the
+transfer, walk and search functions. Workers borrow their own session from the pool, so
+that they do not share connections, while the credentials are read only once.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional, Union
+
+from ibridges.interactive import DEFAULT_IENV_PATH
+from ibridges.session import Session
+
+
+class SessionPool():  # pylint: disable=too-many-instance-attributes
+    """Thread-safe pool of sessions with the same credentials.
+
+    Sessions are created from the same iRODS environment and password (or cached password
+    in .irodsA) as :class:`ibridges.session.Session`. Only the first session authenticates
+    with these, the other sessions are cloned from it.
+
+    Sessions are borrowed with :meth:`session`. Within that context, the pool also behaves
+    as the borrowed session for the current thread, so that paths created with the pool,
+    e.g. :code:`IrodsPath(pool, "~/data")`, use the session of the thread that uses them.
+    Outside of a borrowed session, the pool behaves as a single shared session.
+
+    Idle sessions are checked with a simple query before they are handed out again, and
+    closed when they have not been used for some time. After the process is forked, the
+    sessions of the parent process are abandoned and new sessions are created, so the pool
+    can also be passed to other processes.
+
+    Parameters
+    ----------
+    irods_env:
+        iRODS environment file, or a dictionary containing its contents,
+        by default ~/.irods/irods_environment.json.
+    password:
+        Password to authenticate with, by default the cached password is used.
+    irods_home:
+        Override the home directory of irods.
+    max_size:
+        Maximum number of sessions that can be borrowed at the same time, by default 8.
+    idle_timeout:
+        Number of seconds after which idle sessions are closed, by default 300.
+    health_check_interval:
+        Idle sessions that have not been used for this number of seconds are checked before
+        they are handed out, by default 30.
+
+    Examples
+    --------
+    >>> with SessionPool(max_size=16) as pool:
+    >>>     upload(pool, local_path, IrodsPath(pool, "~/data"), max_workers=16)
+    >>>     with pool.session() as session:
+    >>>         print(session.get_user_info())
+
+    """
+
+    def __init__(self, irods_env: Union[dict, str, Path] = DEFAULT_IENV_PATH,  # pylint: disable=too-many-arguments
+                 password: Optional[str] = None, irods_home: Optional[str] = None,
+                 max_size: int = 8, idle_timeout: float = 300.0,
+                 health_check_interval: float = 30.0):
+        """Connect the shared session to check the credentials."""
+        if max_size < 1:
+            raise ValueError(f"Maximum size of the pool should be at least 1, not {max_size}.")
+        self._irods_env = irods_env
+        self._password = password
+        self._irods_home = irods_home
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self._reset()
+        self._shared_session()
+
+    def _reset(self) -> None:
+        self._pid = os.getpid()
+        self._cond = threading.Condition()
+        self._local = threading.local()
+        self._shared: Optional[Session] = None
+        self._idle: list[tuple[Session, float]] = []
+        self._n_borrowed = 0
+        self._closed = False
+
+    def __getstate__(self):
+        """Only pickle the settings, the sessions are created again by the other process."""
+        return {key: value for key, value in self.__dict__.items()
+                if key in ("_irods_env", "_password", "_irods_home", "max_size", "idle_timeout",
+                           "health_check_interval")}
+
+    def __setstate__(self, state):
+        """Create an empty pool from the settings."""
+        self.__dict__.update(state)
+        self._reset()
+
+    def __enter__(self):
+        """Use the pool as a context manager."""
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_trace_back):
+        """Close all sessions of the pool."""
+        self.close()
+
+    def _check_fork(self):
+        if self._pid == os.getpid():
+            return
+        # The connections belong to the parent process, so they should not be used or closed.
+        inherited = self._idle
+        shared = self._shared
+        self._reset()
+        for session in [sess for sess, _ in inherited] + [shared]:
+            _abandon(session)
+
+    def _shared_session(self) -> Session:
+        self._check_fork()
+        with self._cond:
+            if self._closed:
+                raise ValueError("Cannot use a session pool that is closed.")
+            if self._shared is None:
+                # The session modifies the environment dictionary.
+                env = self._irods_env
+                self._shared = Session(dict(env) if isinstance(env, dict) else env,
+                                       password=self._password,
+                                       irods_home=self._irods_home)
+            return self._shared
+
+    def acquire(self, timeout: Optional[float] = None) -> Session:
+        """Take a session from the pool, which should be returned with :meth:`release`.
+
+        Parameters
+        ----------
+        timeout:
+            Maximum number of seconds to wait for a session, by default wait indefinitely.
+
+        Raises
+        ------
+        TimeoutError:
+            If no session became available within the timeout.
+
+        Returns
+        -------
+            A session that is not used by other workers.
+
+        """
+        shared = self._shared_session()
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._closed or self._n_borrowed < self.max_size,
+                                       timeout):
+                raise TimeoutError(f"No session available within {timeout} seconds.")
+            if self._closed:
+                raise ValueError("Cannot use a session pool that is closed.")
+            self._n_borrowed += 1
+            self._expire_idle()
+            idle = self._idle.pop() if self._idle else None
+        try:
+            if idle is not None:
+                session, last_used = idle
+                if time.monotonic() - last_used <= self.health_check_interval or _healthy(session):
+                    return session
+                _close(session)
+            return shared.clone()
+        except BaseException:
+            with self._cond:
+                self._n_borrowed -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, session: Session):
+        """Return a session to the pool.
+
+        Parameters
+        ----------
+        session:
+            Session that was obtained with :meth:`acquire`.
+
+        """
+        if self._pid != os.getpid():
+            return
+        with self._cond:
+            self._n_borrowed -= 1
+            if self._closed:
+                _close(session)
+            else:
+                self._idle.append((session, time.monotonic()))
+                self._expire_idle()
+            self._cond.notify()
+
+    @contextmanager
+    def session(self, timeout: Optional[float] = None):
+        """Borrow a session for the current thread.
+
+        Within the context, the pool behaves as the borrowed session in this thread.
+
+        Parameters
+        ----------
+        timeout:
+            Maximum number of seconds to wait for a session, by default wait indefinitely.
+
+        Examples
+        --------
+        >>> with pool.session() as session:
+        >>>     IrodsPath(session, "~/data").walk()
+
+        """
+        session = self.acquire(timeout)
+        stack = self._stack()
+        stack.append(session)
+        try:
+            yield session
+        finally:
+            stack.pop()
+            self.release(session)
+
+    def _stack(self) -> list:
+        self._check_fork()
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def current(self) -> Session:
+        """Get the session that is used by the current thread.
+
+        Returns
+        -------
+            The borrowed session of the current thread, or the shared session if
+            the thread has not borrowed any.
+
+        """
+        stack = self._stack()
+        if stack:
+            return stack[-1]
+        return self._shared_session()
+
+    def _expire_idle(self):
+        """Close idle sessions that have not been used for a while, needs the lock."""
+        now = time.monotonic()
+        expired = [sess for sess, last_used in self._idle if now - last_used > self.idle_timeout]
+        self._idle = [(sess, last_used) for sess, last_used in self._idle
+                      if now - last_used <= self.idle_timeout]
+        for session in expired:
+            _close(session)
+
+    @property
+    def size(self) -> int:
+        """Number of sessions that are borrowed or idle, not counting the shared one."""
+        with self._cond:
+            return self._n_borrowed + len(self._idle)
+
+    def close(self):
+        """Close all idle sessions and the shared session.
+
+        Borrowed sessions are closed when they are returned.
+        """
+        self._check_fork()
+        with self._cond:
+            self._closed = True
+            for session, _ in self._idle:
+                _close(session)
+            self._idle = []
+            if self._shared is not None:
+                _close(self._shared)
+                self._shared = None
+            self._cond.notify_all()
+
+    @property
+    def irods_session(self):
+        """Python-irodsclient session of the current thread."""
+        return self.current().irods_session
+
+    @irods_session.setter
+    def irods_session(self, value):
+        self.current().irods_session = value
+
+    def __getattr__(self, item):
+        """Pass everything else to the session of the current thread."""
+        if item.startswith("_"):
+            raise AttributeError(item)
+        return getattr(self.current(), item)
+
+
+@contextmanager
+def borrowed(session):
+    """Borrow a session for the current thread if a pool is given.
+
+    Parameters
+    ----------
+    session:
+        Either a :class:`ibridges.session.Session` or a :class:`SessionPool`.
+
+    Returns
+    -------
+        Context in which the session, or the pool, can be used by the current thread.
+
+    """
+    if isinstance(session, SessionPool):
+        with session.session():
+            yield session
+    else:
+        yield session
+
+
+@contextmanager
+def worker_sessions(session):
+    """Give each worker thread its own session.
+
+    With a :class:`SessionPool`, the workers borrow sessions from the pool. Otherwise
+    the session is cloned once for each worker thread, and the clones are closed when
+    the context exits.
+
+    Parameters
+    ----------
+    session:
+        Either a :class:`ibridges.session.Session` or a :class:`SessionPool`.
+
+    Returns
+    -------
+        Context with a function that calls :code:`func(worker_session, *args)` with the
+        session of the current thread.
+
+    Examples
+    --------
+    >>> with worker_sessions(session) as run, ThreadPoolExecutor(4) as executor:
+    >>>     futures = [executor.submit(run, IrodsPath.create_collection, path) for path in paths]
+
+    """
+    local = threading.local()
+    clones: list[Session] = []
+    lock = threading.Lock()
+
+    def _run(func, *args, **kwargs):
+        if isinstance(session, SessionPool):
+            with session.session():
+                return func(session, *args, **kwargs)
+        clone = getattr(local, "session", None)
+        if clone is None:
+            clone = local.session = session.clone()
+            with lock:
+                clones.append(clone)
+        return func(clone, *args, **kwargs)
+
+    try:
+        yield _run
+    finally:
+        with lock:
+            for clone in clones:
+                _close(clone)
+
+
+def _healthy(session: Session) -> bool:
+    try:
+        session.get_user_info(refresh=True)
+        return True
+    except Exception:  # pylint: disable=broad-exception-caught
+        return False
+
+
+def _close(session: Session):
+    try:
+        session.close()
+    except Exception:  # pylint: disable=broad-exception-caught
+        pass
+
+
+def _abandon(session: Optional[Session]):
+    """Close the sockets of a session of the parent process without disconnecting."""
+    if session is None or session.irods_session is None:
+        return
+    pool = session.irods_session.pool
+    if pool is not None:
+        for conn in pool.active | pool.idle:
+            if conn.socket is not None:
+                conn.socket.close()
+            conn.socket = None
+    session.irods_session.pool = None
+    session.irods_session = None
@@ -0,0 +1,232 @@
+"""Retrying operations that fail because of transient server or network errors.
+
+Long running transfers and queries can fail because a connection is dropped or the
+server hiccups. Such errors are retried with an exponential backoff with jitter, after
+checking that the session can still reach the server. Other errors, such as missing
+permissions, are raised immediately.
+"""
+
+from __future__ import annotations
+
+import logging
+import random
+import socket
+import threading
+import time
+from typing import Callable, Iterator, Optional
+
+import irods.exception
+
+from ibridges.telemetry import count_retry
+
+TRANSIENT_ERRORS: tuple = (
+    irods.exception.NetworkException,
+    irods.exception.SYS_HEADER_READ_LEN_ERR,
+    irods.exception.CAT_CONNECT_ERR,
+    ConnectionError,
+    TimeoutError,
+    socket.timeout,
+)
+
+_RECONNECT_LOCK = threading.Lock()
+
+
+class RetryPolicy():
+    """Policy to retry operations that failed with a transient error.
+
+    The delay before each retry is drawn uniformly between zero and an exponentially
+    increasing maximum ('full jitter'), so that many workers that failed at the same time
+    do not all retry at the same moment.
+
+    Parameters
+    ----------
+    max_attempts:
+        Maximum number of attempts, including the first one. Use 1 to disable retrying.
+    base_delay:
+        Maximum delay before the first retry in seconds, which doubles for every retry.
+    max_delay:
+        Upper limit of the delay in seconds.
+    transient_errors:
+        Exception types that are considered transient.
+
+    Examples
+    --------
+    >>> policy = RetryPolicy(max_attempts=3)
+    >>> policy.call(IrodsPath.create_collection, session, "~/new_coll", reconnect=session)
+
+    """
+
+    def __init__(self, max_attempts: int = 5, base_delay: float = 0.5, max_delay: float = 30.0,
+                 transient_errors: tuple = TRANSIENT_ERRORS):
+        """Set the parameters of the policy."""
+        if max_attempts < 1:
+            raise ValueError(f"Number of attempts should be at least 1, not {max_attempts}.")
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.transient_errors = transient_errors
+
+    def is_transient(self, error: BaseException) -> bool:
+        """Check whether an error, or the error that caused it, is transient.
+
+        Parameters
+        ----------
+        error:
+            Error to be checked.
+
+        Returns
+        -------
+            True if the operation can be retried.
+
+        """
+        cur_error: Optional[BaseException] = error
+        while cur_error is not None:
+            if isinstance(cur_error, self.transient_errors):
+                return True
+            cur_error = cur_error.__cause__
+        return False
+
+    def delay(self, attempt: int) -> float:
+        """Get the delay in seconds before the next attempt.
+
+        Parameters
+        ----------
+        attempt:
+            Number of attempts that have failed so far.
+
+        Returns
+        -------
+            Random delay in seconds.
+
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**(attempt - 1)))
+
+    def call(self, func: Callable, *args, reconnect=None, done_errors: tuple = (), **kwargs):
+        """Call a function, retrying it if it fails with a transient error.
+
+        Parameters
+        ----------
+        func:
+            Function to call.
+        args:
+            Positional arguments for the function.
+        reconnect:
+            Session that is reconnected if it cannot reach the server anymore
+            before retrying, by default None.
+        done_errors:
+            Errors that show that an earlier attempt was already applied by the server,
+            by default none. For changes that are not idempotent, such as adding metadata,
+            the server can apply the change while the answer is lost. A retry then fails
+            with one of these errors, which is treated as success. On the first attempt
+            they are raised as usual.
+        kwargs:
+            Keyword arguments for the function.
+
+        Returns
+        -------
+            The return value of the function, or None if a retry failed with one of
+            the done_errors.
+
+        """
+        attempt = 1
+        while True:
+            try:
+                return func(*args, **kwargs)
+            except done_errors:
+                if attempt == 1:
+                    raise
+                return None
+            except Exception as error:  # pylint: disable=broad-exception-caught
+                self._check_retry(error, attempt)
+            self._wait(attempt, reconnect)
+            attempt += 1
+
+    def iterate(self, func: Callable, *args, reconnect=None, **kwargs) -> Iterator:
+        """Iterate over the results of a function, retrying it if it fails with a transient error.
+
+        The items are yielded as soon as they are available. If the iteration fails halfway,
+        the function is called again and the items that were already yielded are skipped.
+        This assumes that the function returns the same items in the same order.
+
+        Parameters
+        ----------
+        func:
+            Function that returns an iterable, for example :code:`iter` for a query.
+        args:
+            Positional arguments for the function.
+        reconnect:
+            Session that is reconnected if it cannot reach the server anymore
+            before retrying, by default None.
+        kwargs:
+            Keyword arguments for the function.
+
+        Returns
+        -------
+            Generator that yields the items.
+
+        Examples
+        --------
+        >>> for row in DEFAULT_POLICY.iterate(iter, query, reconnect=session):
+        >>>     print(row)
+
+        """
+        n_yielded = 0
+        attempt = 1
+        while True:
+            try:
+                for i_item, item in enumerate(func(*args, **kwargs)):
+                    if i_item >= n_yielded:
+                        n_yielded += 1
+                        yield item
+                return
+            except Exception as error:  # pylint: disable=broad-exception-caught
+                self._check_retry(error, attempt)
+            self._wait(attempt, reconnect)
+            attempt += 1
+
+    def _check_retry(self, error: Exception, attempt: int):
+        """Raise the error again if it should not be retried."""
+        if attempt >= self.max_attempts or not self.is_transient(error):
+            raise error
+        logging.info("Transient error, retrying (attempt %d/%d): %r",
+                     attempt + 1, self.max_attempts, error)
+
+    def _wait(self, attempt: int, reconnect):
+        count_retry()
+        time.sleep(self.delay(attempt))
+        if reconnect is not None:
+            reconnect_session(reconnect)
+
+
+DEFAULT_POLICY = RetryPolicy()
+NO_RETRY = RetryPolicy(max_attempts=1)
+
+
+def reconnect_session(session):
+    """Reconnect a session if it cannot reach the iRODS server anymore.
+
+    The python-irodsclient replaces broken connections in its pool itself, so the
+    session is only reconnected when a simple query fails.
+
+    Parameters
+    ----------
+    session:
+        The ibridges Session to check.
+
+    """
+    with _RECONNECT_LOCK:
+        try:
+            session.get_user_info(refresh=True)
+            return
+        except Exception:  # pylint: disable=broad-exception-caught
+            pass
+        try:
+            # Release the connections of the old session, which cannot reach the server.
+            session.irods_session.cleanup()
+        except Exception:  # pylint: disable=broad-exception-caught
+            pass
+        try:
+            session.irods_session = session.connect()
+        except Exception as error:  # pylint: disable=broad-exception-caught
+            # The next attempt will fail and report the problem.
+            logging.info("Reconnecting to the iRODS server failed: %r", error)
@@ -7,6 +7,8 @@ from typing import Optional, Union
 
 from ibridges import icat_columns as icat
 from ibridges.path import IrodsPath
+from ibridges.pool import borrowed
+from ibridges.retry import DEFAULT_POLICY
 from ibridges.session import Session
 
 META_COLS = {
@@ -53,7 +55,7 @@ def search_data(  # pylint: disable=too-many-branches
     Parameters
     ----------
     session:
-        Session to search with.
+        Session or :class:`ibridges.pool.SessionPool` to search with.
     path:
         IrodsPath to the collection to search into, collection itself will not be considered.
         By default the home collection is searched.
@@ -141,40 +143,43 @@ def search_data(  # pylint: disable=too-many-branches
     if isinstance(metadata, MetaSearch):
         metadata = [metadata]
 
-    # iRODS queries do not know the 'or' operator, so we need three searches
-    # One for the collection, and two for the data
-    # one data search in case path is a collection path and we want to retrieve all data there
-    # one in case the path is or ends with a file name
-    queries = []
-    if item_type != "data_object" and checksum is None:
-        # create the query for collections; we only want to return the collection name
-        coll_query = session.irods_session.query(icat.COLL_NAME)
-        coll_query = coll_query.filter(icat.LIKE(icat.COLL_NAME, _postfix_wildcard(path)))
-        queries.append((coll_query, "collection"))
-    if item_type != "collection":
-        # create the query for data objects; we need the collection name, the data name and checksum
-        data_query = session.irods_session.query(icat.COLL_NAME, icat.DATA_NAME, icat.DATA_CHECKSUM)
-        data_query = data_query.filter(icat.LIKE(icat.COLL_NAME, _postfix_wildcard(path)))
-        queries.append((data_query, "data_object"))
-
-        data_name_query = session.irods_session.query(icat.COLL_NAME, icat.DATA_NAME,
-                                                    icat.DATA_CHECKSUM)
-        data_name_query.filter(icat.LIKE(icat.COLL_NAME, f"{path}"))
-        queries.append((data_name_query, "data_object"))
-
-    if path_pattern is not None:
-        _path_filter(path_pattern, queries)
-
-
-    for mf in metadata:
-        _meta_filter(mf, queries)
-
-    if checksum is not None:
-        _checksum_filter(checksum, queries)
-
-    query_results = []
-    for q in queries:
-        query_results.extend(list(q[0]))
+    with borrowed(session):
+        # iRODS queries do not know the 'or' operator, so we need three searches
+        # One for the collection, and two for the data
+        # one data search in case path is a collection path and we want to retrieve all data there
+        # one in case the path is or ends with a file name
+        queries = []
+        if item_type != "data_object" and checksum is None:
+            # create the query for collections; we only want to return the collection name
+            coll_query = session.irods_session.query(icat.COLL_NAME)
+            coll_query = coll_query.filter(icat.LIKE(icat.COLL_NAME, _postfix_wildcard(path)))
+            queries.append((coll_query, "collection"))
+        if item_type != "collection":
+            # create the query for data objects; we need the collection name, the data name
+            # and checksum
+            data_query = session.irods_session.query(icat.COLL_NAME, icat.DATA_NAME,
+                                                     icat.DATA_CHECKSUM)
+            data_query = data_query.filter(icat.LIKE(icat.COLL_NAME, _postfix_wildcard(path)))
+            queries.append((data_query, "data_object"))
+
+            data_name_query = session.irods_session.query(icat.COLL_NAME, icat.DATA_NAME,
+                                                          icat.DATA_CHECKSUM)
+            data_name_query.filter(icat.LIKE(icat.COLL_NAME, f"{path}"))
+            queries.append((data_name_query, "data_object"))
+
+        if path_pattern is not None:
+            _path_filter(path_pattern, queries)
+
+
+        for mf in metadata:
+            _meta_filter(mf, queries)
+
+        if checksum is not None:
+            _checksum_filter(checksum, queries)
+
+        query_results = []
+        for q in queries:
+            query_results.extend(DEFAULT_POLICY.call(list, q[0], reconnect=session))
 
     # gather results, data_query and data_name_query can contain the same results
     results = [
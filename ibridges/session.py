@@ -2,8 +2,12 @@
 
 from __future__ import annotations
 
+import copy
 import json
+import os
 import socket
+import threading
+import time
 import warnings
 from pathlib import Path
 from typing import Optional, Union
@@ -19,11 +23,20 @@ from irods.exception import (
 from irods.session import NonAnonymousLoginWithoutPassword, iRODSSession
 
 from ibridges import icat_columns as icat
+from ibridges.cache import StatCache
 
 APP_NAME = "ibridges"
+CAPABILITY_CACHE_FP = Path.home() / ".ibridges" / "capabilities.json"
+CAPABILITY_CACHE_TTL = 24 * 3600
 
+# Server version and user information per server and user, shared by all sessions of the process.
+_SERVER_INFO: dict[tuple, dict] = {}
+_SERVER_INFO_LOCK = threading.Lock()
+_ENV_ATTRIBUTES = {"host": "irods_host", "port": "irods_port", "username": "irods_user_name",
+                   "zone": "irods_zone_name"}
 
-class Session:
+
+class Session:  # pylint: disable=too-many-instance-attributes
     """Session to connect and perform operations on the iRODS server.
 
     When the session is initialized, you are connected succesfully to the iRODS server.
@@ -47,6 +60,18 @@ class Session:
         Override the home directory of irods. Otherwise attempt to retrive the value
         from the irods environment dictionary. If it is not there either, then use
         /{zone}/home/{username}.
+    lazy:
+        If True, only connect to the iRODS server when the connection is first needed,
+        instead of during the initialization. Errors in the credentials are then also
+        raised at that moment.
+    cache_capabilities:
+        If True, the server version and user information are stored on disk in
+        ~/.ibridges/capabilities.json, so that other processes do not need to retrieve them.
+    stat_cache_ttl:
+        Number of seconds for which the existence, size and checksum of paths are cached,
+        for example 10. By default None, which always asks the server, since changes by
+        other clients would otherwise be missed until the entries expire. The cache is
+        available as the :attr:`stat_cache` attribute, see :class:`ibridges.cache.StatCache`.
 
     Raises
     ------
@@ -65,6 +90,7 @@ class Session:
     >>> with Session("irods_environment.json") as session:
     >>>     # Do operations with the session here.
     >>>     # The session will be automatically closed on finish/error.
+    >>> session = Session("irods_environment.json", lazy=True)  # Connects on first use.
 
     """  # noqa: D403"""
 
@@ -73,6 +99,9 @@ class Session:
         irods_env: Union[dict, str, Path],
         password: Optional[str] = None,
         irods_home: Optional[str] = None,
+        lazy: bool = False,
+        cache_capabilities: bool = False,
+        stat_cache_ttl: Optional[float] = None,
     ):
         """Authenticate and connect to the iRODS server."""
         irods_env_path = None
@@ -95,7 +124,16 @@ class Session:
         self._password = password
         self._irods_env: dict = irods_env
         self._irods_env_path = irods_env_path
-        self.irods_session = self.connect()
+        self._irods_session: Optional[iRODSSession] = None
+        self._connect_on_use = lazy
+        self._connect_lock = threading.Lock()
+        self.cache_capabilities = cache_capabilities
+        # Clones share the cache, since they are connected to the same server as the same user.
+        self.stat_cache = None if stat_cache_ttl is None else StatCache(ttl=stat_cache_ttl)
+        if cache_capabilities:
+            _load_capabilities(self._server_key)
+        if not lazy:
+            self.irods_session = self.connect()
         if irods_home is not None:
             self.home = irods_home
         if "irods_home" not in self._irods_env:
@@ -103,8 +141,8 @@ class Session:
 
     def __enter__(self):
         """Connect to the iRODS server if not already connected."""
-        if not self.has_valid_irods_session():
-            self.connect()
+        if not self._connect_on_use and not self.has_valid_irods_session():
+            self.irods_session = self.connect()
         return self
 
     def __exit__(self, exc_type, exc_value, exc_trace_back):
@@ -135,17 +173,46 @@ class Session:
     def home(self, value):
         self._irods_env["irods_home"] = value
 
+    @property
+    def irods_session(self) -> iRODSSession:
+        """Python-irodsclient session, which is connected on first use for lazy sessions."""
+        if self._irods_session is None and self._connect_on_use:
+            with self._connect_lock:
+                if self._connect_on_use:
+                    self._irods_session = self.connect()
+                    self._connect_on_use = False
+        return self._irods_session
+
+    @irods_session.setter
+    def irods_session(self, value: Optional[iRODSSession]):
+        self._connect_on_use = False
+        self._irods_session = value
+
+    @property
+    def _server_key(self) -> tuple:
+        """Identify the server and user, to cache information about them."""
+        return tuple(self._irods_env.get(key) for key in _ENV_ATTRIBUTES.values())
+
     # Authentication workflow methods
     def has_valid_irods_session(self) -> bool:
         """Check if the iRODS session is valid.
 
+        This always contacts the server, since the cached server information does not
+        show whether the connection still works.
+
         Returns
         -------
         bool:
             True if the session is valid, False otherwise.
 
         """
-        return self.irods_session is not None and self.server_version != ()
+        if self.irods_session is None:
+            return False
+        try:
+            self.get_user_info(refresh=True)
+        except Exception:  # pylint: disable=broad-exception-caught
+            return False
+        return True
 
     @classmethod
     def network_check(cls, hostname: str, port: int) -> bool:
@@ -215,16 +282,35 @@ class Session:
         # print("Auth with password")
         return self.authenticate_using_password()
 
+    def clone(self) -> Session:
+        """Create a new session with the same credentials and settings.
+
+        The new session has its own connections to the iRODS server, but it does not
+        need to read the environment and authentication files again. Only the cache of
+        paths, see :attr:`stat_cache`, is shared with this session.
+
+        Returns
+        -------
+            A new session, which should be closed separately.
+
+        """
+        # pylint: disable=protected-access
+        other = copy.copy(self)
+        other._irods_env = copy.deepcopy(self._irods_env)
+        other._connect_lock = threading.Lock()
+        other.irods_session = self.irods_session.clone()
+        return other
+
     def close(self):
         """Disconnect the iRODS session.
 
         This closes the connection, and makes the session available for
         reconnection with the :meth:`connect` method.
         """
-        if self.irods_session is not None:
-            self.irods_session.do_configure = {}
-            self.irods_session.cleanup()
-            self.irods_session = None
+        if self._irods_session is not None:
+            self._irods_session.do_configure = {}
+            self._irods_session.cleanup()
+        self.irods_session = None
 
     def authenticate_using_password(self) -> iRODSSession:
         """Authenticate with the iRODS server using a password.
@@ -299,7 +385,11 @@ class Session:
 
     def __getattr__(self, item):
         """Pass through a few attributes from irods_session."""
-        if item in ["host", "port", "username", "zone"]:
+        if item in _ENV_ATTRIBUTES:
+            if self._irods_session is None and self._connect_on_use:
+                value = self._irods_env.get(_ENV_ATTRIBUTES[item])
+                if value is not None:
+                    return value
             if self.irods_session is None:
                 raise AttributeError("Need a valid iRODS session to get '{item}'.")
             return getattr(self.irods_session, item)
@@ -309,24 +399,49 @@ class Session:
     def server_version(self) -> tuple:
         """Retrieve version of the iRODS server.
 
+        The version is retrieved once per process for each server.
+
         Returns
         -------
             Server version: (major, minor, patch).
 
         """
+        server_info = _SERVER_INFO.get(self._server_key, {})
+        if "server_version" in server_info:
+            return tuple(server_info["server_version"])
         try:
-            return self.irods_session.server_version
+            version = tuple(self.irods_session.server_version)
         except Exception as e:
             raise _translate_irods_error(e) from e
+        if version:
+            self._store_server_info("server_version", version)
+        return version
 
-    def get_user_info(self) -> tuple[list, list]:
+    def get_user_info(self, refresh: bool = False) -> tuple[list, list]:
         """Query for user type and groups.
 
+        The result is cached per process, use refresh to query the server again.
+
+        Parameters
+        ----------
+        refresh:
+            If True, the cached information is ignored. Since this always contacts the server,
+            it can also be used to check the connection.
+
         Returns
         -------
             Tuple containing (iRODS user type names, iRODS group names)
 
         """
+        server_info = _SERVER_INFO.get(self._server_key, {})
+        if "user_info" in server_info and not refresh:
+            user_type, user_groups = server_info["user_info"]
+            return user_type, list(user_groups)
+        user_info = self._query_user_info()
+        self._store_server_info("user_info", user_info)
+        return user_info
+
+    def _query_user_info(self) -> tuple[list, list]:
         query = self.irods_session.query(icat.USER_TYPE).filter(
             icat.LIKE(icat.USER_NAME, self.username)
         )
@@ -337,6 +452,12 @@ class Session:
         user_groups = [list(result.values())[0] for result in query.get_results()]
         return user_type, user_groups
 
+    def _store_server_info(self, item: str, value):
+        with _SERVER_INFO_LOCK:
+            _SERVER_INFO.setdefault(self._server_key, {})[item] = value
+        if self.cache_capabilities:
+            _save_capabilities(self._server_key)
+
 
 class LoginError(AttributeError):
     """Error indicating a failure to log into the iRODS server due to the configuration."""
@@ -346,6 +467,44 @@ class PasswordError(ValueError):
     """Error indicating failure to log into the iRODS server due to wrong or outdated password."""
 
 
+def _cache_id(server_key: tuple) -> str:
+    host, port, user, zone = server_key
+    return f"{user}#{zone}@{host}:{port}"
+
+
+def _load_capabilities(server_key: tuple):
+    """Read the information of a server from the on-disk cache, if it is recent enough."""
+    try:
+        with open(CAPABILITY_CACHE_FP, "r", encoding="utf-8") as handle:
+            entry = json.load(handle)[_cache_id(server_key)]
+        if time.time() - entry["time"] > CAPABILITY_CACHE_TTL:
+            return
+        server_info = {key: value for key, value in entry.items() if key != "time"}
+    except (OSError, ValueError, KeyError, TypeError):
+        return
+    with _SERVER_INFO_LOCK:
+        _SERVER_INFO.setdefault(server_key, {}).update(server_info)
+
+
+def _save_capabilities(server_key: tuple):
+    """Write the information of a server to the on-disk cache."""
+    try:
+        with open(CAPABILITY_CACHE_FP, "r", encoding="utf-8") as handle:
+            cache = json.load(handle)
+    except (OSError, ValueError):
+        cache = {}
+    with _SERVER_INFO_LOCK:
+        cache[_cache_id(server_key)] = dict(_SERVER_INFO.get(server_key, {}), time=time.time())
+    try:
+        CAPABILITY_CACHE_FP.parent.mkdir(parents=True, exist_ok=True)
+        tmp_fp = CAPABILITY_CACHE_FP.with_name(f"{CAPABILITY_CACHE_FP.name}.{os.getpid()}.tmp")
+        with open(tmp_fp, "w", encoding="utf-8") as handle:
+            json.dump(cache, handle)
+        tmp_fp.replace(CAPABILITY_CACHE_FP)
+    except OSError as error:
+        warnings.warn(f"Cannot write the capability cache {CAPABILITY_CACHE_FP}: {error}")
+
+
 def _translate_irods_error(exc) -> Exception:  # pylint: disable=too-many-return-statements
     if isinstance(exc, NetworkException):
         if any((a.startswith("Client-Server negotiation failure") for a in exc.args)):
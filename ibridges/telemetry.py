@@ -0,0 +1,259 @@
+"""Telemetry of the transfers done by an :class:`ibridges.executor.Operations` object.
+
+For every transfer the time spent waiting in the queue, transferring and computing
+checksums is recorded, together with the number of bytes, retries and the error if
+the transfer failed. The :class:`TelemetrySummary` aggregates these records, which
+helps to find out whether the catalog, the disk or the network is the bottleneck.
+"""
+
+from __future__ import annotations
+
+import csv
+import json
+import math
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional, Union
+
+TransferRecord = namedtuple("TransferRecord", [
+    "op", "src", "dest", "n_bytes", "queue_wait", "transfer_time", "checksum_time",
+    "retries", "error"])
+
+# Timings that are reported from inside the transfer functions, per thread.
+_CURRENT = threading.local()
+
+
+@contextmanager
+def timed(category: str):
+    """Add the time spent in the context to the transfer of the current thread.
+
+    This is used inside the transfer functions, for example to measure the time it
+    takes to compute checksums. Outside of a measured transfer this does nothing.
+
+    Parameters
+    ----------
+    category:
+        Category of the time, for example 'checksum'.
+
+    Examples
+    --------
+    >>> with timed("checksum"):
+    >>>     calc_checksum(local_path)
+
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings = getattr(_CURRENT, "timings", None)
+        if timings is not None:
+            timings[category] = timings.get(category, 0.0) + time.perf_counter() - start
+
+
+def count_retry():
+    """Count a retry for the transfer of the current thread."""
+    timings = getattr(_CURRENT, "timings", None)
+    if timings is not None:
+        timings["retries"] = timings.get("retries", 0) + 1
+
+
+class TransferTelemetry():
+    """Thread-safe collection of the records of all transfers.
+
+    Examples
+    --------
+    >>> telemetry = TransferTelemetry()
+    >>> with telemetry.measure("upload", lpath, ipath, lpath.stat().st_size, queued):
+    >>>     _obj_put(session, lpath, ipath)
+    >>> print(telemetry.summary())
+
+    """
+
+    def __init__(self):
+        """Start without any records."""
+        self.records: list[TransferRecord] = []
+        self.start_time: Optional[float] = None
+        self.end_time: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Mark the start of the execution, if it was not started already."""
+        if self.start_time is None:
+            self.start_time = time.perf_counter()
+
+    def stop(self):
+        """Mark the end of the execution."""
+        self.end_time = time.perf_counter()
+
+    @contextmanager
+    def measure(self, op: str, src, dest, n_bytes: int, queued: Optional[float] = None):
+        """Measure a single transfer that is done within the context.
+
+        Parameters
+        ----------
+        op:
+            Type of transfer, e.g. 'upload' or 'download'.
+        src:
+            Source of the transfer.
+        dest:
+            Destination of the transfer.
+        n_bytes:
+            Number of bytes to be transferred.
+        queued:
+            Value of time.perf_counter() when the transfer was queued, by default the
+            transfer was not waiting.
+
+        """
+        start = time.perf_counter()
+        _CURRENT.timings = {}
+        error: Optional[BaseException] = None
+        try:
+            yield
+        except BaseException as exc:
+            error = exc
+            raise
+        finally:
+            timings = _CURRENT.timings
+            _CURRENT.timings = None
+            duration = time.perf_counter() - start
+            checksum_time = timings.get("checksum", 0.0)
+            record = TransferRecord(
+                op, str(src), str(dest), n_bytes,
+                0.0 if queued is None else start - queued,
+                duration - checksum_time, checksum_time, timings.get("retries", 0),
+                None if error is None else repr(error))
+            with self._lock:
+                self.records.append(record)
+
+    def summary(self, n_slowest: int = 10) -> TelemetrySummary:
+        """Aggregate the records.
+
+        Parameters
+        ----------
+        n_slowest:
+            Number of slowest transfers to include in the summary.
+
+        Returns
+        -------
+            Summary of all transfers.
+
+        """
+        with self._lock:
+            records = list(self.records)
+        if self.start_time is None:
+            wall_time = 0.0
+        else:
+            end_time = time.perf_counter() if self.end_time is None else self.end_time
+            wall_time = end_time - self.start_time
+        return TelemetrySummary(records, wall_time, n_slowest)
+
+
+class TelemetrySummary():  # pylint: disable=too-many-instance-attributes
+    """Summary of the transfers of an execution.
+
+    Parameters
+    ----------
+    records:
+        Records of all transfers.
+    wall_time:
+        Duration of the complete execution in seconds.
+    n_slowest:
+        Number of slowest transfers to keep.
+
+    Examples
+    --------
+    >>> summary = ops.execute(session)
+    >>> print(summary)
+    >>> summary.to_json("telemetry.json")
+    >>> summary.to_csv("telemetry.csv")
+
+    """
+
+    def __init__(self, records: list[TransferRecord], wall_time: float, n_slowest: int = 10):
+        """Compute the aggregates."""
+        self.records = records
+        self.wall_time = wall_time
+        self.n_transfers = len(records)
+        self.n_failed = sum(rec.error is not None for rec in records)
+        self.n_retries = sum(rec.retries for rec in records)
+        self.total_bytes = sum(rec.n_bytes for rec in records if rec.error is None)
+        self.throughput = self.total_bytes / wall_time if wall_time > 0 else 0.0
+        self.queue_wait = sum(rec.queue_wait for rec in records)
+        self.transfer_time = sum(rec.transfer_time for rec in records)
+        self.checksum_time = sum(rec.checksum_time for rec in records)
+        latencies = sorted(rec.transfer_time + rec.checksum_time for rec in records)
+        self.latency = {f"p{perc}": _percentile(latencies, perc) for perc in (50, 90, 99)}
+        self.latency["max"] = latencies[-1] if latencies else 0.0
+        self.slowest = sorted(records, key=lambda rec: rec.transfer_time + rec.checksum_time,
+                              reverse=True)[:n_slowest]
+
+    def to_dict(self) -> dict:
+        """Convert the summary and all records to a dictionary."""
+        return {
+            "wall_time": self.wall_time,
+            "n_transfers": self.n_transfers,
+            "n_failed": self.n_failed,
+            "n_retries": self.n_retries,
+            "total_bytes": self.total_bytes,
+            "throughput": self.throughput,
+            "queue_wait": self.queue_wait,
+            "transfer_time": self.transfer_time,
+            "checksum_time": self.checksum_time,
+            "latency": self.latency,
+            "slowest": [rec._asdict() for rec in self.slowest],
+            "records": [rec._asdict() for rec in self.records],
+        }
+
+    def to_json(self, json_fp: Union[str, Path]):
+        """Write the summary and all records to a JSON file.
+
+        Parameters
+        ----------
+        json_fp:
+            File to write the summary to.
+
+        """
+        with open(json_fp, "w", encoding="utf-8") as handle:
+            json.dump(self.to_dict(), handle, indent=4)
+
+    def to_csv(self, csv_fp: Union[str, Path]):
+        """Write the records of all transfers to a CSV file, one row per transfer.
+
+        Parameters
+        ----------
+        csv_fp:
+            File to write the records to.
+
+        """
+        with open(csv_fp, "w", encoding="utf-8", newline="") as handle:
+            writer = csv.writer(handle)
+            writer.writerow(TransferRecord._fields)
+            writer.writerows(self.records)
+
+    def __str__(self) -> str:
+        """Create a human readable report."""
+        lines = [
+            f"Transfers: {self.n_transfers} ({self.n_failed} failed, {self.n_retries} retries)",
+            f"Transferred: {self.total_bytes} bytes in {self.wall_time:.2f} s "
+            f"({self.throughput / 1024**2:.2f} MiB/s)",
+            f"Time spent waiting in queue: {self.queue_wait:.2f} s, transferring: "
+            f"{self.transfer_time:.2f} s, computing checksums: {self.checksum_time:.2f} s",
+            "Latency: " + ", ".join(f"{key} {value:.3f} s" for key, value in self.latency.items()),
+        ]
+        if self.slowest:
+            lines.append("Slowest transfers:")
+            lines.extend(f"    {rec.src} -> {rec.dest}: "
+                         f"{rec.transfer_time + rec.checksum_time:.3f} s, {rec.n_bytes} bytes"
+                         for rec in self.slowest)
+        return "\n".join(lines)
+
+
+def _percentile(sorted_values: list[float], perc: float) -> float:
+    """Compute a percentile with the nearest rank method."""
+    if len(sorted_values) == 0:
+        return 0.0
+    rank = max(1, math.ceil(perc / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
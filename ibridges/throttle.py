@@ -0,0 +1,232 @@
+"""Bandwidth throttling of transfers.
+
+Transfers can be limited with a global rate limiter, which is shared by all transfers of
+the process, and with a rate limiter per :class:`ibridges.executor.Operations` object.
+Transfers are either interactive or bulk. Bulk transfers wait while interactive transfers
+are waiting for bandwidth, so that a large synchronization does not hold up small
+interactive transfers.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import Iterable, Optional
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+
+
+class RateLimiter():
+    """Token bucket that limits the number of bytes transferred per second.
+
+    Transferred bytes are taken from the bucket after they have been sent or received,
+    which can make the number of tokens negative. Further transfers then have to wait
+    until the bucket has been refilled.
+
+    Parameters
+    ----------
+    rate:
+        Maximum average rate in bytes per second, by default None (unlimited).
+    burst:
+        Maximum number of bytes that can be transferred at once without waiting,
+        by default equal to the rate (one second worth of transfers).
+
+    Examples
+    --------
+    >>> limiter = RateLimiter(10*1024**2)  # 10 MiB/s
+    >>> limiter.acquire(1024**2)  # Wait until 1 MiB can be transferred.
+    >>> limiter.acquire(1024, priority=INTERACTIVE)
+
+    """
+
+    def __init__(self, rate: Optional[float] = None, burst: Optional[float] = None):
+        """Create a full bucket."""
+        self._cond = threading.Condition()
+        self._n_interactive = 0
+        self.set_rate(rate, burst)
+
+    @property
+    def rate(self) -> Optional[float]:
+        """Maximum average rate in bytes per second, None if unlimited."""
+        return self._rate
+
+    def set_rate(self, rate: Optional[float], burst: Optional[float] = None):
+        """Change the rate of the limiter.
+
+        Parameters
+        ----------
+        rate:
+            Maximum average rate in bytes per second, None to disable the limit.
+        burst:
+            Maximum number of bytes that can be transferred at once, by default equal to the rate.
+
+        Raises
+        ------
+        ValueError:
+            If the rate is not positive.
+
+        """
+        if rate is not None and rate <= 0:
+            raise ValueError(f"Transfer rate should be positive, not {rate}.")
+        with self._cond:
+            self._rate = rate
+            self._burst: float = 0.0 if rate is None else (rate if burst is None else burst)
+            self._tokens: float = self._burst
+            self._last_time = time.monotonic()
+            self._cond.notify_all()
+
+    def _refill(self):
+        now = time.monotonic()
+        if self._rate is not None:
+            self._tokens = min(self._burst, self._tokens + (now - self._last_time) * self._rate)
+        self._last_time = now
+
+    def acquire(self, n_bytes: int, priority: str = BULK):
+        """Take bytes from the bucket, waiting until there is bandwidth available.
+
+        Parameters
+        ----------
+        n_bytes:
+            Number of bytes that were (or will be) transferred.
+        priority:
+            Either INTERACTIVE or BULK. Bulk transfers wait while interactive transfers
+            are waiting.
+
+        """
+        if self._rate is None:
+            return
+        interactive = priority == INTERACTIVE
+        with self._cond:
+            if interactive:
+                self._n_interactive += 1
+            try:
+                while True:
+                    rate = self._rate
+                    if rate is None:
+                        return
+                    self._refill()
+                    if self._tokens >= 0 and (interactive or self._n_interactive == 0):
+                        break
+                    if self._tokens < 0:
+                        timeout = -self._tokens / rate
+                    else:
+                        # Wait for the interactive transfers to go first.
+                        timeout = 0.05
+                    self._cond.wait(timeout)
+                self._tokens -= n_bytes
+            finally:
+                if interactive:
+                    self._n_interactive -= 1
+                self._cond.notify_all()
+
+
+GLOBAL_LIMITER = RateLimiter()
+
+
+def set_global_rate(rate: Optional[float], burst: Optional[float] = None):
+    """Limit the bandwidth used by all transfers of this process.
+
+    Parameters
+    ----------
+    rate:
+        Maximum average rate in bytes per second, None to remove the limit.
+    burst:
+        Maximum number of bytes that can be transferred at once, by default equal to the rate.
+
+    Examples
+    --------
+    >>> set_global_rate(50*1024**2)  # At most 50 MiB/s for all transfers together.
+    >>> set_global_rate(None)  # No limit.
+
+    """
+    GLOBAL_LIMITER.set_rate(rate, burst)
+
+
+class Throttle():
+    """Limit a single transfer with the global limiter and optionally another limiter.
+
+    Instances are used as progress callbacks of the python-irodsclient, which are called
+    with the number of bytes after each transferred chunk.
+
+    Parameters
+    ----------
+    limiter:
+        Rate limiter in addition to the global one, for example of an Operations object.
+    priority:
+        Either INTERACTIVE or BULK.
+
+    """
+
+    def __init__(self, limiter: Optional[RateLimiter] = None, priority: str = BULK):
+        """Combine the global limiter with the given limiter."""
+        if priority not in (INTERACTIVE, BULK):
+            raise ValueError(f"Priority should be '{INTERACTIVE}' or '{BULK}', not '{priority}'.")
+        self.limiters: Iterable[RateLimiter] = (
+            [GLOBAL_LIMITER] if limiter is None else [GLOBAL_LIMITER, limiter])
+        self.priority = priority
+
+    @property
+    def active(self) -> bool:
+        """Whether any of the limiters has a rate limit."""
+        return any(limiter.rate is not None for limiter in self.limiters)
+
+    def __call__(self, n_bytes: int):
+        """Wait until the transferred bytes are allowed by all limiters."""
+        for limiter in self.limiters:
+            limiter.acquire(n_bytes, self.priority)
+
+
+class ThrottledStream():
+    """File handle wrapper that throttles reading and writing.
+
+    Parameters
+    ----------
+    handle:
+        File handle to wrap, for example of an opened data object.
+    throttle:
+        Throttle that limits the transferred bytes.
+
+    """
+
+    def __init__(self, handle, throttle: Throttle):
+        """Wrap the handle."""
+        self._handle = handle
+        self._throttle = throttle
+
+    def read(self, size: int = -1) -> bytes:
+        """Read from the handle, see io.BufferedIOBase."""
+        data = self._handle.read(size)
+        self._throttle(len(data))
+        return data
+
+    def readinto(self, buffer) -> int:
+        """Read into a buffer, see io.BufferedIOBase."""
+        n_bytes = self._handle.readinto(buffer)
+        self._throttle(n_bytes)
+        return n_bytes
+
+    def write(self, data) -> int:
+        """Write to the handle, see io.BufferedIOBase."""
+        n_bytes = self._handle.write(data)
+        self._throttle(len(data) if n_bytes is None else n_bytes)
+        return n_bytes
+
+    def __getattr__(self, attr):
+        """Pass everything else to the wrapped handle."""
+        return getattr(self._handle, attr)
+
+    def __iter__(self):
+        """Iterate over the lines of the handle."""
+        for line in self._handle:
+            self._throttle(len(line))
+            yield line
+
+    def __enter__(self):
+        """Open the handle as context manager."""
+        self._handle.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_trace_back):
+        """Close the handle."""
+        return self._handle.__exit__(exc_type, exc_value, exc_trace_back)
@@ -0,0 +1,774 @@
+"""Low level transfers of single files, data objects and bundles."""
+from __future__ import annotations
+
+import hashlib
+import json
+import math
+import os
+import shutil
+import tarfile
+import threading
+import time
+import uuid
+import warnings
+import weakref
+from inspect import signature
+from pathlib import Path, PurePosixPath
+from typing import Optional, Union
+
+import irods.exception
+import irods.keywords as kw
+from tqdm.std import tqdm as tqdm_type
+
+from ibridges.cache import invalidate
+from ibridges.path import CachedIrodsPath, IrodsPath
+from ibridges.retry import TRANSIENT_ERRORS
+from ibridges.rules import execute_rule
+from ibridges.session import Session
+from ibridges.telemetry import timed
+from ibridges.throttle import Throttle
+from ibridges.util import _detect_checksum, calc_checksum
+
+NUM_THREADS = 4
+
+# Data objects up to this size are always transferred with a single thread by the irodsclient.
+PARALLEL_TRANSFER_SIZE = 32 * 1024**2
+MAX_THREADS = 16
+
+# Size of the byte ranges in which resumable transfers are done.
+RANGE_CHUNK_SIZE = 64 * 1024**2
+
+# Limits for a single bundle of small files.
+BUNDLE_MAX_SIZE = 512 * 1024**2
+BUNDLE_MAX_FILES = 5000
+
+# Number of bytes of each ranged transfer that have been shown on a progress bar. The
+# transfer can be called again after an error, and then the bytes should not be counted twice.
+_REPORTED: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+_REPORTED_LOCK = threading.Lock()
+
+
+class TransferTuner():
+    """Choose the number of threads to transfer each data object with.
+
+    Small data objects are transferred with a single thread, since setting up multiple
+    streams only adds latency. For large objects the number of threads is first based on
+    the size of the object. Once larger transfers have completed, the measured throughput
+    per thread is used instead, so that each thread streams for about :attr:`target_seconds`.
+    The tuner is shared between all transfers of an :class:`Operations` run, and is thread-safe.
+
+    Parameters
+    ----------
+    num_threads:
+        Fixed number of threads to use for all transfers, overriding the automatic tuning.
+        By default None, in which case the number of threads is tuned.
+    max_threads:
+        Maximum number of threads for a single data object.
+
+    Examples
+    --------
+    >>> tuner = TransferTuner()
+    >>> tuner.num_threads(1024)
+    1
+    >>> tuner.record(10*1024**3, 8, 25.0)  # Report a completed transfer.
+
+    """
+
+    bytes_per_thread = 256 * 1024**2
+    target_seconds = 4.0
+
+    def __init__(self, num_threads: Optional[int] = None, max_threads: int = MAX_THREADS):
+        """Initialize the tuner without any throughput measurements."""
+        if num_threads is not None and num_threads < 1:
+            raise ValueError(f"Number of threads should be at least 1, not {num_threads}.")
+        self.fixed_threads = num_threads
+        self.max_threads = max_threads
+        self._thread_rate: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def thread_rate(self) -> Optional[float]:
+        """Measured throughput per thread in bytes/second, None if not measured yet."""
+        return self._thread_rate
+
+    def num_threads(self, size: Optional[int]) -> int:
+        """Get the number of threads to transfer a data object/file with.
+
+        Parameters
+        ----------
+        size
+            Size of the data object or file in bytes, None if unknown.
+
+        Returns
+        -------
+            The number of threads to use for the transfer.
+
+        """
+        if self.fixed_threads is not None:
+            return self.fixed_threads
+        if size is None:
+            return NUM_THREADS
+        if size <= PARALLEL_TRANSFER_SIZE:
+            return 1
+        rate = self._thread_rate
+        if rate is None:
+            n_threads = math.ceil(size / self.bytes_per_thread)
+        else:
+            n_threads = math.ceil(size / (rate * self.target_seconds))
+        return max(2, min(self.max_threads, n_threads))
+
+    def record(self, size: int, n_threads: int, duration: float):
+        """Record the throughput of a completed transfer.
+
+        Only transfers that were large enough to be done in parallel are taken into account,
+        since the duration of small transfers is dominated by latency.
+
+        Parameters
+        ----------
+        size
+            Number of bytes that were transferred.
+        n_threads
+            Number of threads that were used for the transfer.
+        duration
+            Duration of the transfer in seconds.
+
+        """
+        if size <= PARALLEL_TRANSFER_SIZE or duration <= 0:
+            return
+        rate = size / duration / n_threads
+        with self._lock:
+            if self._thread_rate is None:
+                self._thread_rate = rate
+            else:
+                # Exponential moving average, so that recent transfers count the most.
+                self._thread_rate = 0.7 * self._thread_rate + 0.3 * rate
+
+
+def _obj_put(  # pylint: disable=too-many-branches,too-many-statements,too-many-arguments
+    session: Session,
+    local_path: Union[str, Path],
+    irods_path: Union[str, IrodsPath],
+    overwrite: bool = False,
+    resc_name: str = "",
+    options: Optional[dict] = None,
+    ignore_err: bool = False,
+    pbar: Optional[tqdm_type] = None,
+    tuner: Optional[TransferTuner] = None,
+    resumable_size: Optional[int] = None,
+    throttle: Optional[Throttle] = None,
+):
+    """Upload `local_path` to `irods_path` following iRODS `options`.
+
+    Parameters
+    ----------
+    session :
+        Session to upload the object.
+    local_path : str or Path
+        Path of local file.
+    irods_path : str or IrodsPath
+        Path of iRODS data object or collection.
+    resc_name : str
+        Optional resource name.
+    overwrite :
+        Whether to overwrite the object if it exists.
+    options :
+        Extra options to the python irodsclient put method.
+    ignore_err:
+        If True, convert errors into warnings.
+    pbar:
+        Optional progress bar.
+    tuner:
+        Tuner that determines the number of threads for the transfer, by default the
+        number of threads only depends on the size of the file.
+    resumable_size:
+        Files of at least this size are uploaded in byte ranges, so that an interrupted
+        upload only needs to send the missing ranges when it is retried. By default None,
+        in which case all files are uploaded in one go.
+    throttle:
+        Throttle that limits the bandwidth of the upload, by default only the global
+        rate limit is applied.
+
+    """
+    local_path = Path(local_path)
+    # Keep the existence that might have been cached while planning the upload.
+    if not isinstance(irods_path, IrodsPath):
+        irods_path = IrodsPath(session, irods_path)
+
+    if not local_path.is_file():
+        err_msg = f"local_path '{local_path}' must be a file."
+        if not ignore_err:
+            raise ValueError(err_msg)
+        warnings.warn(err_msg)
+        return
+
+    # Check if irods object already exists, which is only relevant if it cannot be overwritten.
+    obj_exists = not overwrite and (
+        irods_path.dataobject_exists()
+        or (not isinstance(irods_path, CachedIrodsPath)
+            and IrodsPath(session, irods_path, local_path.name).dataobject_exists())
+    )
+
+    if tuner is None:
+        tuner = TransferTuner()
+    if throttle is None:
+        throttle = Throttle()
+    size = local_path.stat().st_size
+    if resumable_size is not None and size >= resumable_size and (overwrite or not obj_exists):
+        _ranged_put(session, local_path, irods_path, resc_name=resc_name, pbar=pbar,
+                    throttle=throttle)
+        return
+    n_threads = tuner.num_threads(size)
+    options = {} if options is None else dict(options)
+    options.update({kw.NUM_THREADS_KW: n_threads, kw.REG_CHKSUM_KW: "", kw.VERIFY_CHKSUM_KW: ""})
+
+    upd_put = "updatables" in signature(session.irods_session.data_objects.put).parameters
+    if pbar is not None and upd_put:
+        options["updatables"] = [pbar.update]
+    # The throttle is called after each transferred chunk, and waits if the limit is reached.
+    if throttle.active and upd_put:
+        options.setdefault("updatables", []).append(throttle)
+
+    if overwrite:
+        options[kw.FORCE_FLAG_KW] = ""
+    if resc_name not in ["", None]:
+        options[kw.RESC_NAME_KW] = resc_name
+    if overwrite or not obj_exists:
+        try:
+            start_time = time.perf_counter()
+            try:
+                session.irods_session.data_objects.put(local_path, str(irods_path),
+                                                       num_threads=n_threads, **options)
+            finally:
+                invalidate(session, irods_path)
+                if not isinstance(irods_path, CachedIrodsPath):
+                    invalidate(session, IrodsPath(session, irods_path, local_path.name))
+            tuner.record(size, n_threads, time.perf_counter() - start_time)
+        except TRANSIENT_ERRORS:
+            # Network errors are also OSErrors, but should be retried instead.
+            raise
+        except (PermissionError, OSError) as error:
+            err_msg = f"Cannot read {error.filename}."
+            if not ignore_err:
+                raise PermissionError(err_msg) from error
+            warnings.warn(err_msg)
+        except irods.exception.CAT_NO_ACCESS_PERMISSION as error:
+            err_msg = f"Cannot write {str(irods_path)}."
+            if not ignore_err:
+                raise PermissionError(err_msg) from error
+            warnings.warn(err_msg)
+        except irods.exception.OVERWRITE_WITHOUT_FORCE_FLAG as error:
+            # This should generally not occur, but a race condition might trigger this.
+            # obj does not exist -> someone else writes to object -> overwrite error
+            if not ignore_err:
+                raise FileExistsError(
+                    f"Dataset {irods_path} already exists. "
+                    "Use overwrite=True to overwrite the existing file."
+                    "This error might be the result of simultaneous writing "
+                    "to the same data object."
+                ) from error
+    else:
+        if not ignore_err:
+            raise FileExistsError(
+                f"Dataset {irods_path} already exists. "
+                "Use overwrite=True to overwrite the existing file."
+            )
+        warnings.warn(f"Cannot overwrite dataobject with name '{local_path.name}',"
+                      "it already exists. Use overwrite=False to suppress this warning.")
+    if pbar is not None and not upd_put:
+        pbar.update(size)
+
+
+def _obj_get(  # pylint: disable=too-many-branches,too-many-arguments
+    session: Session,
+    irods_path: IrodsPath,
+    local_path: Path,
+    overwrite: bool = False,
+    resc_name: Optional[str] = "",
+    options: Optional[dict] = None,
+    ignore_err: bool = False,
+    pbar: Optional[tqdm_type] = None,
+    tuner: Optional[TransferTuner] = None,
+    resumable_size: Optional[int] = None,
+    throttle: Optional[Throttle] = None,
+):
+    """Download `irods_path` to `local_path` following iRODS `options`.
+
+    Parameters
+    ----------
+    session :
+        Session to get the object from.
+    irods_path : str or IrodsPath
+        Path of iRODS data object.
+    local_path : str or Path
+        Path of local file or directory/folder.
+    overwrite :
+        Whether to overwrite the local file if it exists.
+    resc_name:
+        Name of the resource to get the object from.
+    options : dict
+        Extra options to the python irodsclient get method.
+    ignore_err:
+        If True, convert errors into warnings.
+    pbar:
+        Optional progress bar.
+    tuner:
+        Tuner that determines the number of threads for the transfer, by default the
+        number of threads only depends on the size of the data object.
+    resumable_size:
+        Data objects of at least this size are downloaded in byte ranges, so that an
+        interrupted download only needs to receive the missing ranges when it is retried.
+        By default None, in which case all data objects are downloaded in one go.
+    throttle:
+        Throttle that limits the bandwidth of the download, by default only the global
+        rate limit is applied.
+
+    """
+    if tuner is None:
+        tuner = TransferTuner()
+    size = irods_path.size
+    n_threads = tuner.num_threads(size)
+    options = {} if options is None else dict(options)
+    options.update(
+        {
+            kw.NUM_THREADS_KW: n_threads,
+            kw.VERIFY_CHKSUM_KW: "",
+        }
+    )
+    if overwrite:
+        options[kw.FORCE_FLAG_KW] = ""
+    if resc_name not in ["", None]:
+        options[kw.RESC_NAME_KW] = resc_name
+
+    # Compatibility with PRC<2.1
+    upd_put = "updatables" in signature(session.irods_session.data_objects.put).parameters
+    if pbar is not None and upd_put:
+        options["updatables"] = [pbar.update]
+    if throttle is None:
+        throttle = Throttle()
+    if throttle.active and upd_put:
+        options.setdefault("updatables", []).append(throttle)
+
+    # Quick fix for #126
+    if Path(local_path).is_dir():
+        local_path = Path(local_path).joinpath(irods_path.name)
+
+    if resumable_size is not None and size >= resumable_size:
+        _ranged_get(irods_path, Path(local_path), overwrite=overwrite, pbar=pbar,
+                    throttle=throttle)
+        return
+
+    try:
+        start_time = time.perf_counter()
+        session.irods_session.data_objects.get(str(irods_path), local_path,
+                                               num_threads=n_threads, **options)
+        tuner.record(size, n_threads, time.perf_counter() - start_time)
+    except TRANSIENT_ERRORS:
+        # Network errors are also OSErrors, but should be retried instead.
+        raise
+    except (OSError, irods.exception.CAT_NO_ACCESS_PERMISSION) as error:
+        msg = f"Cannot write to {local_path}."
+        if not ignore_err:
+            raise PermissionError(msg) from error
+        warnings.warn(msg)
+    except irods.exception.CUT_ACTION_PROCESSED_ERR as exc:
+        msg = f"During download operation from '{irods_path}': iRODS server forbids action."
+        if not ignore_err:
+            raise PermissionError(msg) from exc
+        warnings.warn(msg)
+    if pbar is not None and not upd_put:
+        pbar.update(size)
+
+
+def _ranged_put(session: Session, local_path: Path, irods_path: IrodsPath,
+                resc_name: Optional[str] = "", pbar: Optional[tqdm_type] = None,
+                chunk_size: int = RANGE_CHUNK_SIZE, throttle: Optional[Throttle] = None):
+    """Upload a file in byte ranges that can be resumed.
+
+    The ranges are written to a temporary data object next to the destination,
+    and the completed ranges are stored in a local state file. When the upload is
+    retried, only the missing ranges are sent. Once all ranges have been uploaded,
+    the checksum of the temporary data object is verified and it is moved to the
+    destination, replacing any existing data object.
+    """
+    stat = local_path.stat()
+    part_ipath = irods_path.parent / f".{irods_path.name}.ibridges_part"
+    state_fp = _upload_state_path(local_path, irods_path)
+    fingerprint = {"source": str(local_path), "dest": str(irods_path), "size": stat.st_size,
+                   "mtime": stat.st_mtime_ns}
+    ranges = _load_ranges(state_fp, fingerprint)
+    if len(ranges) == 0 or not part_ipath.dataobject_exists():
+        ranges = []
+        create_options = {} if resc_name in ["", None] else {kw.DEST_RESC_NAME_KW: resc_name}
+        session.irods_session.data_objects.create(str(part_ipath), force=True,
+                                                  **create_options)
+        invalidate(session, part_ipath)
+    _report_progress(pbar, state_fp, ranges)
+
+    with part_ipath.open("r+", throttle=throttle) as handle, open(local_path, "rb") as src:
+        for start, end in _missing_ranges(ranges, stat.st_size, chunk_size):
+            src.seek(start)
+            data = src.read(end - start)
+            handle.seek(start)
+            handle.write(data)
+            handle.flush()
+            _add_range(ranges, start, end)
+            _save_ranges(state_fp, fingerprint, ranges)
+            _report_progress(pbar, state_fp, ranges)
+
+    with timed("checksum"):
+        remote_checksum = part_ipath.checksum
+        local_checksum = calc_checksum(local_path,
+                                       checksum_type=_detect_checksum(remote_checksum))
+    if remote_checksum != local_checksum:
+        session.irods_session.data_objects.unlink(str(part_ipath), force=True)
+        invalidate(session, part_ipath)
+        state_fp.unlink()
+        raise ValueError(f"Checksum of uploaded {irods_path} does not match with "
+                         f"{local_path}, the upload has to be restarted.")
+    if irods_path.dataobject_exists():
+        session.irods_session.data_objects.unlink(str(irods_path), force=True)
+    session.irods_session.data_objects.move(str(part_ipath), str(irods_path))
+    invalidate(session, part_ipath)
+    invalidate(session, irods_path)
+    state_fp.unlink()
+    _report_progress(pbar, state_fp, None)
+
+
+def _ranged_get(irods_path: IrodsPath, local_path: Path, overwrite: bool = False,
+                pbar: Optional[tqdm_type] = None, chunk_size: int = RANGE_CHUNK_SIZE,
+                throttle: Optional[Throttle] = None):
+    """Download a data object in byte ranges that can be resumed.
+
+    The ranges are written to a partial file next to the destination, together with
+    a state file with the completed ranges. When the download is retried, only the
+    missing ranges are received. Once all ranges have been downloaded, the checksum of
+    the partial file is verified and it is renamed to the destination.
+    """
+    if local_path.exists() and not overwrite:
+        raise FileExistsError(f"File {local_path} already exists. "
+                              "Use overwrite=True to overwrite the existing file.")
+    size = irods_path.size
+    remote_checksum = irods_path.checksum
+    part_path = local_path.parent / f".{local_path.name}.ibridges_part"
+    state_fp = part_path.parent / f"{part_path.name}.json"
+    fingerprint = {"source": str(irods_path), "size": size, "checksum": remote_checksum}
+    ranges = _load_ranges(state_fp, fingerprint)
+    if len(ranges) == 0 or not part_path.is_file():
+        ranges = []
+        part_path.parent.mkdir(parents=True, exist_ok=True)
+        part_path.write_bytes(b"")
+    _report_progress(pbar, state_fp, ranges)
+
+    with irods_path.open("r", throttle=throttle) as handle, open(part_path, "r+b") as dest:
+        for start, end in _missing_ranges(ranges, size, chunk_size):
+            handle.seek(start)
+            data = handle.read(end - start)
+            if len(data) != end - start:
+                raise OSError(f"Could not read bytes {start}-{end} of {irods_path}.")
+            dest.seek(start)
+            dest.write(data)
+            dest.flush()
+            os.fsync(dest.fileno())
+            _add_range(ranges, start, end)
+            _save_ranges(state_fp, fingerprint, ranges)
+            _report_progress(pbar, state_fp, ranges)
+
+    with timed("checksum"):
+        local_checksum = calc_checksum(part_path,
+                                       checksum_type=_detect_checksum(remote_checksum))
+    if local_checksum != remote_checksum:
+        part_path.unlink()
+        state_fp.unlink()
+        raise ValueError(f"Checksum of downloaded {local_path} does not match with "
+                         f"{irods_path}, the download has to be restarted.")
+    os.replace(part_path, local_path)
+    state_fp.unlink()
+    _report_progress(pbar, state_fp, None)
+
+
+def _upload_state_path(local_path: Path, irods_path: IrodsPath) -> Path:
+    """Get the file that stores the completed byte ranges of an upload."""
+    name = hashlib.sha256(f"{local_path.absolute()}:{irods_path}".encode("utf-8")).hexdigest()
+    return Path.home() / ".ibridges" / "partial_uploads" / f"{name[:32]}.json"
+
+
+def _load_ranges(state_fp: Path, fingerprint: dict) -> list[list[int]]:
+    """Load the completed byte ranges, if the source has not changed."""
+    try:
+        with open(state_fp, "r", encoding="utf-8") as handle:
+            state = json.load(handle)
+    except (OSError, ValueError):
+        return []
+    if state.get("fingerprint") != fingerprint:
+        return []
+    return [list(byte_range) for byte_range in state["ranges"]]
+
+
+def _save_ranges(state_fp: Path, fingerprint: dict, ranges: list[list[int]]):
+    """Store the completed byte ranges, replacing the state file atomically."""
+    state_fp.parent.mkdir(parents=True, exist_ok=True)
+    tmp_fp = state_fp.parent / f"{state_fp.name}.tmp"
+    with open(tmp_fp, "w", encoding="utf-8") as handle:
+        json.dump({"fingerprint": fingerprint, "ranges": ranges}, handle)
+    os.replace(tmp_fp, state_fp)
+
+
+def _add_range(ranges: list[list[int]], start: int, end: int):
+    """Add a completed byte range, merging it with adjacent and overlapping ranges."""
+    ranges.append([start, end])
+    ranges.sort()
+    merged = [ranges[0]]
+    for cur_start, cur_end in ranges[1:]:
+        if cur_start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], cur_end)
+        else:
+            merged.append([cur_start, cur_end])
+    ranges[:] = merged
+
+
+def _report_progress(pbar: Optional[tqdm_type], state_fp: Path,
+                     ranges: Optional[list[list[int]]]):
+    """Show the completed ranges of a transfer on the progress bar.
+
+    Only the bytes that have not been shown before are added, so that ranges that were
+    completed before the transfer was retried are counted once. With ranges None, the
+    transfer is finished and its bookkeeping is removed.
+    """
+    if pbar is None:
+        return
+    with _REPORTED_LOCK:
+        reported = _REPORTED.setdefault(pbar, {})
+        if ranges is None:
+            reported.pop(str(state_fp), None)
+            return
+        n_done = sum(end - start for start, end in ranges)
+        n_new = n_done - reported.get(str(state_fp), 0)
+        if n_new > 0:
+            reported[str(state_fp)] = n_done
+    if n_new > 0:
+        pbar.update(n_new)
+
+
+def _missing_ranges(ranges: list[list[int]], size: int, chunk_size: int):
+    """Get the byte ranges (start, end) that still need to be transferred, in chunks."""
+    missing = []
+    pos = 0
+    for start, end in sorted(ranges) + [[size, size]]:
+        for chunk_start in range(pos, start, chunk_size):
+            missing.append((chunk_start, min(start, chunk_start + chunk_size)))
+        pos = max(pos, end)
+    return missing
+
+
+def _bundle_put(
+    session: Session,
+    files: list[tuple[Path, IrodsPath]],
+    root_ipath: IrodsPath,
+    overwrite: bool = False,
+    resc_name: str = "",
+    options: Optional[dict] = None,
+    ignore_err: bool = False,
+    pbar: Optional[tqdm_type] = None,
+    tuner: Optional[TransferTuner] = None,
+    throttle: Optional[Throttle] = None,
+):
+    """Upload a bundle of small files and extract it on the server.
+
+    The files are packed in a tar archive while it is being uploaded as a temporary data object
+    inside `root_ipath`. The archive is then extracted with the msiTarFileExtract microservice,
+    after which it is removed. If the bundle cannot be uploaded or extracted, for instance because
+    the server does not allow the microservice, the files are uploaded one by one instead.
+    Note that the server does not register checksums for the extracted data objects.
+
+    Parameters
+    ----------
+    session :
+        Session to upload the bundle with.
+    files :
+        Local files and their destination IrodsPaths.
+    root_ipath :
+        Collection in which the bundle is extracted.
+    overwrite :
+        Used when falling back to uploading the files one by one.
+    resc_name :
+        Optional resource name.
+    options :
+        Extra options for the python irodsclient, only used when falling back to separate uploads.
+    ignore_err:
+        If True, convert errors into warnings.
+    pbar:
+        Optional progress bar.
+    tuner:
+        Tuner used when falling back to uploading the files one by one.
+    throttle:
+        Throttle that limits the bandwidth of the upload.
+
+    """
+    root_ipath = IrodsPath(session, root_ipath)
+    bundle_ipath = root_ipath / f".ibridges_bundle_{uuid.uuid4().hex}.tar"
+    try:
+        params = _bundle_rule_params(bundle_ipath, root_ipath, resc_name)
+        with bundle_ipath.open("w", throttle=throttle) as handle:
+            with tarfile.open(fileobj=handle, mode="w|") as tar:
+                for lpath, ipath in files:
+                    tar.add(lpath, arcname=str(ipath.relative_to(root_ipath)), recursive=False)
+        _, stderr = execute_rule(session, None, params, output="ruleExecOut",
+                                 body="msiTarFileExtract(*bundle, *coll, *resc, *status);")
+        invalidate(session, root_ipath, recursive=True)
+        if stderr:
+            raise ValueError(stderr)
+    except TRANSIENT_ERRORS:
+        # Network errors are also OSErrors, but the whole bundle should be retried instead.
+        raise
+    except (ValueError, OSError, irods.exception.iRODSException) as error:
+        warnings.warn(f"Could not upload bundle of {len(files)} files to '{root_ipath}', "
+                      f"uploading them separately instead: {error!r}")
+        for lpath, ipath in files:
+            _obj_put(session, lpath, ipath, overwrite=overwrite, resc_name=resc_name,
+                     options=options, ignore_err=ignore_err, pbar=pbar, tuner=tuner,
+                     throttle=throttle)
+        return
+    finally:
+        _remove_bundle(session, bundle_ipath)
+    if pbar is not None:
+        pbar.update(sum(lpath.stat().st_size for lpath, _ in files))
+
+
+def _bundle_get(  # pylint: disable=too-many-arguments
+    session: Session,
+    root_ipath: IrodsPath,
+    root_lpath: Path,
+    files: list[tuple[IrodsPath, Path]],
+    overwrite: bool = False,
+    resc_name: str = "",
+    options: Optional[dict] = None,
+    ignore_err: bool = False,
+    pbar: Optional[tqdm_type] = None,
+    tuner: Optional[TransferTuner] = None,
+    throttle: Optional[Throttle] = None,
+):
+    """Download a collection as one bundle and extract it while streaming.
+
+    The collection is packed into a temporary tar data object in the home collection
+    with the msiTarFileCreate microservice. This data object is streamed and extracted
+    locally, without storing the archive itself, and is removed afterwards. If the bundle
+    cannot be created or downloaded, the data objects are downloaded one by one instead.
+
+    Parameters
+    ----------
+    session :
+        Session to download the bundle with.
+    root_ipath :
+        Collection to download.
+    root_lpath :
+        Local directory to extract the collection into.
+    files :
+        Data objects in the collection with their local destinations.
+    overwrite :
+        Whether to overwrite local files that exist.
+    resc_name :
+        Optional resource name.
+    options :
+        Extra options for the python irodsclient, only used when falling back to separate downloads.
+    ignore_err:
+        If True, convert errors into warnings.
+    pbar:
+        Optional progress bar.
+    tuner:
+        Tuner used when falling back to downloading the data objects one by one.
+    throttle:
+        Throttle that limits the bandwidth of the download.
+
+    """
+    root_ipath = IrodsPath(session, root_ipath)
+    bundle_ipath = IrodsPath(session, "~", f".ibridges_bundle_{uuid.uuid4().hex}.tar")
+    try:
+        params = _bundle_rule_params(bundle_ipath, root_ipath, resc_name)
+        _, stderr = execute_rule(session, None, params, output="ruleExecOut",
+                                 body='msiTarFileCreate(*bundle, *coll, *resc, "");')
+        invalidate(session, bundle_ipath)
+        if stderr:
+            raise ValueError(stderr)
+        with bundle_ipath.open("r", throttle=throttle) as handle:
+            with tarfile.open(fileobj=handle, mode="r|") as tar:
+                for member in tar:
+                    _extract_bundle_member(tar, member, root_lpath, overwrite, ignore_err)
+        with timed("checksum"):
+            for ipath, lpath in files:
+                checksum = getattr(ipath, "_checksum", None)
+                if checksum and calc_checksum(lpath, _detect_checksum(checksum)) != checksum:
+                    raise ValueError(f"Checksum of '{lpath}' differs from '{ipath}'.")
+    except (FileExistsError, *TRANSIENT_ERRORS):
+        raise
+    except (ValueError, OSError, tarfile.TarError, irods.exception.iRODSException) as error:
+        warnings.warn(f"Could not download '{root_ipath}' as a bundle, "
+                      f"downloading the data objects separately instead: {error!r}")
+        for ipath, lpath in files:
+            _obj_get(session, ipath, lpath, overwrite=overwrite, resc_name=resc_name,
+                     options=options, ignore_err=ignore_err, pbar=pbar, tuner=tuner,
+                     throttle=throttle)
+        return
+    finally:
+        _remove_bundle(session, bundle_ipath)
+    if pbar is not None:
+        pbar.update(sum(ipath.size for ipath, _ in files))
+
+
+def _bundle_rule_params(bundle_ipath: IrodsPath, root_ipath: IrodsPath,
+                        resc_name: Optional[str]) -> dict:
+    """Create the string parameters of the rules that create and extract bundles.
+
+    Raises
+    ------
+    ValueError:
+        If a path or the resource name contains characters that would change the rule.
+
+    """
+    params = {}
+    for name, value in [("*bundle", str(bundle_ipath)), ("*coll", str(root_ipath)),
+                        ("*resc", resc_name if resc_name else "null")]:
+        # Quotes and backslashes end or escape the string, and *name is replaced by a variable.
+        if any(char in value for char in '"\\*\n'):
+            raise ValueError(f"Cannot use '{value}' in a bundle rule, since it contains "
+                             "quotes, backslashes, asterisks or newlines.")
+        params[name] = f'"{value}"'
+    return params
+
+
+def _remove_bundle(session: Session, bundle_ipath: IrodsPath):
+    """Remove the temporary bundle, without hiding an earlier error if that fails."""
+    try:
+        if bundle_ipath.dataobject_exists():
+            session.irods_session.data_objects.unlink(str(bundle_ipath), force=True)
+            invalidate(session, bundle_ipath)
+    except Exception as error:  # pylint: disable=broad-exception-caught
+        warnings.warn(f"Could not remove temporary bundle '{bundle_ipath}': {error!r}")
+
+
+def _extract_bundle_member(tar: tarfile.TarFile, member: tarfile.TarInfo, root_lpath: Path,
+                           overwrite: bool = False, ignore_err: bool = False):
+    """Extract a single directory or file from a streamed tar archive.
+
+    Files that exist already are only overwritten with overwrite, like separate downloads.
+    """
+    member_path = PurePosixPath(member.name)
+    if member_path.is_absolute() or ".." in member_path.parts:
+        raise ValueError(f"Refusing to extract '{member.name}' outside of '{root_lpath}'.")
+    dest_path = Path(root_lpath).joinpath(*member_path.parts)
+    if member.isdir():
+        dest_path.mkdir(parents=True, exist_ok=True)
+        return
+    if not member.isfile():
+        warnings.warn(f"Skipping '{member.name}' in bundle, it is not a regular file.")
+        return
+    if dest_path.exists() and not overwrite:
+        msg = (f"File {dest_path} already exists. "
+               "Use overwrite=True to overwrite the existing file.")
+        if not ignore_err:
+            raise FileExistsError(msg)
+        warnings.warn(msg)
+        return
+    dest_path.parent.mkdir(parents=True, exist_ok=True)
+    src_handle = tar.extractfile(member)
+    with open(dest_path, "wb") as dest_handle:
+        shutil.copyfileobj(src_handle, dest_handle)  # type: ignore
@@ -0,0 +1,101 @@
+import threading
+
+import pytest
+
+
+class FakeClock:
+    """Clock that only moves when the test sets or sleeps it."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class FakeIrodsSession:
+    """Stand-in for the iRODS session, with the managers given as keyword arguments."""
+
+    server_version = (4, 3, 1)
+    zone = "testzone"
+    username = "testuser"
+
+    def __init__(self, **attributes):
+        self.n_queries = 0
+        self.cleaned_up = False
+        self.__dict__.update(attributes)
+
+    def cleanup(self):
+        self.cleaned_up = True
+
+    def clone(self):
+        return FakeIrodsSession()
+
+
+class FakeSession:
+    """Stand-in for an iBridges session, which can be cloned, checked and reconnected.
+
+    The clones share the iRODS session, so that the tests can inspect all requests.
+    """
+
+    zone = "testzone"
+    home = "/testzone/home/testuser"
+    server_version = (4, 3, 1)
+
+    def __init__(self, irods_env=None, password=None, irods_home=None, irods_session=None,
+                 stat_cache=None):
+        self.irods_env = irods_env
+        if irods_home is not None:
+            self.home = irods_home
+        self.irods_session = FakeIrodsSession() if irods_session is None else irods_session
+        self.stat_cache = stat_cache
+        self.healthy = True
+        self.closed = False
+        self.n_connect = 0
+        self.clones = []
+        self.lock = threading.Lock()
+
+    def clone(self):
+        clone = FakeSession(self.irods_env, irods_home=self.home,
+                            irods_session=self.irods_session, stat_cache=self.stat_cache)
+        clone.server_version = self.server_version
+        with self.lock:
+            self.clones.append(clone)
+        return clone
+
+    def connect(self):
+        self.n_connect += 1
+        return FakeIrodsSession()
+
+    def get_user_info(self, refresh=False):
+        if not self.healthy:
+            raise ConnectionError("Connection lost")
+        return "rodsuser", []
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def fake_clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def make_irods_session():
+    """Factory for fake iRODS sessions."""
+    return FakeIrodsSession
+
+
+@pytest.fixture
+def make_session():
+    """Factory for fake sessions, which takes the same arguments as a session."""
+    return FakeSession
+
+
+@pytest.fixture
+def fake_session():
+    return FakeSession()
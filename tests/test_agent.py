@@ -0,0 +1,137 @@
+import os
+import sys
+import threading
+
+import pytest
+
+from ibridges import agent
+from ibridges.agent import IbridgesAgent, agent_socket_path, forward, send_request
+
+pytestmark = pytest.mark.skipif(not agent.AGENT_SUPPORTED, reason="Unix sockets are needed.")
+
+
+@pytest.fixture
+def fake_cli(monkeypatch, tmpdir):
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmpdir))
+    calls = []
+    release = threading.Event()
+    release.set()
+
+    def _run_subcommand(subcommand):
+        calls.append((subcommand, list(sys.argv), os.getcwd()))
+        if subcommand == "tree":
+            raise agent.AgentUnavailableError("Password needed")
+        if subcommand == "search":
+            release.wait(10)
+        print(f"{subcommand} {' '.join(sys.argv[1:])}")
+        if subcommand == "mkcoll":
+            sys.exit(3)
+
+    return calls, _run_subcommand, release
+
+
+@pytest.fixture
+def running_agent(fake_cli):
+    ib_agent = IbridgesAgent(fake_cli[1], idle_timeout=10, cache_ttl=60)
+    thread = threading.Thread(target=ib_agent.serve)
+    thread.start()
+    for _ in range(100):
+        if send_request({"command": "status"}) is not None:
+            break
+        thread.join(0.01)
+    yield ib_agent
+    send_request({"command": "stop"})
+    thread.join(5)
+    assert not thread.is_alive()
+    assert not agent_socket_path().exists()
+
+
+def test_forward(running_agent, fake_cli, capsys):
+    calls = fake_cli[0]
+    status = send_request({"command": "status"})
+    assert status["pid"] == os.getpid()
+    assert oct(agent_socket_path().parent.stat().st_mode)[-3:] == "700"
+
+    assert forward("list", ["irods:~/x"]) == 0
+    assert capsys.readouterr().out == "list irods:~/x\n"
+    assert calls[0] == ("list", ["ibridges", "irods:~/x"], os.getcwd())
+
+    # Listings are cached until data is changed.
+    assert forward("list", ["irods:~/x"]) == 0
+    assert len(calls) == 1
+    assert forward("mkcoll", ["irods:~/y"]) == 3
+    assert forward("list", ["irods:~/x"]) == 0
+    assert len(calls) == 3
+    capsys.readouterr()
+
+    # Transfers that are run by the client also invalidate the cache.
+    agent.notify_changed("upload")
+    assert forward("list", ["irods:~/x"]) == 0
+    assert len(calls) == 4
+
+    # The output is cached per iRODS environment, and removed after 'ibridges init'.
+    assert forward("list", ["irods:~/x"], "/home/user/.irods/other.json") == 0
+    assert len(calls) == 5
+    assert forward("list", ["irods:~/x"]) == 0
+    assert len(calls) == 5
+    agent.notify_changed("init")
+    assert forward("list", ["irods:~/x"]) == 0
+    assert len(calls) == 6
+
+    # Commands that cannot be run by the agent are run by the client.
+    assert forward("tree", ["irods:~/x"]) is None
+    assert forward("download", ["irods:~/x"]) is None
+    assert forward("upload", ["x", "irods:~/x"]) is None
+    assert forward("init", []) is None
+    os.environ["IBRIDGES_AGENT"] = "off"
+    try:
+        assert forward("list", ["irods:~/x"]) is None
+    finally:
+        del os.environ["IBRIDGES_AGENT"]
+
+
+def test_no_agent(fake_cli):
+    assert send_request({"command": "status"}) is None
+    assert forward("list", []) is None
+
+
+def test_idle_timeout(fake_cli):
+    ib_agent = IbridgesAgent(fake_cli[1], idle_timeout=0.1)
+    ib_agent.serve()
+    assert not agent_socket_path().exists()
+
+
+def test_busy_agent(running_agent, fake_cli, monkeypatch):
+    monkeypatch.setattr(agent, "RUN_WAIT", 0.1)
+    release = fake_cli[2]
+    release.clear()
+    busy = threading.Thread(target=forward, args=("search", ["--path-pattern", "x"]))
+    busy.start()
+    try:
+        for _ in range(100):
+            if len(fake_cli[0]) > 0:
+                break
+            busy.join(0.01)
+        # The status is available and other commands are run by the client.
+        assert send_request({"command": "status"}, response_timeout=1.0) is not None
+        assert forward("list", ["irods:~/x"]) is None
+        monkeypatch.setattr(agent, "RUN_WAIT", 10.0)
+        assert send_request({"command": "run", "subcommand": "list", "argv": [],
+                             "cwd": os.getcwd()}, response_timeout=0.1) is None
+    finally:
+        release.set()
+        busy.join(5)
+
+
+def test_peer_check(fake_cli, monkeypatch):
+    monkeypatch.setattr(agent, "PEER_CHECK_SUPPORTED", False)
+    with pytest.raises(OSError):
+        IbridgesAgent(fake_cli[1], idle_timeout=0.1).serve()
+    assert not agent_socket_path().exists()
+
+    server_sock, client_sock = agent.socket.socketpair(agent.socket.AF_UNIX)
+    with server_sock, client_sock:
+        if hasattr(agent.socket, "SO_PEERCRED") or hasattr(agent.socket, "LOCAL_PEERCRED"):
+            assert agent._peer_uid(server_sock) == os.getuid()
+        monkeypatch.setattr(agent, "_peer_uid", lambda sock: None)
+        assert not agent._AgentServer.verify_request(None, server_sock, "")
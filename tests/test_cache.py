@@ -0,0 +1,83 @@
+from types import SimpleNamespace
+
+import pytest
+
+import ibridges.cache
+from ibridges.cache import StatCache
+from ibridges.path import IrodsPath
+
+
+def test_stat_cache(monkeypatch, fake_clock):
+    monkeypatch.setattr(ibridges.cache.time, "monotonic", fake_clock)
+    cache = StatCache(ttl=10, max_size=3)
+    cache.put("/zone/home/user/obj", is_dataobject=True, size=5)
+    assert cache.get("/zone/home/user/obj", "is_collection") is False
+    assert cache.get("/zone/home/user/obj", "size") == 5
+    assert cache.get("/zone/home/user/obj", "checksum") is None
+    cache.put("/zone/home/user/obj", checksum="sha2:x")
+    assert cache.get("/zone/home/user/obj", "size") == 5
+
+    fake_clock.now = 11
+    assert cache.get("/zone/home/user/obj", "size") is None
+    assert len(cache) == 0
+
+    # The least recently used path is removed first.
+    for name in ["a", "b", "c"]:
+        cache.put(f"/zone/{name}", is_collection=True)
+    cache.get("/zone/a", "is_collection")
+    cache.put("/zone/d", is_collection=True)
+    assert cache.get("/zone/b", "is_collection") is None
+    assert cache.get("/zone/a", "is_collection")
+
+    with pytest.raises(ValueError):
+        StatCache(ttl=0)
+
+
+def test_invalidate():
+    cache = StatCache()
+    for path in ["/zone", "/zone/home", "/zone/home/coll", "/zone/home/coll/obj",
+                 "/zone/home/coll_other"]:
+        cache.put(path, is_collection=True)
+    cache.invalidate("/zone/home/coll/new")
+    assert cache.get("/zone/home/coll/obj", "is_collection")
+    assert cache.get("/zone/home/coll", "is_collection") is None
+    assert cache.get("/zone", "is_collection") is None
+
+    cache.put("/zone/home/coll", is_collection=True)
+    cache.invalidate("/zone/home/coll", recursive=True)
+    assert cache.get("/zone/home/coll/obj", "is_collection") is None
+    assert cache.get("/zone/home/coll_other", "is_collection")
+
+
+class FakeCatalog:
+    def __init__(self):
+        self.objects = {"/testzone/home/testuser/obj"}
+        self.calls = []
+        self.collections = SimpleNamespace(exists=lambda path: self._exists("coll", path))
+        self.data_objects = SimpleNamespace(exists=lambda path: self._exists("obj", path),
+                                            get=self._get)
+
+    def _exists(self, kind, path):
+        self.calls.append(kind)
+        return kind == "obj" and path in self.objects
+
+    def _get(self, path):
+        return SimpleNamespace(unlink=lambda: self.objects.remove(path))
+
+
+@pytest.mark.parametrize("use_cache", [True, False])
+def test_cached_exists(use_cache, make_session, make_irods_session):
+    catalog = FakeCatalog()
+    session = make_session(stat_cache=StatCache() if use_cache else None,
+                           irods_session=make_irods_session(collections=catalog.collections,
+                                                            data_objects=catalog.data_objects))
+    ipath = IrodsPath(session, "~", "obj")
+    for _ in range(3):
+        assert ipath.exists()
+        assert not ipath.collection_exists()
+    assert len(catalog.calls) == (1 if use_cache else 6)
+
+    catalog.calls.clear()
+    ipath.remove()
+    assert not IrodsPath(session, "/testzone/home/testuser/obj").exists()
+    assert catalog.calls[-2:] == ["obj", "coll"]
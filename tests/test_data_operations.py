@@ -0,0 +1,181 @@
+import os
+from pathlib import Path
+
+import ibridges.data_operations
+from ibridges.data_operations import (
+    _bundle_downloads,
+    _bundle_uploads,
+    _down_sync_operations,
+    _merge_join,
+    _up_sync_operations,
+    apply_meta_archive,
+)
+from ibridges.executor import Operations
+from ibridges.path import CachedIrodsPath, IrodsPath
+
+
+class MockIrodsSession:
+    zone = "testzone"
+    home = "/testzone/home/testuser"
+    irods_session = None
+
+
+def test_bundle_uploads(tmpdir):
+    session = MockIrodsSession()
+    root_ipath = IrodsPath(session, "~", "root")
+    ops = Operations()
+    for i_file in range(5):
+        lpath = Path(tmpdir, f"small_{i_file}.txt")
+        lpath.write_text("x")
+        ops.add_upload(lpath, CachedIrodsPath(session, None, False, None, root_ipath / lpath.name))
+    large_lpath = Path(tmpdir, "large.txt")
+    large_lpath.write_text("x" * 1000)
+    ops.add_upload(large_lpath, CachedIrodsPath(session, None, False, None,
+                                                root_ipath / large_lpath.name))
+    existing_lpath = Path(tmpdir, "small_0.txt")
+    ops.add_upload(existing_lpath, CachedIrodsPath(session, 1, True, None,
+                                                   root_ipath / "existing.txt"))
+
+    _bundle_uploads(ops, root_ipath, None)
+    assert len(ops.upload) == 7
+    assert len(ops.upload_bundles) == 0
+
+    _bundle_uploads(ops, root_ipath, 100)
+    assert [lpath for lpath, _ in ops.upload] == [large_lpath, existing_lpath]
+    assert len(ops.upload_bundles) == 1
+    files, bundle_root = ops.upload_bundles[0]
+    assert len(files) == 5
+    assert str(bundle_root) == str(root_ipath)
+
+
+def test_bundle_downloads(tmpdir):
+    session = MockIrodsSession()
+    root_ipath = IrodsPath(session, "~", "root")
+    ops = Operations()
+    sizes = {"a/x": 1, "a/y": 1, "b/x": 1, "b/y": 1000, "z": 1}
+    for rel_path, size in sizes.items():
+        ops.add_download(CachedIrodsPath(session, size, True, None, root_ipath / rel_path),
+                         Path(tmpdir, rel_path))
+    n_objects = {"": 5, "a": 2, "b": 2}
+    _bundle_downloads(ops, root_ipath, Path(tmpdir), n_objects, 100)
+    assert len(ops.download_bundles) == 1
+    bundle_ipath, bundle_lpath, files = ops.download_bundles[0]
+    assert str(bundle_ipath) == str(root_ipath / "a")
+    assert bundle_lpath == Path(tmpdir, "a")
+    assert len(files) == 2
+    assert sorted(str(lpath) for _, lpath in ops.download) == sorted(
+        str(Path(tmpdir, rel_path)) for rel_path in ["b/x", "b/y", "z"])
+
+    # All data objects small: the whole collection is bundled.
+    ops = Operations()
+    for rel_path in sizes:
+        ops.add_download(CachedIrodsPath(session, 1, True, None, root_ipath / rel_path),
+                         Path(tmpdir, rel_path))
+    _bundle_downloads(ops, root_ipath, Path(tmpdir), n_objects, 100)
+    assert len(ops.download) == 0
+    assert len(ops.download_bundles) == 1
+    assert len(ops.download_bundles[0][2]) == 5
+
+
+# Remote tree: collection path -> (data objects, subcollections).
+REMOTE_TREE = {
+    "/testzone/home/testuser/root": ([("a.txt", 1, None), ("same.txt", 4, None)], ["sub"]),
+    "/testzone/home/testuser/root/sub": ([("b.txt", 1, None)], ["deep"]),
+    "/testzone/home/testuser/root/sub/deep": ([("c.txt", 1, None)], []),
+}
+
+
+def _fake_listing(monkeypatch):
+    listed = []
+
+    def list_collection(_session, coll_path):
+        listed.append(coll_path)
+        return REMOTE_TREE[coll_path]
+
+    def list_subcollections(_session, coll_path):
+        listed.append(coll_path)
+        return REMOTE_TREE[coll_path][1]
+    monkeypatch.setattr(ibridges.data_operations, "_list_collection", list_collection)
+    monkeypatch.setattr(ibridges.data_operations, "_list_subcollections", list_subcollections)
+    monkeypatch.setattr(ibridges.data_operations, "_list_data_objects",
+                        lambda _session, coll_path: REMOTE_TREE[coll_path][0])
+    monkeypatch.setattr(ibridges.data_operations, "checksums_equal", lambda *_: True)
+    return listed
+
+
+def test_merge_join():
+    pairs = list(_merge_join(["a", "c", "d"], [("b", 1), ("c", 2), ("e", 3)]))
+    assert pairs == [("a", None), (None, ("b", 1)), ("c", ("c", 2)), ("d", None),
+                     (None, ("e", 3))]
+    assert list(_merge_join([], [])) == []
+
+
+def test_down_sync_operations(tmpdir, monkeypatch):
+    listed = _fake_listing(monkeypatch)
+    session = MockIrodsSession()
+    ldest = Path(tmpdir)
+    (ldest / "same.txt").write_text("xxxx")
+    ops = _down_sync_operations(IrodsPath(session, "~", "root"), ldest, overwrite=True)
+    assert listed == list(REMOTE_TREE)
+    assert sorted(str(lpath.relative_to(ldest)) for _, lpath in ops.download) == [
+        "a.txt", "sub/b.txt", "sub/deep/c.txt"]
+    assert ops.create_dir == {str(ldest / "sub"), str(ldest / "sub" / "deep")}
+
+    # The metadata archive has the same order as IrodsPath.walk.
+    root_ipath = IrodsPath(session, "~", "root")
+    ops = _down_sync_operations(root_ipath, ldest, overwrite=True, metadata=ldest / "meta.json")
+    items = ops.meta_download[str(ldest / "meta.json")]["items"]
+    assert [str(ipath.relative_to(root_ipath)) for ipath in items] == [
+        ".", "sub", "sub/deep", "sub/deep/c.txt", "sub/b.txt", "a.txt", "same.txt"]
+
+    listed.clear()
+    ops = _down_sync_operations(IrodsPath(session, "~", "root"), ldest, overwrite=True, depth=1)
+    assert listed == ["/testzone/home/testuser/root"]
+    assert [str(lpath.relative_to(ldest)) for _, lpath in ops.download] == ["a.txt"]
+    assert ops.create_dir == {str(ldest / "sub")}
+
+
+def test_up_sync_operations(tmpdir, monkeypatch):
+    listed = _fake_listing(monkeypatch)
+    monkeypatch.setattr(IrodsPath, "collection_exists", lambda self: True)
+    session = MockIrodsSession()
+    lsource = Path(tmpdir)
+    for rel_path in ["a.txt", "same.txt", "new.txt", "sub/b.txt", "new_dir/d.txt"]:
+        lsource.joinpath(rel_path).parent.mkdir(exist_ok=True)
+        lsource.joinpath(rel_path).write_text("x")
+    ops = _up_sync_operations(lsource, IrodsPath(session, "~", "root"), overwrite=True)
+    # Collections that do not exist are not listed.
+    assert listed == ["/testzone/home/testuser/root", "/testzone/home/testuser/root/sub"]
+    assert sorted(str(lpath.relative_to(lsource)) for lpath, _ in ops.upload) == [
+        "new.txt", "new_dir/d.txt"]
+    assert ops.create_collection == {"/testzone/home/testuser/root/new_dir"}
+
+    listed.clear()
+    lsource.joinpath("sub", "deeper").mkdir()
+    lsource.joinpath("sub", "deeper", "e.txt").write_text("x")
+    walked = []
+    os_walk = os.walk
+
+    def recording_walk(top):
+        for root, folders, files in os_walk(top):
+            walked.append(Path(root).relative_to(lsource))
+            yield root, folders, files
+    monkeypatch.setattr(ibridges.data_operations.os, "walk", recording_walk)
+    ops = _up_sync_operations(lsource, IrodsPath(session, "~", "root"), overwrite=True, depth=1)
+    # Folders below the maximum depth are not scanned.
+    assert walked == [Path("."), Path("new_dir"), Path("sub")]
+    assert listed == ["/testzone/home/testuser/root", "/testzone/home/testuser/root/sub"]
+    assert sorted(str(lpath.relative_to(lsource)) for lpath, _ in ops.upload) == [
+        "new.txt", "new_dir/d.txt"]
+    assert ops.create_collection == {"/testzone/home/testuser/root/new_dir",
+                                     "/testzone/home/testuser/root/sub/deeper"}
+
+
+def test_apply_meta_archive_workers(monkeypatch, tmp_path):
+    executed = []
+    monkeypatch.setattr(IrodsPath, "collection_exists", lambda self: True)
+    monkeypatch.setattr(Operations, "execute", lambda self, session, **kwargs: executed.append(
+        kwargs))
+    ops = apply_meta_archive(MockIrodsSession(), tmp_path / "meta.json", "~/root", max_workers=8)
+    assert executed == [{"max_workers": 8}]
+    assert str(ops.meta_upload[0][0]) == "/testzone/home/testuser/root"
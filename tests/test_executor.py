@@ -0,0 +1,310 @@
+import asyncio
+import json
+import re
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+import ibridges.icat_columns as icat
+from ibridges.executor import (
+    Operations,
+    _add_to_metadict,
+    _empty_metadict,
+    _plan_meta_changes,
+    _walk_metadata,
+)
+from ibridges.journal import TransferJournal
+from ibridges.meta_apply import MetaChange
+from ibridges.path import IrodsPath
+
+
+def _make_transfer(fail_on=()):
+    transferred = []
+    lock = threading.Lock()
+
+    def _transfer(session, src, dest, **kwargs):
+        if src in fail_on:
+            raise ValueError(f"Failed {src}")
+        with lock:
+            transferred.append((src, dest))
+    return _transfer, transferred
+
+
+@pytest.mark.parametrize("max_workers", [1, 4])
+def test_execute_transfers(max_workers, make_session):
+    ops = Operations()
+    transfers = [(Path(f"file_{i}"), f"dest_{i}") for i in range(20)]
+    transfer_func, transferred = _make_transfer()
+    ops._execute_transfers(transfer_func, make_session(), transfers, None,
+                           max_workers=max_workers)
+    assert sorted(transferred) == sorted(transfers)
+    assert len(ops.errors) == 0
+
+
+def test_execute_transfers_sessions(make_session):
+    session = make_session()
+    used = []
+    lock = threading.Lock()
+
+    def _transfer(cur_session, src, dest, **kwargs):
+        with lock:
+            used.append((cur_session, dest))
+        time.sleep(0.01)
+
+    ops = Operations()
+    transfers = [(Path(f"file_{i}"), IrodsPath(session, f"dest_{i}")) for i in range(20)]
+    ops._execute_transfers(_transfer, session, transfers, None, max_workers=4)
+    # Each worker transfers with its own clone, also used by the planned paths.
+    assert 1 < len(session.clones) <= 4
+    assert all(cur_session in session.clones and dest.session is cur_session
+               for cur_session, dest in used)
+    assert sorted(str(dest) for _, dest in used) == sorted(str(dest) for _, dest in transfers)
+    assert all(clone.closed for clone in session.clones)
+
+
+@pytest.mark.parametrize("max_workers", [1, 4])
+def test_execute_transfers_errors(max_workers, make_session):
+    transfers = [(Path(f"file_{i}"), f"dest_{i}") for i in range(20)]
+    fail_on = [Path("file_3"), Path("file_7")]
+
+    ops = Operations()
+    transfer_func, _ = _make_transfer(fail_on)
+    with pytest.raises(ValueError):
+        ops._execute_transfers(transfer_func, make_session(), transfers, None,
+                               max_workers=max_workers)
+
+    ops = Operations()
+    transfer_func, transferred = _make_transfer(fail_on)
+    with pytest.warns(UserWarning):
+        ops._execute_transfers(transfer_func, make_session(), transfers, None, ignore_err=True,
+                               max_workers=max_workers)
+    assert len(transferred) == 18
+    assert sorted(err[0] for err in ops.errors) == fail_on
+
+
+
+class FakeIrodsPath(str):
+    size = 5
+
+
+def test_execute_async(tmpdir, monkeypatch, make_session):
+    def _fake_get(session, ipath, lpath, pbar=None, **kwargs):
+        lpath.write_bytes(ipath.encode("utf-8"))
+        pbar.update(len(ipath))
+
+    monkeypatch.setattr("ibridges.executor._obj_get", _fake_get)
+    ops = Operations()
+    for i in range(10):
+        ops.add_download(FakeIrodsPath(f"obj_{i}"), Path(tmpdir) / f"file_{i}")
+    events = []
+
+    async def _progress(event):
+        events.append(event)
+
+    session = make_session()
+    summary = asyncio.run(ops.execute_async(session, max_workers=3, progress=_progress))
+    assert summary.n_transfers == 10
+    assert 1 <= len(session.clones) <= 3
+    assert all(clone.closed for clone in session.clones)
+    assert summary.total_bytes == 50
+    for i in range(10):
+        assert (Path(tmpdir) / f"file_{i}").read_bytes() == f"obj_{i}".encode("utf-8")
+    assert len(list(Path(tmpdir).iterdir())) == 10
+    assert sorted(event.event for event in events) == (
+        ["completed"] * 10 + ["progress"] * 10 + ["started"] * 10)
+
+
+def test_execute_async_cancel(tmpdir, monkeypatch, make_session):
+    started = threading.Event()
+    release = threading.Event()
+
+    def _slow_get(session, ipath, lpath, **kwargs):
+        with open(lpath, "wb") as handle:
+            handle.write(b"partial")
+            started.set()
+            release.wait(5)
+
+    monkeypatch.setattr("ibridges.executor._obj_get", _slow_get)
+    ops = Operations()
+    ops.add_download(FakeIrodsPath("obj"), Path(tmpdir) / "file")
+
+    session = make_session()
+    journal = TransferJournal(Path(tmpdir) / "journal.jsonl")
+
+    async def _cancel():
+        task = asyncio.ensure_future(ops.execute_async(session, journal=journal))
+        for _ in range(500):
+            if started.is_set():
+                break
+            await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(_cancel())
+    # The transfer that is still running keeps its session and the journal.
+    assert len(session.clones) == 1 and not session.clones[0].closed
+    assert journal._handle is not None
+    release.set()
+    for _ in range(500):
+        if session.clones[0].closed:
+            break
+        time.sleep(0.01)
+    time.sleep(0.05)
+    assert session.clones[0].closed
+    assert journal._handle is None
+    assert [path.name for path in Path(tmpdir).iterdir()] == ["journal.jsonl"]
+
+
+class FakeCatalogQuery:
+    def __init__(self, catalog, columns):
+        self.catalog = catalog
+        self.columns = columns
+        self.criteria = []
+        catalog.n_queries += 1
+
+    def filter(self, *criteria):
+        self.criteria.extend(criteria)
+        return self
+
+    def _match(self, row):
+        for crit in self.criteria:
+            value = row[crit.query_key]
+            pattern = re.escape(crit.value).replace("%", ".*")
+            if crit.op == "=" and value != crit.value:
+                return False
+            if crit.op == "like" and re.fullmatch(pattern, value) is None:
+                return False
+            if crit.op == "not like" and re.fullmatch(pattern, value) is not None:
+                return False
+        return True
+
+    def _selects(self, column):
+        # Columns cannot be compared with ==, since that creates a query condition.
+        return any(col is column for col in self.columns)
+
+    def __iter__(self):
+        if self._selects(icat.META_COLL_ATTR_NAME):
+            rows = self.catalog.coll_meta
+        elif self._selects(icat.META_DATA_ATTR_NAME):
+            rows = self.catalog.data_meta
+        elif self._selects(icat.DATA_NAME):
+            rows = self.catalog.data_objects
+        else:
+            rows = self.catalog.collections
+        results = [{col: row[col] for col in self.columns} for row in rows if self._match(row)]
+        # Results are distinct, like GenQuery.
+        return iter([dict(res) for res in dict.fromkeys(tuple(res.items()) for res in results)])
+
+
+class FakeCatalog:
+    """Catalog with a collection tree, its data objects and metadata."""
+
+    def __init__(self, root):
+        self.n_queries = 0
+        self.collections = [{icat.COLL_NAME: f"{root}{sub}", icat.COLL_ID: i}
+                            for i, sub in enumerate(["", "/x", "/x/y"])]
+        self.data_objects = [
+            {icat.COLL_NAME: coll, icat.DATA_NAME: name, icat.DATA_ID: 10 + i,
+             icat.DATA_CHECKSUM: f"sha2:{name}"}
+            for i, (coll, name) in enumerate([(root, "a.txt"), (f"{root}/x", "b.txt"),
+                                              (f"{root}/x/y", "c.txt")])]
+        self.coll_meta = [
+            {icat.COLL_NAME: coll, icat.META_COLL_ATTR_NAME: name,
+             icat.META_COLL_ATTR_VALUE: value, icat.META_COLL_ATTR_UNITS: units}
+            for coll, name, value, units in [(root, "project", "p1", ""),
+                                             (root, "org_internal", "1", ""),
+                                             (f"{root}/x/y", "level", "2", "")]]
+        self.data_meta = [
+            {icat.COLL_NAME: coll, icat.DATA_NAME: obj, icat.META_DATA_ATTR_NAME: name,
+             icat.META_DATA_ATTR_VALUE: value, icat.META_DATA_ATTR_UNITS: units}
+            for coll, obj, name, value, units in [(root, "a.txt", "mass", "10", "kg"),
+                                                  (root, "a.txt", "author", "Ben", ""),
+                                                  (f"{root}/x/y", "c.txt", "author", "Emma", "")]]
+
+    def query(self, *columns):
+        return FakeCatalogQuery(self, columns)
+
+
+def test_walk_metadata(monkeypatch, make_session):
+    session = make_session(irods_session=FakeCatalog("/testzone/home/testuser/root"))
+    monkeypatch.setattr(IrodsPath, "collection_exists", lambda self: not str(self).endswith("txt"))
+    root = IrodsPath(session, "~", "root")
+    items = [root, root / "x", root / "x" / "y", root / "x" / "y" / "c.txt", root / "x" / "b.txt",
+             root / "a.txt"]
+    with pytest.warns(UserWarning, match="org_internal"):
+        tree_meta = _walk_metadata(root, items)
+    assert session.irods_session.n_queries == 8
+    meta_dict = _empty_metadict(root)
+    for ipath in items:
+        _add_to_metadict(meta_dict, ipath, root, tree_meta[str(ipath)])
+    assert [item["rel_path"] for item in meta_dict["items"]] == [
+        ".", "x", "x/y", "x/y/c.txt", "x/b.txt", "a.txt"]
+    assert meta_dict["items"][0] == {"rel_path": ".", "type": "collection", "name": "root",
+                                     "irods_id": 0, "metadata": [("project", "p1", "")]}
+    assert meta_dict["items"][5] == {"rel_path": "a.txt", "type": "data object",
+                                     "name": "a.txt", "irods_id": 10, "checksum": "sha2:a.txt",
+                                     "metadata": [("mass", "10", "kg"), ("author", "Ben", "")]}
+    assert meta_dict["items"][3]["metadata"] == [("author", "Emma", "")]
+
+    # Only the levels of the items are queried.
+    session.irods_session.n_queries = 0
+    with pytest.warns(UserWarning, match="org_internal"):
+        tree_meta = _walk_metadata(root, [root, root / "x", root / "a.txt"])
+    assert set(tree_meta) == {str(root), str(root / "x"), str(root / "a.txt")}
+    assert session.irods_session.n_queries == 6
+
+
+def test_plan_meta_changes(monkeypatch, make_session):
+    session = make_session(irods_session=FakeCatalog("/testzone/home/testuser/root"))
+    monkeypatch.setattr(IrodsPath, "collection_exists", lambda self: not str(self).endswith("txt"))
+    root = IrodsPath(session, "~", "root")
+    archive = {"items": [
+        {"rel_path": ".", "metadata": [["project", "p1", ""], ["project", "p2", ""]]},
+        {"rel_path": "a.txt", "metadata": [["mass", "10", "kg"], ["author", "Ben", None],
+                                           ["mass", "10", "kg"]]},
+        {"rel_path": "x/y/c.txt", "metadata": [["author", "Ben", ""]]},
+    ]}
+    with pytest.warns(UserWarning, match="org_internal"):
+        changes = _plan_meta_changes(root, archive)
+    assert changes == [
+        MetaChange(str(root), False, [("project", "p2", "")], []),
+        MetaChange(str(root / "a.txt"), True, [], []),
+        MetaChange(str(root / "x/y/c.txt"), True, [("author", "Ben", "")], []),
+    ]
+
+    archive["items"].append({"rel_path": "missing.txt", "metadata": []})
+    monkeypatch.setattr(IrodsPath, "exists", lambda self: False)
+    with pytest.raises(ValueError), pytest.warns(UserWarning):
+        _plan_meta_changes(root, archive)
+
+
+def test_plan_meta_changes_diff(monkeypatch, tmp_path, make_session):
+    session = make_session(irods_session=FakeCatalog("/testzone/home/testuser/root"))
+    monkeypatch.setattr(IrodsPath, "collection_exists", lambda self: not str(self).endswith("txt"))
+    root = IrodsPath(session, "~", "root")
+    archive = {"items": [
+        {"rel_path": ".", "metadata": [["project", "p1", ""], ["project", "p2", ""]]},
+        {"rel_path": "a.txt", "metadata": [["mass", "10", "kg"], ["author", "Ben", None]]},
+        {"rel_path": "x/y", "metadata": []},
+        {"rel_path": "x/y/c.txt", "metadata": [["author", "Ben", ""]]},
+    ]}
+    meta_fp = tmp_path / "meta_archive.json"
+    meta_fp.write_text(json.dumps(archive), encoding="utf-8")
+    ops = Operations()
+    ops.add_meta_upload(root, meta_fp, diff=True)
+    assert next(ops._journal_records())["diff"]
+    with pytest.warns(UserWarning, match="org_internal"):
+        report = ops.plan_meta_upload()
+    # Blacklisted entries on the server are never removed.
+    assert report.changes == [
+        MetaChange(str(root), False, [("project", "p2", "")], []),
+        MetaChange(str(root / "x/y"), False, [], [("level", "2", "")]),
+        MetaChange(str(root / "x/y/c.txt"), True, [("author", "Ben", "")],
+                   [("author", "Emma", "")]),
+    ]
+    assert str(report).startswith("Would change metadata of 3 items: 2 entries added, "
+                                  "2 entries removed.")
+    assert "\n  - author: Emma\n  + author: Ben" in str(report)
@@ -1,8 +1,13 @@
 from pathlib import PurePosixPath
+from types import SimpleNamespace
 
+import pytest
+from irods.models import Collection, DataObject
 from pytest import mark
 
+import ibridges.path
 from ibridges import IrodsPath
+from ibridges.path import CachedIrodsPath, _iter_data_objects, _iter_subcoll_paths, stat_paths
 
 
 class MockIrodsSession:
@@ -60,3 +65,228 @@ def test_absolute_path(input, abs_path, name, parent):
 def test_join_path(path, to_join, result):
     irods_path = IrodsPath(MockIrodsSession(), path)
     assert str(irods_path.joinpath(*to_join)._path) == result
+
+
+def test_equal_and_hash():
+    session = MockIrodsSession()
+    ipath = IrodsPath(session, "~", "x")
+    same_paths = [IrodsPath(session, "/testzone/home/testuser/x"), IrodsPath(session, "x"),
+                  CachedIrodsPath(session, 1, True, None, "~/x")]
+    for other in same_paths:
+        assert ipath == other
+        assert hash(ipath) == hash(other)
+    assert ipath != IrodsPath(session, "~", "y")
+    assert ipath != "/testzone/home/testuser/x"
+    assert len({ipath, *same_paths}) == 1
+
+    # The absolute path follows changes of the home collection.
+    session.home = "/testzone/home/other"
+    assert str(ipath) == "/testzone/home/other/x"
+
+
+def test_slots_and_join():
+    session = MockIrodsSession()
+    ipath = CachedIrodsPath(session, 1, False, None, "~", "coll")
+    with pytest.raises(AttributeError):
+        ipath.some_attribute = 1
+    assert ipath.parts == ("~", "coll")
+    new_ipath = ipath / "obj"
+    assert type(new_ipath) is IrodsPath
+    assert str(new_ipath) == "/testzone/home/testuser/coll/obj"
+    assert IrodsPath(session, "/").name == "/"
+    assert str(IrodsPath(session, "/").parent) == "/"
+
+
+class FakeCollection:
+    path = "/testzone/home/testuser/root"
+
+
+# Collection path -> (data objects, subcollections).
+TREE = {
+    "/testzone/home/testuser/root": ([("b.txt", 2, None), ("a.txt", 1, None)], ["y", "x"]),
+    "/testzone/home/testuser/root/x": ([("c.txt", 3, None)], []),
+    "/testzone/home/testuser/root/y": ([], ["z"]),
+    "/testzone/home/testuser/root/y/z": ([("d.txt", 4, None)], []),
+}
+
+
+@pytest.fixture
+def fake_tree(monkeypatch):
+    monkeypatch.setattr(IrodsPath, "collection", property(lambda self: FakeCollection()))
+    monkeypatch.setattr("ibridges.path._list_data_objects",
+                        lambda _session, coll: sorted(TREE[coll][0]))
+    monkeypatch.setattr("ibridges.path._list_subcollections",
+                        lambda _session, coll: sorted(TREE[coll][1]))
+    def _level(path, coll):
+        return path.count("/") - coll.count("/")
+
+    # The server orders the rows bytewise, which differs from the order of the walk.
+    def _iter_subcoll_paths(_session, coll, depth=None, ordered=False):
+        paths = [path for path in TREE if path.startswith(coll + "/")
+                 and (depth is None or _level(path, coll) <= depth)]
+        return iter(sorted(paths) if ordered else paths)
+
+    def _iter_data_objects(_session, coll, depth=None, ordered=False):
+        rows = [(path, *obj) for path, (objs, _) in TREE.items() for obj in objs
+                if (path == coll or path.startswith(coll + "/"))
+                and (depth is None or _level(path, coll) < depth)]
+        return iter(sorted(rows, key=lambda row: row[0]) if ordered else rows)
+
+    monkeypatch.setattr("ibridges.path._iter_subcoll_paths", _iter_subcoll_paths)
+    monkeypatch.setattr("ibridges.path._iter_data_objects", _iter_data_objects)
+
+
+def test_walk(fake_tree):
+    root = IrodsPath(MockIrodsSession(), "~", "root")
+    rel_paths = [str(ipath.relative_to(root)) for ipath in root.walk()]
+    assert rel_paths == [".", "x", "x/c.txt", "y", "y/z", "y/z/d.txt", "a.txt", "b.txt"]
+    rel_paths = [str(ipath.relative_to(root)) for ipath in root.walk(depth=1)]
+    assert rel_paths == [".", "x", "y", "a.txt", "b.txt"]
+
+    walked = list(root.walk(ordered=False))
+    assert sorted(str(ipath.relative_to(root)) for ipath in walked) == sorted(
+        [".", "x", "x/c.txt", "y", "y/z", "y/z/d.txt", "a.txt", "b.txt"])
+    assert sum(ipath.dataobject_exists() for ipath in walked[1:]) == 4
+    assert sorted(str(ipath.relative_to(root)) for ipath in root.walk(depth=1, ordered=False)
+                  ) == [".", "a.txt", "b.txt", "x", "y"]
+
+
+def test_walk_server_order(fake_tree, monkeypatch):
+    # 'x-y' is ordered before 'x/w' by the server, but after the subtree of 'x' by the walk.
+    root_path = "/testzone/home/testuser/root"
+    monkeypatch.setitem(TREE, root_path, (TREE[root_path][0], ["x", "x-y", "y"]))
+    monkeypatch.setitem(TREE, f"{root_path}/x-y", ([("e.txt", 5, None)], []))
+    monkeypatch.setitem(TREE, f"{root_path}/x/w", ([("f.txt", 6, None), ("f.txt", 6, None)], []))
+    n_queries = []
+    for func_name in ["_iter_subcoll_paths", "_iter_data_objects"]:
+        func = getattr(ibridges.path, func_name)
+        monkeypatch.setattr(ibridges.path, func_name, lambda *args, func=func, **kwargs: (
+            n_queries.append(1), func(*args, **kwargs))[1])
+    root = IrodsPath(MockIrodsSession(), "~", "root")
+    assert [str(ipath.relative_to(root)) for ipath in root.walk()] == [
+        ".", "x", "x/w", "x/w/f.txt", "x/c.txt", "x-y", "x-y/e.txt", "y", "y/z", "y/z/d.txt",
+        "a.txt", "b.txt"]
+    # The whole tree is retrieved with two queries.
+    assert len(n_queries) == 2
+    assert [str(ipath.relative_to(root)) for ipath in root.walk(depth=2)] == [
+        ".", "x", "x/w", "x/c.txt", "x-y", "x-y/e.txt", "y", "y/z", "a.txt", "b.txt"]
+
+
+class RecordingQuery:
+    def __init__(self, queries, columns):
+        self.filters = []
+        self.columns = columns
+        queries.append(self)
+
+    def filter(self, *criteria):
+        self.filters.extend((crit.op, crit.value) for crit in criteria)
+        return self
+
+    def __iter__(self):
+        return iter([])
+
+
+@pytest.mark.parametrize("depth,n_queries", [(None, 2), (0, 0), (1, 1), (3, 2)])
+def test_depth_pushdown(depth, n_queries):
+    session = MockIrodsSession()
+    queries = []
+    session.irods_session = SimpleNamespace(
+        query=lambda *columns: RecordingQuery(queries, columns))
+    coll = "/testzone/home/testuser/root"
+    assert list(_iter_data_objects(session, coll, depth)) == []
+    assert len(queries) == n_queries
+    if depth == 1:
+        assert queries[0].filters == [("=", coll)]
+    if depth == 3:
+        assert queries[1].filters == [("like", coll + "/%"), ("not like", coll + "/%/%/%")]
+
+    queries.clear()
+    assert list(_iter_subcoll_paths(session, coll, depth)) == []
+    assert len(queries) == (0 if depth == 0 else 1)
+    if depth == 1:
+        assert queries[0].filters == [("=", coll)]
+    if depth == 3:
+        assert queries[0].filters == [("like", coll + "/%"), ("not like", coll + "/%/%/%/%")]
+
+
+@pytest.mark.parametrize("depth", [None, 0, 1, 2])
+def test_parallel_walk(fake_tree, monkeypatch, depth, make_session):
+    # Make the tree wide enough to be split into subtrees.
+    root_path = "/testzone/home/testuser/root"
+    objects, sub_names = TREE[root_path]
+    monkeypatch.setitem(TREE, root_path, (objects, sub_names + [f"w{i}" for i in range(5)]))
+    for i in range(5):
+        monkeypatch.setitem(TREE, f"{root_path}/w{i}", ([("e.txt", 5, None)], ["v"]))
+        monkeypatch.setitem(TREE, f"{root_path}/w{i}/v", ([("f.txt", 6, None)], []))
+    session = make_session()
+    root = IrodsPath(session, "~", "root")
+    expected = [str(ipath) for ipath in root.walk(depth=depth)]
+    for max_workers in [2, 4]:
+        assert [str(ipath) for ipath in root.walk(depth=depth, max_workers=max_workers)
+                ] == expected
+        assert sorted(str(ipath) for ipath in root.walk(depth=depth, ordered=False,
+                                                         max_workers=max_workers)
+                      ) == sorted(expected)
+    assert all(clone.closed for clone in session.clones)
+    assert len(session.clones) > 0 or depth in (0, 1)
+
+
+class CatalogQuery:
+    """Query on a small catalog, supporting '=' and 'in' conditions."""
+
+    def __init__(self, catalog, columns):
+        self.catalog = catalog
+        self.columns = columns
+        self.criteria = []
+        catalog.n_queries += 1
+
+    def filter(self, *criteria):
+        self.criteria.extend(criteria)
+        return self
+
+    def _match(self, row):
+        return all(row[crit.query_key] == crit.value if crit.op == "=" else
+                   row[crit.query_key] in crit.value for crit in self.criteria)
+
+    def __iter__(self):
+        if self.columns[0] is Collection.name:
+            rows = [{Collection.name: coll} for coll in self.catalog.collections]
+        else:
+            rows = [{Collection.name: coll, DataObject.name: name, DataObject.size: size,
+                     DataObject.checksum: checksum}
+                    for coll, name, size, checksum in self.catalog.objects]
+        return iter([row for row in rows if self._match(row)])
+
+
+class Catalog:
+    collections = ["/testzone/home/testuser", "/testzone/home/testuser/coll"]
+    # The second replica of a.txt has the same size and checksum.
+    objects = [("/testzone/home/testuser/coll", "a.txt", 1, "sha2:a"),
+               ("/testzone/home/testuser/coll", "a.txt", 1, "sha2:a"),
+               ("/testzone/home/testuser/coll", "b.txt", 2, None),
+               ("/testzone/home/testuser", "c.txt", 3, "sha2:c")]
+    n_queries = 0
+
+    def query(self, *columns):
+        return CatalogQuery(self, columns)
+
+
+@pytest.mark.parametrize("max_workers", [1, 3])
+def test_stat_paths(max_workers, make_session):
+    catalog = Catalog()
+    session = make_session(irods_session=catalog)
+    paths = ["~/coll/a.txt", "~/coll/missing.txt", "~/coll", IrodsPath(session, "~/c.txt"),
+             "/testzone/home/testuser/coll/b.txt", "~/coll/a.txt", "~/missing/d.txt"]
+    ipaths = stat_paths(session, paths, max_workers=max_workers)
+    assert [str(ipath) for ipath in ipaths] == [str(IrodsPath(session, path)) for path in paths]
+    assert [ipath.dataobject_exists() for ipath in ipaths] == [
+        True, False, False, True, True, True, False]
+    assert [ipath.collection_exists() for ipath in ipaths] == [
+        False, False, True, False, False, False, False]
+    assert ipaths[0].size == 1 and ipaths[0].checksum == "sha2:a"
+    assert ipaths[3].size == 3
+    with pytest.raises(ValueError):
+        _ = ipaths[1].size
+    # One query per parent collection and one for all collections.
+    assert catalog.n_queries == 4
+    assert (len(session.clones) > 0) == (max_workers > 1)
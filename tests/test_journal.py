@@ -0,0 +1,74 @@
+from pathlib import Path
+
+import pytest
+
+from ibridges.executor import Operations
+from ibridges.journal import TransferJournal, journal_key
+from ibridges.path import IrodsPath
+
+
+class MockIrodsSession:
+    zone = "testzone"
+    home = "/testzone/home/testuser"
+    irods_session = None
+
+
+def test_journal(tmpdir):
+    journal_fp = Path(tmpdir) / "test.journal"
+    records = [{"op": "upload", "key": journal_key("upload", f"file_{i}")} for i in range(4)]
+    with TransferJournal(journal_fp) as journal:
+        assert not journal.has_plan
+        journal.write_plan({"resc_name": "resc"}, records)
+        with pytest.raises(ValueError):
+            journal.write_plan({}, records)
+        journal.started("upload:file_0")
+        journal.completed("upload:file_0")
+        journal.started("upload:file_1")
+        journal.failed("upload:file_1", ValueError("error"))
+        journal.started("upload:file_2")
+
+    # Simulate a process that was killed while writing.
+    with open(journal_fp, "a", encoding="utf-8") as handle:
+        handle.write('{"event": "compl')
+
+    with pytest.warns(UserWarning):
+        journal = TransferJournal(journal_fp)
+    assert journal.has_plan
+    assert journal.header["resc_name"] == "resc"
+    assert journal.is_completed("upload:file_0")
+    assert not journal.is_completed("upload:file_2")
+    assert journal.failed_keys == {"upload:file_1"}
+    assert [rec["key"] for rec in journal.pending()] == [f"upload:file_{i}" for i in range(1, 4)]
+
+
+def test_resume_operations(tmpdir):
+    session = MockIrodsSession()
+    journal_fp = Path(tmpdir) / "test.journal"
+    ops = Operations()
+    for i in range(5):
+        ops.add_upload(Path(tmpdir) / f"file_{i}", IrodsPath(session, "~", f"file_{i}"))
+    ops.add_create_coll(IrodsPath(session, "~", "coll"))
+    ops.resc_name = "resc"
+
+    transferred = []
+
+    def _transfer(session, src, dest, **kwargs):
+        if src.name == "file_3":
+            raise ValueError("Connection lost")
+        transferred.append(src)
+
+    with TransferJournal(journal_fp) as journal:
+        journal.write_plan(ops._journal_header(), ops._journal_records())
+        with pytest.warns(UserWarning):
+            ops._execute_transfers(_transfer, session, ops.upload, None, ignore_err=True,
+                                   journal=journal, journal_op="upload")
+    assert len(transferred) == 4
+
+    new_ops = Operations.from_journal(session, journal_fp)
+    assert new_ops.resc_name == "resc"
+    assert new_ops.create_collection == {"/testzone/home/testuser/coll"}
+    assert [(lpath, str(ipath)) for lpath, ipath in new_ops.upload] == [
+        (Path(tmpdir) / "file_3", "/testzone/home/testuser/file_3")]
+
+    with pytest.raises(ValueError):
+        Operations.from_journal(session, Path(tmpdir) / "missing.journal")
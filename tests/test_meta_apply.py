@@ -0,0 +1,129 @@
+import threading
+import warnings
+
+import irods.exception
+import pytest
+from irods.meta import iRODSMeta
+from irods.models import Collection, DataObject
+
+import ibridges.meta_apply
+from ibridges.meta_apply import MetaChange, apply_meta_changes
+from ibridges.retry import RetryPolicy
+
+
+class FakeMetadataManager:
+    def __init__(self, fail_on=()):
+        self.fail_on = fail_on
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def apply_atomic_operations(self, model, path, *operations):
+        if path in self.fail_on:
+            raise ValueError(f"Cannot change {path}")
+        with self.lock:
+            self.requests.append((model, path, [(op.operation, op.avu.name, op.avu.value)
+                                                for op in operations]))
+
+    def add(self, model, path, avu):
+        with self.lock:
+            self.requests.append((model, path, [("add", avu.name, avu.value)]))
+
+    def remove(self, model, path, avu):
+        with self.lock:
+            self.requests.append((model, path, [("remove", avu.name, avu.value)]))
+
+
+@pytest.fixture
+def meta_session(make_session, make_irods_session):
+    def _meta_session(manager):
+        return make_session(irods_session=make_irods_session(metadata=manager))
+    return _meta_session
+
+
+def _changes(n_items):
+    return [MetaChange(f"/zone/home/user/obj_{i}", i % 2 == 0, [("author", f"a{i}", "")],
+                       [("author", "old", "")] if i < 3 else [])
+            for i in range(n_items)]
+
+
+@pytest.mark.parametrize("max_workers", [1, 3])
+def test_apply_meta_changes(max_workers, meta_session):
+    session = meta_session(FakeMetadataManager(fail_on=["/zone/home/user/obj_5"]))
+    changes = _changes(10) + [MetaChange("/zone/home/user/unchanged", True, [], [])]
+    report = apply_meta_changes(session, changes, max_workers=max_workers)
+    requests = session.irods_session.metadata.requests
+    # One request per changed item, with the removes before the adds.
+    assert len(requests) == 9
+    assert sorted(requests, key=lambda req: req[1])[0] == (
+        DataObject, "/zone/home/user/obj_0", [("remove", "author", "old"),
+                                              ("add", "author", "a0")])
+    assert all(model is Collection for model, path, _ in requests if path.endswith("_1"))
+    assert len(report.changes) == 9
+    assert report.n_added == 9 and report.n_removed == 3
+    assert [path for path, _ in report.failed] == ["/zone/home/user/obj_5"]
+    assert "Failed for 1 items" in str(report)
+    assert (len(session.clones) > 0) == (max_workers > 1)
+
+
+def test_apply_meta_changes_dry_run_and_old_server(meta_session):
+    session = meta_session(FakeMetadataManager())
+    report = apply_meta_changes(session, _changes(4), dry_run=True)
+    assert session.irods_session.metadata.requests == []
+    assert str(report).startswith("Would change metadata of 4 items: 4 entries added, "
+                                  "3 entries removed.")
+
+    session.server_version = (4, 2, 7)
+    with pytest.warns(UserWarning, match="atomic"):
+        report = apply_meta_changes(session, _changes(1))
+    assert session.irods_session.metadata.requests == [
+        (DataObject, "/zone/home/user/obj_0", [("remove", "author", "old")]),
+        (DataObject, "/zone/home/user/obj_0", [("add", "author", "a0")])]
+
+
+class LostReplyMetadataManager:
+    """Metadata manager that applies the changes, but loses the reply of the first request."""
+
+    def __init__(self, avus):
+        self.avus = {path: set(path_avus) for path, path_avus in avus.items()}
+        self.n_requests = 0
+
+    def _request(self, path, removes, adds):
+        self.n_requests += 1
+        if removes - self.avus[path]:
+            raise irods.exception.CAT_SUCCESS_BUT_WITH_NO_INFO()
+        if adds & self.avus[path]:
+            raise irods.exception.CATALOG_ALREADY_HAS_ITEM_BY_THAT_NAME()
+        self.avus[path] = (self.avus[path] - removes) | adds
+        if self.n_requests == 1:
+            raise irods.exception.NetworkException("Could not receive server response")
+
+    def get(self, model, path):
+        return [iRODSMeta(*avu) for avu in self.avus[path]]
+
+    def apply_atomic_operations(self, model, path, *operations):
+        avus = {op: {(o.avu.name, o.avu.value, o.avu.units) for o in operations
+                     if o.operation == op} for op in ("remove", "add")}
+        self._request(path, avus["remove"], avus["add"])
+
+    def add(self, model, path, avu):
+        self._request(path, set(), {(avu.name, avu.value, avu.units)})
+
+    def remove(self, model, path, avu):
+        self._request(path, {(avu.name, avu.value, avu.units)}, set())
+
+
+@pytest.mark.parametrize("server_version", [(4, 3, 1), (4, 2, 7)])
+def test_apply_meta_changes_lost_reply(monkeypatch, server_version, meta_session):
+    monkeypatch.setattr(ibridges.meta_apply, "DEFAULT_POLICY", RetryPolicy(base_delay=0))
+    path = "/zone/home/user/obj"
+    manager = LostReplyMetadataManager({path: [("author", "old", "")]})
+    session = meta_session(manager)
+    session.server_version = server_version
+    change = MetaChange(path, True, [("author", "new", "")], [("author", "old", "")])
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        report = apply_meta_changes(session, [change])
+    # The request that was applied before its reply was lost does not fail the item.
+    assert report.failed == []
+    assert report.changes == [change]
+    assert manager.avus[path] == {("author", "new", "")}
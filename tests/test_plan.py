@@ -0,0 +1,119 @@
+from pathlib import Path
+
+import pytest
+
+from ibridges.executor import Operations
+from ibridges.path import CachedIrodsPath, IrodsPath
+from ibridges.plan import TransferList, get_plan_memory_limit, set_plan_memory_limit
+
+
+class MockIrodsSession:
+    zone = "testzone"
+    home = "/testzone/home/testuser"
+    irods_session = None
+
+
+def _transfers(session, n_transfers):
+    transfers = []
+    for i in range(n_transfers):
+        lpath = Path("data", f"dir_{i % 3}", f"file_{i}.txt")
+        if i % 3 == 0:
+            ipath = IrodsPath(session, "~", f"dir_{i % 3}", f"file_{i}.txt")
+        elif i % 3 == 1:
+            ipath = CachedIrodsPath(session, None, False, None, "~", f"dir_{i % 3}", f"obj_{i}")
+        else:
+            ipath = CachedIrodsPath(session, i, True, f"sha2:{i}", "/testzone/x", f"obj_{i}")
+        transfers.append((lpath, ipath))
+    return transfers
+
+
+def _check_equal(transfer_list, transfers):
+    assert len(transfer_list) == len(transfers)
+    for (lpath, ipath), (orig_lpath, orig_ipath) in zip(transfer_list, transfers):
+        assert lpath == orig_lpath
+        assert str(ipath) == str(orig_ipath)
+        assert type(ipath) is type(orig_ipath)
+        assert ipath.session is orig_ipath.session
+        if isinstance(orig_ipath, CachedIrodsPath):
+            assert ipath.dataobject_exists() == orig_ipath.dataobject_exists()
+            assert ipath._size == orig_ipath._size
+            assert ipath._checksum == orig_ipath._checksum
+
+
+def test_transfer_list():
+    session = MockIrodsSession()
+    transfers = _transfers(session, 30)
+    uploads = TransferList(irods_source=False, transfers=transfers)
+    assert not uploads.spilled
+    _check_equal(uploads, transfers)
+
+    downloads = TransferList(irods_source=True)
+    downloads.append(transfers[2][1], transfers[2][0])
+    assert list(downloads)[0][1] == transfers[2][0]
+    assert bool(downloads)
+    downloads.clear()
+    assert len(downloads) == 0
+    assert not downloads
+
+
+def test_transfer_list_spill():
+    session = MockIrodsSession()
+    transfers = _transfers(session, 100)
+    uploads = TransferList(irods_source=False, transfers=transfers, memory_limit=2000)
+    assert uploads.spilled
+    _check_equal(uploads, transfers)
+    uploads.extend(transfers)
+    _check_equal(uploads, transfers + transfers)
+    uploads.clear()
+    assert not uploads.spilled
+    assert len(uploads) == 0
+
+
+def test_other_objects():
+    uploads = TransferList(irods_source=False, memory_limit=200)
+    for i in range(10):
+        uploads.append(Path(f"file_{i}"), f"obj_{i}")
+    assert [(str(lpath), ipath) for lpath, ipath in uploads] == [
+        (f"file_{i}", f"obj_{i}") for i in range(10)]
+
+
+def test_operations_memory_limit():
+    session = MockIrodsSession()
+    assert get_plan_memory_limit() is None
+    set_plan_memory_limit(1000)
+    try:
+        ops = Operations()
+        for lpath, ipath in _transfers(session, 50):
+            ops.add_upload(lpath, ipath)
+    finally:
+        set_plan_memory_limit(None)
+    assert ops.upload.spilled
+    assert len(ops.upload) == 50
+
+    ops.upload = [transfer for transfer in ops.upload if "file_1" in str(transfer[0])]
+    assert isinstance(ops.upload, TransferList)
+    assert len(ops.upload) == 11
+    with pytest.raises(ValueError):
+        set_plan_memory_limit(0)
+
+
+@pytest.mark.parametrize("memory_limit", [None, 2000])
+def test_list_interface(memory_limit):
+    session = MockIrodsSession()
+    transfers = _transfers(session, 100)
+    uploads = TransferList(irods_source=False, transfers=transfers, memory_limit=memory_limit)
+    assert uploads.spilled == (memory_limit is not None)
+    assert uploads[0] == transfers[0]
+    assert uploads[-1] == transfers[-1]
+    assert uploads[99] == transfers[99]
+    assert uploads[10:20] == transfers[10:20]
+    assert uploads[::-7] == transfers[::-7]
+    with pytest.raises(IndexError):
+        uploads[100]  # pylint: disable=pointless-statement
+    assert transfers[42] in uploads
+    assert (Path("other"), transfers[0][1]) not in uploads
+    assert uploads == transfers
+    assert uploads == TransferList(irods_source=False, transfers=transfers)
+    assert uploads != transfers[:-1]
+    assert uploads != transfers[:-1] + [transfers[0]]
+    assert TransferList(irods_source=True) == []
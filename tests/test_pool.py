@@ -0,0 +1,117 @@
+import pickle
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import ibridges.path
+import ibridges.pool
+from ibridges.path import IrodsPath
+from ibridges.pool import SessionPool, borrowed
+
+
+@pytest.fixture
+def pool(monkeypatch, make_session):
+    monkeypatch.setattr(ibridges.pool, "Session", make_session)
+    with SessionPool({"irods_host": "example.org"}, irods_home="/zone/home/user",
+                     max_size=2) as session_pool:
+        yield session_pool
+
+
+def test_pool_borrow(pool):
+    shared = pool.current()
+    assert pool.home == "/zone/home/user"
+    with pool.session() as session:
+        assert session is not shared
+        assert pool.current() is session
+        assert pool.irods_session == session.irods_session
+        with borrowed(pool) as same_pool:
+            assert same_pool is pool
+            assert pool.current() is not session
+        assert pool.current() is session
+    assert pool.current() is shared
+    assert pool.size == 2
+
+    # Idle sessions are reused.
+    with pool.session() as session_2:
+        assert session_2 is session
+
+
+def test_pool_max_size(pool):
+    session_1 = pool.acquire()
+    session_2 = pool.acquire()
+    with pytest.raises(TimeoutError):
+        pool.acquire(timeout=0.01)
+
+    # Other threads get the session once it is released.
+    result = []
+    thread = threading.Thread(target=lambda: result.append(pool.acquire(timeout=5)))
+    thread.start()
+    pool.release(session_1)
+    thread.join()
+    assert result == [session_1]
+    pool.release(session_2)
+    pool.release(session_1)
+
+
+def test_pool_health_and_expiry(pool):
+    session = pool.acquire()
+    pool.release(session)
+    session.healthy = False
+    pool.health_check_interval = 0
+    new_session = pool.acquire()
+    assert new_session is not session
+    assert session.closed
+    pool.release(new_session)
+
+    pool.idle_timeout = 0
+    time.sleep(0.01)
+    with pool.session() as other_session:
+        assert other_session is not new_session
+    assert new_session.closed
+
+
+def test_pool_close_and_pickle(pool):
+    pool_copy = pickle.loads(pickle.dumps(pool))
+    assert pool_copy.max_size == 2
+    assert pool_copy.size == 0
+    assert pool_copy.current() is not pool.current()
+
+    shared = pool.current()
+    session = pool.acquire()
+    pool.close()
+    assert shared.closed
+    pool.release(session)
+    assert session.closed
+    with pytest.raises(ValueError):
+        pool.acquire()
+    with pytest.raises(ValueError):
+        SessionPool(max_size=0)
+
+
+@pytest.mark.parametrize("ordered", [True, False])
+def test_pool_walk(pool, monkeypatch, ordered):
+    query_sessions = []
+
+    def query(rows):
+        def _query(session, *_args, **_kwargs):
+            query_sessions.append(session)
+            yield from rows
+        return _query
+    monkeypatch.setattr(IrodsPath, "collection", property(
+        lambda self: SimpleNamespace(path="/zone/home/user/root")))
+    monkeypatch.setattr(ibridges.path, "_iter_subcoll_paths", query(["/zone/home/user/root/sub"]))
+    monkeypatch.setattr(ibridges.path, "_iter_data_objects", query(
+        [("/zone/home/user/root", f"{i}.txt", 1, None) for i in range(3)]))
+    shared = pool.current()
+    walked = []
+    # The rows are streamed from a session of the pool, which is not borrowed by the thread,
+    # so that the pool can still be used by the caller while the walk is paused.
+    for ipath in IrodsPath(pool, "~", "root").walk(ordered=ordered):
+        assert pool.current() is shared
+        walked.append(str(ipath))
+    assert len(walked) == 5
+    assert len(query_sessions) == 2
+    assert all(session is not pool and session is not shared for session in query_sessions)
+    assert pool._n_borrowed == 0
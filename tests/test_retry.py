@@ -0,0 +1,148 @@
+from types import SimpleNamespace
+
+import irods.exception
+import pytest
+
+import ibridges.meta
+from ibridges.meta import MetaData
+from ibridges.retry import RetryPolicy, reconnect_session
+from ibridges.telemetry import TransferTelemetry
+
+
+class FlakyFunction():
+    def __init__(self, n_fail, error):
+        self.n_fail = n_fail
+        self.error = error
+        self.n_calls = 0
+
+    def __call__(self, value, extra=0):
+        self.n_calls += 1
+        if self.n_calls <= self.n_fail:
+            raise self.error
+        return value + extra
+
+
+@pytest.mark.parametrize("error", [
+    ConnectionResetError("reset"), TimeoutError(),
+    irods.exception.NetworkException("Could not receive server response")])
+def test_retry_transient(error):
+    func = FlakyFunction(2, error)
+    policy = RetryPolicy(max_attempts=3, base_delay=0)
+    assert policy.call(func, 1, extra=2) == 3
+    assert func.n_calls == 3
+
+    func = FlakyFunction(3, error)
+    with pytest.raises(type(error)):
+        policy.call(func, 1)
+    assert func.n_calls == 3
+
+
+def test_retry_permanent():
+    func = FlakyFunction(1, PermissionError("Cannot read"))
+    with pytest.raises(PermissionError):
+        RetryPolicy(base_delay=0).call(func, 1)
+    assert func.n_calls == 1
+
+    # The cause of the error is checked as well.
+    error = ValueError("wrapped")
+    error.__cause__ = ConnectionAbortedError()
+    assert RetryPolicy().is_transient(error)
+
+
+def test_delay():
+    policy = RetryPolicy(base_delay=0.5, max_delay=3)
+    for attempt, max_delay in [(1, 0.5), (2, 1.0), (3, 2.0), (4, 3), (10, 3)]:
+        delays = [policy.delay(attempt) for _ in range(100)]
+        assert all(0 <= delay <= max_delay for delay in delays)
+        assert max(delays) > 0.5*max_delay
+    with pytest.raises(ValueError):
+        RetryPolicy(max_attempts=0)
+
+
+def test_retry_telemetry():
+    telemetry = TransferTelemetry()
+    with telemetry.measure("upload", "src", "dest", 10):
+        RetryPolicy(base_delay=0).call(FlakyFunction(2, ConnectionResetError()), 1)
+    assert telemetry.summary().n_retries == 2
+
+
+@pytest.mark.parametrize("healthy", [True, False])
+def test_reconnect(healthy, fake_session):
+    fake_session.healthy = healthy
+    old_session = fake_session.irods_session
+    policy = RetryPolicy(base_delay=0)
+    policy.call(FlakyFunction(1, ConnectionResetError()), 1, reconnect=fake_session)
+    assert fake_session.n_connect == int(not healthy)
+    assert (fake_session.irods_session is old_session) == healthy
+    # The connections of the replaced session are released.
+    assert old_session.cleaned_up == (not healthy)
+    reconnect_session(fake_session)
+
+
+def test_retry_iterate():
+    n_calls = []
+
+    def pages(n_items, fail_at):
+        n_calls.append(1)
+        for i_item in range(n_items):
+            if len(n_calls) == 1 and i_item == fail_at:
+                raise ConnectionResetError("reset")
+            yield i_item
+
+    policy = RetryPolicy(max_attempts=2, base_delay=0)
+    # Items that were yielded before the failure are not yielded again.
+    assert list(policy.iterate(pages, 5, fail_at=3)) == [0, 1, 2, 3, 4]
+    assert len(n_calls) == 2
+
+    n_calls.clear()
+    with pytest.raises(ConnectionResetError):
+        list(RetryPolicy(max_attempts=1).iterate(pages, 5, fail_at=3))
+
+
+class LostResponseMetadata():
+    """Metadata manager that makes the change, but loses the answer of the first call."""
+
+    def __init__(self):
+        self.avus = []
+        self.n_calls = 0
+
+    def items(self):
+        return [SimpleNamespace(name=name, value=value, units=units)
+                for name, value, units in self.avus]
+
+    def add(self, *avu):
+        self.n_calls += 1
+        if avu in self.avus:
+            raise irods.exception.CATALOG_ALREADY_HAS_ITEM_BY_THAT_NAME()
+        self.avus.append(avu)
+        if self.n_calls == 1:
+            raise irods.exception.NetworkException("Could not receive server response")
+
+    def remove(self, *avu):
+        self.n_calls += 1
+        if avu not in self.avus:
+            raise irods.exception.CAT_SUCCESS_BUT_WITH_NO_INFO()
+        self.avus.remove(avu)
+        if self.n_calls == 1:
+            raise irods.exception.NetworkException("Could not receive server response")
+
+
+def test_retry_meta(monkeypatch, fake_session):
+    monkeypatch.setattr(ibridges.meta, "DEFAULT_POLICY", RetryPolicy(base_delay=0))
+    fake_session.healthy = False
+    manager = LostResponseMetadata()
+    meta = MetaData(SimpleNamespace(metadata=manager, path="/zone/obj"), session=fake_session)
+    # The entry that was added by the first attempt is not an error on the retry.
+    meta.add("Author", "Ben", None)
+    assert manager.avus == [("Author", "Ben", None)]
+    assert manager.n_calls == 2
+    assert fake_session.n_connect == 1
+
+    manager.n_calls = 0
+    meta.delete("Author", "Ben", None)
+    assert manager.avus == []
+    assert manager.n_calls == 2
+
+    # Without a retry, the error is still raised.
+    with pytest.raises(KeyError):
+        meta.delete("Author", "Ben", None)
@@ -0,0 +1,135 @@
+import json
+import sys
+from contextlib import contextmanager
+from pathlib import Path
+
+import pytest
+
+import ibridges.__main__
+import ibridges.session
+from ibridges.session import PasswordError, Session
+
+ENV = {"irods_host": "irods.example.org", "irods_port": 1247, "irods_user_name": "user",
+       "irods_zone_name": "zone"}
+
+
+@pytest.fixture
+def fake_connect(monkeypatch, tmpdir, make_irods_session):
+    monkeypatch.setattr(ibridges.session, "_SERVER_INFO", {})
+    monkeypatch.setattr(ibridges.session, "CAPABILITY_CACHE_FP", Path(tmpdir) / "capabilities.json")
+    connections = []
+
+    def _connect(self):
+        connections.append(make_irods_session())
+        return connections[-1]
+
+    def _query_user_info(self):
+        self.irods_session.n_queries += 1
+        return "rodsuser", ["public"]
+
+    monkeypatch.setattr(Session, "connect", _connect)
+    monkeypatch.setattr(Session, "_query_user_info", _query_user_info)
+    return connections
+
+
+def test_lazy_session(fake_connect):
+    session = Session(dict(ENV), lazy=True)
+    assert session.home == "/zone/home/user"
+    assert session.username == "user"
+    with session:
+        assert len(fake_connect) == 0
+        assert session.server_version == (4, 3, 1)
+        assert len(fake_connect) == 1
+    assert session.irods_session is None
+    # Caching the state of paths is opt-in.
+    assert session.stat_cache is None
+    assert Session(dict(ENV), lazy=True, stat_cache_ttl=10).stat_cache.ttl == 10
+
+    # Eager sessions connect immediately.
+    Session(dict(ENV))
+    assert len(fake_connect) == 2
+
+
+def test_server_info_cache(fake_connect):
+    session = Session(dict(ENV))
+    assert session.server_version == (4, 3, 1)
+    assert session.get_user_info() == ("rodsuser", ["public"])
+    assert session.get_user_info() == ("rodsuser", ["public"])
+    assert session.irods_session.n_queries == 1
+    session.get_user_info(refresh=True)
+    assert session.irods_session.n_queries == 2
+
+    # The server version and user info are shared by sessions of the process.
+    other_session = Session(dict(ENV), lazy=True)
+    assert other_session.server_version == (4, 3, 1)
+    assert other_session.get_user_info() == ("rodsuser", ["public"])
+    assert len(fake_connect) == 1
+    assert not ibridges.session.CAPABILITY_CACHE_FP.exists()
+
+
+def test_capability_cache(fake_connect, monkeypatch):
+    session = Session(dict(ENV), lazy=True, cache_capabilities=True)
+    assert session.server_version == (4, 3, 1)
+    with open(ibridges.session.CAPABILITY_CACHE_FP, "r", encoding="utf-8") as handle:
+        cache = json.load(handle)
+    assert cache["user#zone@irods.example.org:1247"]["server_version"] == [4, 3, 1]
+
+    # Another process reads the cache instead of connecting.
+    monkeypatch.setattr(ibridges.session, "_SERVER_INFO", {})
+    session = Session(dict(ENV), lazy=True, cache_capabilities=True)
+    assert session.server_version == (4, 3, 1)
+    assert len(fake_connect) == 1
+
+
+def test_valid_session(fake_connect, monkeypatch):
+    session = Session(dict(ENV))
+    assert session.server_version == (4, 3, 1)
+    # The cached server information is not enough, the server is contacted every time.
+    assert session.has_valid_irods_session()
+    assert session.has_valid_irods_session()
+    assert session.irods_session.n_queries == 2
+
+    def _lost_connection(self):
+        raise ConnectionError("Connection lost")
+    monkeypatch.setattr(Session, "_query_user_info", _lost_connection)
+    assert not session.has_valid_irods_session()
+    with session:
+        assert len(fake_connect) == 2
+
+
+def test_clone(fake_connect):
+    session = Session(dict(ENV, irods_home="/zone/home/user"), stat_cache_ttl=10)
+    clone = session.clone()
+    assert clone.irods_session is not session.irods_session
+    # Only the cache is shared, reconnecting or changing the home of a clone does not
+    # affect the original session.
+    assert clone._connect_lock is not session._connect_lock
+    clone.home = "/zone/home/other"
+    assert session.home == "/zone/home/user"
+    assert clone.stat_cache is session.stat_cache
+
+
+def test_cli_wrong_cached_password(monkeypatch, tmp_path):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    runs = []
+    auths = []
+
+    def _run_subcommand(subcommand):
+        runs.append(subcommand)
+        if len(runs) == 1:
+            raise PasswordError("Cached password expired")
+
+    @contextmanager
+    def _cli_auth(ienv_path, lazy=True):
+        auths.append(lazy)
+        yield None
+    monkeypatch.setattr(ibridges.__main__, "_run_subcommand", _run_subcommand)
+    monkeypatch.setattr(ibridges.__main__, "_cli_auth", _cli_auth)
+    monkeypatch.setattr(ibridges.__main__, "_get_ienv_path", lambda: None)
+    monkeypatch.setattr(ibridges.__main__.agent, "forward", lambda *_: None)
+    monkeypatch.setattr(ibridges.__main__.agent, "notify_changed", lambda _: None)
+    monkeypatch.setattr(sys, "argv", ["ibridges", "list"])
+    # A wrong cached password of a lazy session asks for the password, as before.
+    ibridges.__main__.main()
+    assert auths == [False]
+    assert runs == ["list", "list"]
@@ -0,0 +1,57 @@
+import csv
+import json
+
+import pytest
+
+import ibridges.telemetry
+from ibridges.telemetry import TransferTelemetry, count_retry, timed
+
+
+def test_telemetry(tmpdir, monkeypatch, fake_clock):
+    # The durations come from a fake clock, so that the order does not depend on the load.
+    monkeypatch.setattr(ibridges.telemetry.time, "perf_counter", fake_clock)
+    telemetry = TransferTelemetry()
+    telemetry.start()
+    for i in range(10):
+        queued = fake_clock()
+        fake_clock.sleep(0.001)
+        with telemetry.measure("upload", f"file_{i}", f"obj_{i}", 100, queued):
+            with timed("checksum"):
+                fake_clock.sleep(0.005 * i)
+            fake_clock.sleep(0.002)
+    with pytest.raises(ValueError):
+        with telemetry.measure("download", "obj_x", "file_x", 1000):
+            count_retry()
+            count_retry()
+            raise ValueError("Connection lost")
+    telemetry.stop()
+
+    summary = telemetry.summary(n_slowest=3)
+    assert summary.n_transfers == 11
+    assert summary.n_failed == 1
+    assert summary.n_retries == 2
+    assert summary.total_bytes == 1000
+    assert summary.checksum_time == pytest.approx(0.225)
+    assert summary.wall_time == pytest.approx(0.255)
+    assert [rec.src for rec in summary.slowest] == ["file_9", "file_8", "file_7"]
+    assert summary.latency["p50"] <= summary.latency["p90"] <= summary.latency["max"]
+    assert "Slowest transfers:" in str(summary)
+
+    summary.to_json(tmpdir / "telemetry.json")
+    with open(tmpdir / "telemetry.json", "r", encoding="utf-8") as handle:
+        data = json.load(handle)
+    assert data["n_transfers"] == 11
+    assert data["records"][-1]["error"] == "ValueError('Connection lost')"
+
+    summary.to_csv(tmpdir / "telemetry.csv")
+    with open(tmpdir / "telemetry.csv", "r", encoding="utf-8") as handle:
+        rows = list(csv.DictReader(handle))
+    assert len(rows) == 11
+    assert rows[0]["op"] == "upload"
+
+
+def test_timed_outside_transfer():
+    # Timing outside of a measured transfer should be ignored.
+    with timed("checksum"):
+        pass
+    count_retry()
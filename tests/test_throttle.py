@@ -0,0 +1,80 @@
+import io
+import threading
+import time
+
+import pytest
+
+from ibridges.throttle import (
+    BULK,
+    INTERACTIVE,
+    RateLimiter,
+    Throttle,
+    ThrottledStream,
+    set_global_rate,
+)
+
+
+def test_rate_limiter():
+    limiter = RateLimiter()
+    start = time.monotonic()
+    limiter.acquire(10**9)
+    assert time.monotonic() - start < 0.1
+
+    limiter.set_rate(1000)
+    start = time.monotonic()
+    for _ in range(4):
+        limiter.acquire(100)
+    # The first second is covered by the burst, afterwards we are in debt.
+    limiter.acquire(1000)
+    limiter.acquire(200)
+    assert time.monotonic() - start > 0.35
+
+    with pytest.raises(ValueError):
+        limiter.set_rate(0)
+
+
+def test_priority():
+    limiter = RateLimiter(10000, burst=100)
+    limiter.acquire(1000)  # Empty the bucket, next transfers wait for 0.1 seconds.
+    finished = []
+
+    def _transfer(name, priority):
+        limiter.acquire(100, priority)
+        finished.append(name)
+
+    bulk = threading.Thread(target=_transfer, args=("bulk", BULK))
+    bulk.start()
+    time.sleep(0.01)
+    interactive = threading.Thread(target=_transfer, args=("interactive", INTERACTIVE))
+    interactive.start()
+    bulk.join()
+    interactive.join()
+    assert finished == ["interactive", "bulk"]
+
+
+def test_throttled_stream():
+    assert not Throttle().active
+    limiter = RateLimiter(1000)
+    throttle = Throttle(limiter, INTERACTIVE)
+    assert throttle.active
+    with pytest.raises(ValueError):
+        Throttle(priority="urgent")
+
+    with ThrottledStream(io.BytesIO(b"x" * 1200), throttle) as handle:
+        start = time.monotonic()
+        assert len(handle.read(1000)) == 1000
+        assert len(handle.read(100)) == 100
+        # The bucket is in debt, so this read waits for 0.1 seconds.
+        assert len(handle.read()) == 100
+        assert time.monotonic() - start > 0.08
+        assert handle.tell() == 1200
+
+
+def test_global_rate():
+    throttle = Throttle()
+    set_global_rate(10**6)
+    try:
+        assert throttle.active
+    finally:
+        set_global_rate(None)
+    assert not throttle.active
@@ -0,0 +1,290 @@
+import base64
+import hashlib
+import io
+import json
+import os
+import tarfile
+from contextlib import contextmanager
+from pathlib import Path
+
+import pytest
+
+import ibridges.transfer
+from ibridges.path import CachedIrodsPath, IrodsPath
+from ibridges.retry import RetryPolicy
+from ibridges.transfer import (
+    MAX_THREADS,
+    PARALLEL_TRANSFER_SIZE,
+    TransferTuner,
+    _add_range,
+    _bundle_get,
+    _bundle_put,
+    _bundle_rule_params,
+    _extract_bundle_member,
+    _missing_ranges,
+    _obj_put,
+    _ranged_get,
+)
+
+
+def test_transfer_tuner():
+    tuner = TransferTuner()
+    assert tuner.num_threads(1024) == 1
+    assert tuner.num_threads(PARALLEL_TRANSFER_SIZE) == 1
+    assert tuner.num_threads(PARALLEL_TRANSFER_SIZE + 1) == 2
+    assert tuner.num_threads(500 * 1024**3) == MAX_THREADS
+
+    # Small transfers are not used for measuring the throughput.
+    tuner.record(1024, 1, 0.1)
+    assert tuner.thread_rate is None
+    tuner.record(1024**3, 4, 1.0)
+    assert tuner.thread_rate == 1024**3 / 4
+    assert tuner.num_threads(1024**3) == 2
+    n_threads = tuner.num_threads(8 * 1024**3)
+    tuner.record(1024**3, 4, 100.0)
+    assert tuner.num_threads(8 * 1024**3) > n_threads
+
+    assert TransferTuner(num_threads=3).num_threads(1024) == 3
+    with pytest.raises(ValueError):
+        TransferTuner(num_threads=0)
+
+
+def _add_to_tar(tar, name, data=None):
+    info = tarfile.TarInfo(name)
+    if data is None:
+        info.type = tarfile.DIRTYPE
+        tar.addfile(info)
+    else:
+        info.size = len(data)
+        tar.addfile(info, io.BytesIO(data))
+
+
+def test_extract_bundle(tmpdir):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w|") as tar:
+        _add_to_tar(tar, "sub")
+        _add_to_tar(tar, "sub/x.txt", b"abc")
+        _add_to_tar(tar, "y.txt", b"defg")
+    buffer.seek(0)
+    with tarfile.open(fileobj=buffer, mode="r|") as tar:
+        for member in tar:
+            _extract_bundle_member(tar, member, Path(tmpdir))
+    assert Path(tmpdir, "sub", "x.txt").read_bytes() == b"abc"
+    assert Path(tmpdir, "y.txt").read_bytes() == b"defg"
+
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w|") as tar:
+        _add_to_tar(tar, "../escape.txt", b"abc")
+    buffer.seek(0)
+    with tarfile.open(fileobj=buffer, mode="r|") as tar:
+        with pytest.raises(ValueError):
+            for member in tar:
+                _extract_bundle_member(tar, member, Path(tmpdir))
+
+
+def test_extract_bundle_overwrite(tmpdir):
+    def _extract(**kwargs):
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode="w|") as tar:
+            _add_to_tar(tar, "x.txt", b"new")
+        buffer.seek(0)
+        with tarfile.open(fileobj=buffer, mode="r|") as tar:
+            for member in tar:
+                _extract_bundle_member(tar, member, Path(tmpdir), **kwargs)
+
+    Path(tmpdir, "x.txt").write_bytes(b"old")
+    # Existing files are only replaced with overwrite, like separate downloads.
+    with pytest.raises(FileExistsError):
+        _extract()
+    with pytest.warns(UserWarning, match="already exists"):
+        _extract(ignore_err=True)
+    assert Path(tmpdir, "x.txt").read_bytes() == b"old"
+    _extract(overwrite=True)
+    assert Path(tmpdir, "x.txt").read_bytes() == b"new"
+
+
+def test_ranges():
+    ranges = []
+    assert _missing_ranges(ranges, 10, 4) == [(0, 4), (4, 8), (8, 10)]
+    _add_range(ranges, 4, 8)
+    assert _missing_ranges(ranges, 10, 4) == [(0, 4), (8, 10)]
+    _add_range(ranges, 8, 10)
+    _add_range(ranges, 0, 2)
+    assert ranges == [[0, 2], [4, 10]]
+    assert _missing_ranges(ranges, 10, 4) == [(2, 4)]
+    _add_range(ranges, 2, 4)
+    assert ranges == [[0, 10]]
+    assert _missing_ranges(ranges, 10, 4) == []
+
+
+class FakeDataObject:
+    def __init__(self, data, fail_after=None):
+        self.data = data
+        self.size = len(data)
+        self.checksum = "sha2:" + base64.b64encode(hashlib.sha256(data).digest()).decode()
+        self.fail_after = fail_after
+        self.n_reads = 0
+
+    def __str__(self):
+        return "/zone/home/user/large_file"
+
+    @contextmanager
+    def open(self, mode, throttle=None):
+        handle = io.BytesIO(self.data)
+        read = handle.read
+
+        def _read(n_bytes):
+            if self.fail_after is not None and self.n_reads >= self.fail_after:
+                raise ConnectionError("Connection lost")
+            self.n_reads += 1
+            return read(n_bytes)
+        handle.read = _read
+        yield handle
+
+
+def test_ranged_get(tmpdir):
+    data = os.urandom(1000)
+    local_path = Path(tmpdir) / "large_file"
+    ipath = FakeDataObject(data, fail_after=3)
+    with pytest.raises(ConnectionError):
+        _ranged_get(ipath, local_path, chunk_size=100)
+    assert not local_path.exists()
+    state_fp = Path(tmpdir) / ".large_file.ibridges_part.json"
+    with open(state_fp, "r", encoding="utf-8") as handle:
+        assert json.load(handle)["ranges"] == [[0, 300]]
+
+    # Only the missing ranges are downloaded when resuming.
+    ipath.fail_after = None
+    ipath.n_reads = 0
+    _ranged_get(ipath, local_path, chunk_size=100)
+    assert ipath.n_reads == 7
+    assert local_path.read_bytes() == data
+    assert not state_fp.exists()
+
+    with pytest.raises(FileExistsError):
+        _ranged_get(ipath, local_path, chunk_size=100)
+
+
+def test_ranged_get_retry_progress(tmpdir):
+    data = os.urandom(1000)
+    local_path = Path(tmpdir) / "large_file"
+    ipath = FakeDataObject(data, fail_after=3)
+    pbar = FakeProgressBar()
+
+    def _get_once():
+        try:
+            _ranged_get(ipath, local_path, pbar=pbar, chunk_size=100)
+        except ConnectionError:
+            ipath.fail_after = None
+            raise
+
+    # The ranges that completed before the retry are only counted once.
+    RetryPolicy(max_attempts=2, base_delay=0).call(_get_once)
+    assert local_path.read_bytes() == data
+    assert pbar.n == 1000
+
+    # Ranges from an interrupted earlier run are counted for a new progress bar.
+    local_path.unlink()
+    ipath.fail_after, ipath.n_reads = 4, 0
+    with pytest.raises(ConnectionError):
+        _ranged_get(ipath, local_path, pbar=FakeProgressBar(), chunk_size=100)
+    ipath.fail_after = None
+    new_pbar = FakeProgressBar()
+    _ranged_get(ipath, local_path, pbar=new_pbar, chunk_size=100)
+    assert new_pbar.n == 1000
+
+
+class FakeDataObjectManager:
+    def __init__(self):
+        self.put_calls = []
+
+    def put(self, local_path, irods_path, num_threads=None, updatables=None, **options):
+        self.put_calls.append((local_path, irods_path))
+        for update in updatables or []:
+            update(Path(local_path).stat().st_size)
+
+
+@pytest.fixture
+def session(make_session, make_irods_session):
+    return make_session(irods_session=make_irods_session(data_objects=FakeDataObjectManager()))
+
+
+class FakeProgressBar:
+    def __init__(self):
+        self.n = 0
+
+    def update(self, n_bytes):
+        self.n += n_bytes
+
+
+@pytest.mark.parametrize("overwrite,exists", [(True, True), (False, False)])
+def test_obj_put_planned(tmpdir, overwrite, exists, session):
+    # No catalog queries should be needed, since the fake session cannot do them.
+    local_path = Path(tmpdir) / "file.txt"
+    local_path.write_bytes(b"1234")
+    ipath = CachedIrodsPath(session, None, exists, None, "~/file.txt")
+    pbar = FakeProgressBar()
+    _obj_put(session, local_path, ipath, overwrite=overwrite, pbar=pbar)
+    assert session.irods_session.data_objects.put_calls == [
+        (local_path, "/testzone/home/testuser/file.txt")]
+    assert pbar.n == 4
+
+    with pytest.raises(FileExistsError):
+        _obj_put(session, local_path, CachedIrodsPath(session, None, True, None, "~/file.txt"))
+
+
+def test_bundle_rule_params(session):
+    params = _bundle_rule_params(IrodsPath(session, "~/b.tar"), IrodsPath(session, "~/coll"), "")
+    assert params == {"*bundle": '"/testzone/home/testuser/b.tar"',
+                      "*coll": '"/testzone/home/testuser/coll"', "*resc": '"null"'}
+    for coll in ['~/co"ll', "~/co*ll", "~/co\\ll"]:
+        with pytest.raises(ValueError):
+            _bundle_rule_params(IrodsPath(session, "~/b.tar"), IrodsPath(session, coll), "")
+    with pytest.raises(ValueError):
+        _bundle_rule_params(IrodsPath(session, "~/b.tar"), IrodsPath(session, "~/coll"),
+                            'resc"; writeLine("stdout", "x")')
+
+
+def test_bundle_put_errors(tmpdir, monkeypatch, session):
+    local_path = Path(tmpdir) / "file.txt"
+    local_path.write_bytes(b"1234")
+    files = [(local_path, IrodsPath(session, '~/co"ll/file.txt'))]
+
+    def _dataobject_exists(self):
+        raise ConnectionError("Connection lost during cleanup")
+    monkeypatch.setattr(IrodsPath, "dataobject_exists", _dataobject_exists)
+
+    # A name that cannot be used in the rule falls back to separate uploads.
+    with pytest.warns(UserWarning):
+        _bundle_put(session, files, IrodsPath(session, '~/co"ll'), overwrite=True)
+    assert session.irods_session.data_objects.put_calls == [
+        (local_path, '/testzone/home/testuser/co"ll/file.txt')]
+
+    # Network errors are raised to be retried, and are not hidden by the cleanup.
+    def _open(self, mode, throttle=None):
+        raise ConnectionError("Connection lost")
+    monkeypatch.setattr(IrodsPath, "open", _open)
+    session.irods_session.data_objects.put_calls.clear()
+    files = [(local_path, IrodsPath(session, "~/coll/file.txt"))]
+    with pytest.raises(ConnectionError, match="Connection lost$"), \
+            pytest.warns(UserWarning, match="temporary bundle"):
+        _bundle_put(session, files, IrodsPath(session, "~/coll"))
+    assert session.irods_session.data_objects.put_calls == []
+
+
+def test_bundle_get_errors(tmpdir, monkeypatch, session):
+    monkeypatch.setattr(IrodsPath, "dataobject_exists", lambda self: False)
+    fallback = []
+    monkeypatch.setattr(ibridges.transfer, "_obj_get",
+                        lambda session, ipath, lpath, **kwargs: fallback.append(ipath))
+    files = [(IrodsPath(session, '~/co"ll/file.txt'), Path(tmpdir) / "file.txt")]
+    with pytest.warns(UserWarning):
+        _bundle_get(session, IrodsPath(session, '~/co"ll'), Path(tmpdir), files)
+    assert fallback == [files[0][0]]
+
+    def _execute_rule(*args, **kwargs):
+        raise ConnectionError("Connection lost")
+    monkeypatch.setattr(ibridges.transfer, "execute_rule", _execute_rule)
+    with pytest.raises(ConnectionError):
+        _bundle_get(session, IrodsPath(session, "~/coll"), Path(tmpdir), files)
+    assert len(fallback) == 1